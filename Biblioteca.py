@@ -1,283 +1,32 @@
 import tkinter as tk
-from tkinter import messagebox, filedialog
+from tkinter import messagebox, filedialog, ttk
 import os
-import networkx as nx
-import sqlite3  # Importamos SQLite
+from datetime import datetime, timezone
 
-
-# --- Database Manager Class ---
-class DatabaseManager:
-    def __init__(self, db_name="biblioteca.db"):
-        self.db_name = db_name
-        self.conn = None
-        self.cursor = None
-        self._connect()
-        self._create_tables()
-
-    def _connect(self):
-        try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
-        except sqlite3.Error as e:
-            print(f"Error al conectar a la base de datos: {e}")
-            # Considera manejar este error en la GUI también
-
-    def _create_tables(self):
-        try:
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS libros (
-                    isbn TEXT PRIMARY KEY UNIQUE,
-                    titulo TEXT NOT NULL,
-                    autor TEXT NOT NULL,
-                    editorial TEXT NOT NULL,
-                    disponible INTEGER NOT NULL DEFAULT 1
-                )
-            ''')
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS usuarios (
-                    dni TEXT PRIMARY KEY UNIQUE,
-                    nombre TEXT NOT NULL
-                )
-            ''')
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS prestamos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    isbn_libro TEXT NOT NULL,
-                    dni_usuario TEXT NOT NULL,
-                    fecha_prestamo TEXT NOT NULL,
-                    activo INTEGER NOT NULL DEFAULT 1, -- 1 si prestado, 0 si devuelto
-                    FOREIGN KEY (isbn_libro) REFERENCES libros(isbn) ON DELETE CASCADE,
-                    FOREIGN KEY (dni_usuario) REFERENCES usuarios(dni) ON DELETE CASCADE
-                )
-            ''')
-            self.conn.commit()
-            print("Tablas verificadas/creadas con éxito.")
-        except sqlite3.Error as e:
-            print(f"Error al crear tablas: {e}")
-            # Considera manejar este error en la GUI
-
-    def close(self):
-        if self.conn:
-            self.conn.close()
-
-    # --- Métodos para Libros ---
-    def add_libro(self, libro):
-        try:
-            self.cursor.execute(
-                "INSERT INTO libros (isbn, titulo, autor, editorial, disponible) VALUES (?, ?, ?, ?, ?)",
-                (libro['isbn'], libro['titulo'], libro['autor'], libro['editorial'], 1 if libro['disponible'] else 0)
-            )
-            self.conn.commit()
-            return True
-        except sqlite3.IntegrityError:  # Si el ISBN ya existe
-            return False
-        except sqlite3.Error as e:
-            print(f"Error al añadir libro: {e}")
-            return False
-
-    def get_libro(self, isbn):
-        self.cursor.execute("SELECT isbn, titulo, autor, editorial, disponible FROM libros WHERE isbn = ?", (isbn,))
-        row = self.cursor.fetchone()
-        if row:
-            return {
-                'isbn': row[0],
-                'titulo': row[1],
-                'autor': row[2],
-                'editorial': row[3],
-                'disponible': bool(row[4]),
-                'prestado_a': self.get_historial_prestamos_libro(isbn)  # Recuperar historial
-            }
-        return None
-
-    def delete_libro(self, isbn):
-        try:
-            # Primero, asegurarse de que no haya préstamos activos para este libro
-            self.cursor.execute("SELECT COUNT(*) FROM prestamos WHERE isbn_libro = ? AND activo = 1", (isbn,))
-            if self.cursor.fetchone()[0] > 0:
-                return False  # No se puede borrar si hay préstamos activos
-
-            self.cursor.execute("DELETE FROM libros WHERE isbn = ?", (isbn,))
-            self.conn.commit()
-            return self.cursor.rowcount > 0
-        except sqlite3.Error as e:
-            print(f"Error al borrar libro: {e}")
-            return False
-
-    def get_all_libros(self):
-        self.cursor.execute("SELECT isbn, titulo, autor, editorial, disponible FROM libros ORDER BY isbn")
-        libros_data = []
-        for row in self.cursor.fetchall():
-            libro = {
-                'isbn': row[0],
-                'titulo': row[1],
-                'autor': row[2],
-                'editorial': row[3],
-                'disponible': bool(row[4]),
-                'prestado_a': self.get_historial_prestamos_libro(row[0])  # Cargar historial
-            }
-            libros_data.append(libro)
-        return libros_data
-
-    def update_libro_disponibilidad(self, isbn, disponible):
-        try:
-            self.cursor.execute("UPDATE libros SET disponible = ? WHERE isbn = ?", (1 if disponible else 0, isbn))
-            self.conn.commit()
-            return self.cursor.rowcount > 0
-        except sqlite3.Error as e:
-            print(f"Error al actualizar disponibilidad: {e}")
-            return False
-
-    # --- Métodos para Usuarios ---
-    def add_usuario(self, dni, nombre):
-        try:
-            self.cursor.execute("INSERT INTO usuarios (dni, nombre) VALUES (?, ?)", (dni, nombre))
-            self.conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-        except sqlite3.Error as e:
-            print(f"Error al añadir usuario: {e}")
-            return False
-
-    def get_usuario(self, dni):
-        self.cursor.execute("SELECT dni, nombre FROM usuarios WHERE dni = ?", (dni,))
-        row = self.cursor.fetchone()
-        if row:
-            return {'dni': row[0], 'nombre': row[1]}
-        return None
-
-    def delete_usuario(self, dni):
-        try:
-            # Primero, asegurarse de que no tenga préstamos activos
-            self.cursor.execute("SELECT COUNT(*) FROM prestamos WHERE dni_usuario = ? AND activo = 1", (dni,))
-            if self.cursor.fetchone()[0] > 0:
-                return False  # No se puede borrar si tiene préstamos activos
-
-            self.cursor.execute("DELETE FROM usuarios WHERE dni = ?", (dni,))
-            self.conn.commit()
-            return self.cursor.rowcount > 0
-        except sqlite3.Error as e:
-            print(f"Error al borrar usuario: {e}")
-            return False
-
-    def get_all_usuarios(self):
-        self.cursor.execute("SELECT dni, nombre FROM usuarios")
-        usuarios_data = {}
-        for row in self.cursor.fetchall():
-            usuarios_data[row[0]] = row[1]
-        return usuarios_data
-
-    # --- Métodos para Préstamos ---
-    def registrar_prestamo(self, isbn_libro, dni_usuario):
-        try:
-            # Marcar el libro como no disponible
-            self.update_libro_disponibilidad(isbn_libro, False)
-            # Registrar el nuevo préstamo como activo
-            self.cursor.execute(
-                "INSERT INTO prestamos (isbn_libro, dni_usuario, fecha_prestamo, activo) VALUES (?, ?, datetime('now'), 1)",
-                (isbn_libro, dni_usuario)
-            )
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            print(f"Error al registrar préstamo: {e}")
-            # Si falla el préstamo, revertir la disponibilidad si se actualizó
-            self.update_libro_disponibilidad(isbn_libro, True)
-            return False
-
-    def registrar_devolucion(self, isbn_libro, dni_usuario):
-        try:
-            # Actualizar el préstamo más reciente de ese libro por ese usuario a inactivo
-            self.cursor.execute(
-                "UPDATE prestamos SET activo = 0, fecha_devolucion = datetime('now') WHERE isbn_libro = ? AND dni_usuario = ? AND activo = 1 ORDER BY fecha_prestamo DESC LIMIT 1",
-                (isbn_libro, dni_usuario)
-            )
-            if self.cursor.rowcount > 0:
-                # Marcar el libro como disponible
-                self.update_libro_disponibilidad(isbn_libro, True)
-                self.conn.commit()
-                return True
-            return False  # No se encontró un préstamo activo para ese libro/usuario
-        except sqlite3.Error as e:
-            print(f"Error al registrar devolución: {e}")
-            return False
-
-    def get_historial_prestamos_libro(self, isbn_libro):
-        # Obtiene los DNI de los usuarios que han prestado este libro, ordenados por fecha
-        self.cursor.execute("SELECT dni_usuario FROM prestamos WHERE isbn_libro = ? ORDER BY fecha_prestamo ASC",
-                            (isbn_libro,))
-        return [row[0] for row in self.cursor.fetchall()]
-
-    def get_current_borrower(self, isbn_libro):
-        # Retorna el DNI del usuario que tiene el libro actualmente prestado (si lo hay)
-        self.cursor.execute(
-            "SELECT dni_usuario FROM prestamos WHERE isbn_libro = ? AND activo = 1 ORDER BY fecha_prestamo DESC LIMIT 1",
-            (isbn_libro,))
-        row = self.cursor.fetchone()
-        return row[0] if row else None
-
-    def get_libros_prestados_by_usuario(self, dni_usuario):
-        # Retorna los ISBN de los libros que un usuario tiene actualmente prestados
-        self.cursor.execute("SELECT isbn_libro FROM prestamos WHERE dni_usuario = ? AND activo = 1", (dni_usuario,))
-        return [row[0] for row in self.cursor.fetchall()]
-
-
-# --- CLASES DEL MODELO (Lógica de Negocio) - Adaptadas para usar DBManager ---
-
-# La clase BibliotecaISBN ya no necesita mantener la raíz del árbol en memoria
-# Su rol ahora es una interfaz que usa el DatabaseManager.
-class BibliotecaISBN:
-    def __init__(self, db_manager):
-        self.db_manager = db_manager
-
-    def insertar_libro(self, libro):
-        return self.db_manager.add_libro(libro)
-
-    def buscar_libro_por_isbn(self, isbn):
-        return self.db_manager.get_libro(isbn)
-
-    def listar_libros_ordenado_por_isbn(self):
-        return self.db_manager.get_all_libros()
-
-    def borrar_libro(self, isbn_borrar):
-        return self.db_manager.delete_libro(isbn_borrar)
-
-
-# Ya no se necesita una variable global `usuarios` directamente como diccionario,
-# se gestiona a través del db_manager.
-# La función _obtener_historial_completo_prestamos también necesita actualizarse.
-
-# --- VARIABLES GLOBALES DEL MODELO ---
-db_manager = DatabaseManager()  # Instancia del manejador de la base de datos
-biblioteca_isbn = BibliotecaISBN(db_manager)  # Pasa el db_manager a la biblioteca
-
-
-# La variable global usuarios ahora es una función que carga los usuarios de la BD cuando se necesita
-def get_current_users():
-    return db_manager.get_all_usuarios()
-
-
-grafo_biblioteca = nx.DiGraph()  # Sigue siendo en memoria para el grafo
-
-
-# --- FUNCIONES AUXILIARES DEL MODELO ---
-def _obtener_historial_completo_prestamos():
-    historial = {}
-    libros = biblioteca_isbn.listar_libros_ordenado_por_isbn()
-    all_users = get_current_users()  # Obtener usuarios de la BD
-    for libro in libros:
-        # Aquí, 'prestado_a' viene de la DB (get_historial_prestamos_libro)
-        if libro['prestado_a']:
-            historial[libro['titulo']] = [all_users.get(dni, "Usuario desconocido") for dni in
-                                          reversed(libro['prestado_a'])]
-    return historial
+# Núcleo de la biblioteca (sin dependencias de GUI; networkx se carga solo al usar el grafo)
+from biblioteca_db import DatabaseManager
+from biblioteca_modelo import BibliotecaISBN, exportar_informacion
+from biblioteca_grafo import GrafoBiblioteca, id_usuario, ruta_instantanea
+from biblioteca_recomendaciones import MotorRecomendaciones
+from biblioteca_cache import CacheResultados
+from biblioteca_tareas import EjecutorTareas, TareaCancelada
 
 
 # --- INTERFAZ GRÁFICA (Tkinter) ---
 
 class BibliotecaApp:
-    def __init__(self, master):
+    def __init__(self, master, db_manager):
         self.master = master
+        self.db_manager = db_manager
+        self.biblioteca_isbn = BibliotecaISBN(db_manager)  # Pasa el db_manager a la biblioteca
+        self.grafo = GrafoBiblioteca(db_manager)  # networkx se carga al reconstruir el grafo
+        # Instantánea del grafo junto a la base de datos: al arrancar se carga en vez de reconstruirlo
+        self.ruta_instantanea_grafo = ruta_instantanea(db_manager.db_name)
+        self.recomendador = MotorRecomendaciones(db_manager)  # Se entrena en la primera recomendación
+        self.cache_resultados = CacheResultados(capacidad=256)  # Recomendaciones y usuarios similares
+        # Las operaciones largas corren en hilos de trabajo (cada uno con su conexión si db_manager usa pool)
+        self.ejecutor = EjecutorTareas(max_hilos=2)
+        self._reconstruir_pendiente = False  # Hay un grafo nuevo cargándose en segundo plano
         master.title("Sistema de Gestión de Biblioteca - Wilmar Eulises Franco Beltran")
         master.geometry("1000x700")
 
@@ -287,8 +36,11 @@ class BibliotecaApp:
         self.status_frame = tk.Frame(self.main_frame, bd=2, relief=tk.GROOVE, padx=5, pady=5)
         self.status_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
         self.status_label = tk.Label(self.status_frame, text="Bienvenido al Sistema de Gestión de Biblioteca",
-                                     fg="blue")
-        self.status_label.pack(fill=tk.X)
+                                     fg="blue", anchor=tk.W)
+        self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # Progreso y cancelación de las tareas en segundo plano (visibles solo mientras hay alguna activa)
+        self.tareas_cancelar_button = tk.Button(self.status_frame, text="Cancelar", command=self._cancelar_tareas)
+        self.tareas_progressbar = ttk.Progressbar(self.status_frame, length=200, mode="determinate")
 
         self.current_frame = None
         self.frames = {}
@@ -297,20 +49,72 @@ class BibliotecaApp:
         self.create_book_frames()
         self.create_user_frames()
         self.create_loan_frames()
+        self.create_stats_frame()
         self.create_export_frame()
         self.create_list_frames()
         self.create_graph_frames()
+        self.create_metrics_frame()
+
+        # Procesar en el hilo de la GUI los resultados de las tareas en segundo plano
+        self._procesar_tareas()
 
         # Al iniciar la aplicación, reconstruir el grafo desde la base de datos
         self._reconstruir_grafo_desde_bd()
+        # Y mantenerlo al día con el diario de cambios (también los hechos por otros procesos)
+        self.master.after(self.INTERVALO_SINCRONIZACION_MS, self._sincronizar_grafo_periodicamente)
 
         # Asegurarse de cerrar la conexión a la BD al cerrar la app
         self.master.protocol("WM_DELETE_WINDOW", self._on_closing)
 
     def _on_closing(self):
-        db_manager.close()
+        # Cancelar y esperar a las tareas en curso: no deben seguir usando la base de datos al cerrarla
+        self.ejecutor.cerrar(esperar=True)
+        self._guardar_instantanea_grafo()
+        self.db_manager.close()
         self.master.destroy()
 
+    # --- Tareas en segundo plano ---
+    INTERVALO_TAREAS_MS = 50
+
+    def _procesar_tareas(self):
+        self.ejecutor.procesar_eventos()
+        if not self.ejecutor.tareas_activas():
+            self.tareas_progressbar.stop()
+            self.tareas_progressbar.pack_forget()
+            self.tareas_cancelar_button.pack_forget()
+        self.master.after(self.INTERVALO_TAREAS_MS, self._procesar_tareas)
+
+    def _ejecutar_en_segundo_plano(self, descripcion, funcion, *args, al_terminar=None, al_fallar=None,
+                                   al_cancelar=None):
+        """
+        Ejecuta funcion(tarea, *args) en un hilo de trabajo y muestra su avance en la barra de estado.
+        Los callbacks se ejecutan en el hilo de la GUI.
+        """
+        def al_progresar(tarea, actual, total, mensaje):
+            if total:
+                self.tareas_progressbar.stop()
+                self.tareas_progressbar.config(mode="determinate", maximum=total, value=actual)
+            self.set_status(f"{tarea.descripcion}: {mensaje}" if mensaje else f"{tarea.descripcion}...")
+
+        def error_por_defecto(error):
+            self.set_status(f"{descripcion}: ocurrió un error: {error}", True)
+
+        def cancelada_por_defecto():
+            self.set_status(f"{descripcion}: cancelado.", True)
+
+        self.set_status(f"{descripcion}...")
+        self.tareas_progressbar.config(mode="indeterminate")
+        self.tareas_progressbar.start(15)
+        self.tareas_cancelar_button.pack(side=tk.RIGHT, padx=5)
+        self.tareas_progressbar.pack(side=tk.RIGHT, padx=5)
+        return self.ejecutor.enviar(descripcion, funcion, *args, al_terminar=al_terminar,
+                                    al_fallar=al_fallar or error_por_defecto, al_progresar=al_progresar,
+                                    al_cancelar=al_cancelar or cancelada_por_defecto)
+
+    def _cancelar_tareas(self):
+        self.ejecutor.cancelar_todas()
+        self.set_status("Cancelando tareas en segundo plano...", True)
+
     def show_frame(self, frame_name):
         if self.current_frame:
             self.current_frame.pack_forget()
@@ -331,6 +135,7 @@ class BibliotecaApp:
         buttons_data = [
             ("Registrar Libro", "registrar_libro_frame"),
             ("Buscar Libro", "buscar_libro_frame"),
+            ("Buscar por Título/Autor", "buscar_texto_frame"),
             ("Borrar Libro", "borrar_libro_frame"),
             ("Registrar Usuario", "registrar_usuario_frame"),
             ("Buscar Usuario", "buscar_usuario_frame"),
@@ -338,9 +143,13 @@ class BibliotecaApp:
             ("Listar Libros", "listar_libros_frame"),
             ("Prestar Libro", "prestar_libro_frame"),
             ("Devolver Libro", "devolver_libro_frame"),
+            ("Mostrador (Lotes)", "mostrador_frame"),
             ("Historial de Préstamos", "historial_prestamos_frame"),
+            ("Préstamos Vencidos", "vencidos_frame"),
+            ("Estadísticas de Préstamos", "estadisticas_frame"),
             ("Exportar Información", "exportar_informacion_frame"),
             ("Funciones de Grafo", "grafo_funciones_frame"),
+            ("Métricas de la BD", "metricas_frame"),
             ("Salir", None)
         ]
 
@@ -351,9 +160,9 @@ class BibliotecaApp:
                 tk.Button(self.menu_frame, text=text, command=lambda fn=frame_name: self.show_frame(fn), width=20,
                           height=2).grid(row=row_idx, column=col_idx, padx=2, pady=5)
             else:
-                tk.Button(self.menu_frame, text=text, command=self.master.quit, width=20, height=2).grid(row=row_idx,
-                                                                                                         column=col_idx,
-                                                                                                         padx=2, pady=5)
+                # Salir pasa por _on_closing: guarda la instantánea del grafo y cierra la base de datos
+                tk.Button(self.menu_frame, text=text, command=self._on_closing, width=20, height=2).grid(
+                    row=row_idx, column=col_idx, padx=2, pady=5)
 
             col_idx = 1 - col_idx
             if col_idx == 0:
@@ -388,6 +197,19 @@ class BibliotecaApp:
         self.libro_encontrado_info = tk.Label(frame_buscar_libro, text="", justify=tk.LEFT)
         self.libro_encontrado_info.pack(pady=5)
 
+        frame_buscar_texto = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
+        self.frames["buscar_texto_frame"] = frame_buscar_texto
+        tk.Label(frame_buscar_texto, text="Buscar Libro por Título, Autor o Editorial",
+                 font=("Arial", 12, "bold")).pack(pady=10)
+        tk.Label(frame_buscar_texto, text="Texto a buscar (admite palabras incompletas, sin tildes):").pack()
+        self.buscar_texto_entry = tk.Entry(frame_buscar_texto, width=50)
+        self.buscar_texto_entry.pack(pady=2)
+        self.buscar_texto_entry.bind("<Return>", lambda event: self._buscar_libros_texto_gui())
+        tk.Button(frame_buscar_texto, text="Buscar", command=self._buscar_libros_texto_gui).pack(pady=10)
+        self.buscar_texto_resultados = tk.Text(frame_buscar_texto, wrap=tk.WORD, height=15, width=70)
+        self.buscar_texto_resultados.pack(pady=5)
+        self.buscar_texto_resultados.config(state=tk.DISABLED)
+
         frame_borrar_libro = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
         self.frames["borrar_libro_frame"] = frame_borrar_libro
         tk.Label(frame_borrar_libro, text="Borrar Libro por ISBN", font=("Arial", 12, "bold")).pack(pady=10)
@@ -448,6 +270,34 @@ class BibliotecaApp:
         self.dev_isbn_entry.pack(pady=2)
         tk.Button(frame_devolver_libro, text="Devolver", command=self._devolver_libro_gui).pack(pady=10)
 
+        # Mostrador: los lectores de códigos escriben el ISBN y envían Enter, cada lectura se encola
+        frame_mostrador = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
+        self.frames["mostrador_frame"] = frame_mostrador
+        tk.Label(frame_mostrador, text="Mostrador: Préstamo y Devolución por Lotes", font=("Arial", 12, "bold")).pack(
+            pady=10)
+        tk.Label(frame_mostrador, text="DNI del Usuario (solo para préstamos):").pack()
+        self.mostrador_dni_entry = tk.Entry(frame_mostrador)
+        self.mostrador_dni_entry.pack(pady=2)
+        tk.Label(frame_mostrador, text="Escanear ISBN (Enter para añadir a la cola):").pack()
+        self.mostrador_isbn_entry = tk.Entry(frame_mostrador)
+        self.mostrador_isbn_entry.pack(pady=2)
+        self.mostrador_isbn_entry.bind("<Return>", self._encolar_escaneo)
+        self.mostrador_cola_listbox = tk.Listbox(frame_mostrador, height=8, width=50)
+        self.mostrador_cola_listbox.pack(pady=5)
+        frame_botones_mostrador = tk.Frame(frame_mostrador)
+        frame_botones_mostrador.pack(pady=5)
+        tk.Button(frame_botones_mostrador, text="Prestar Lote", command=self._prestar_lote_gui).pack(side=tk.LEFT,
+                                                                                                    padx=2)
+        tk.Button(frame_botones_mostrador, text="Devolver Lote", command=self._devolver_lote_gui).pack(side=tk.LEFT,
+                                                                                                      padx=2)
+        tk.Button(frame_botones_mostrador, text="Quitar Seleccionado", command=self._quitar_escaneo).pack(side=tk.LEFT,
+                                                                                                         padx=2)
+        tk.Button(frame_botones_mostrador, text="Vaciar Cola", command=self._vaciar_cola_mostrador).pack(side=tk.LEFT,
+                                                                                                        padx=2)
+        self.mostrador_resultados_text = tk.Text(frame_mostrador, wrap=tk.WORD, height=8, width=50)
+        self.mostrador_resultados_text.pack(pady=5)
+        self.mostrador_resultados_text.config(state=tk.DISABLED)
+
         frame_historial_prestamos = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
         self.frames["historial_prestamos_frame"] = frame_historial_prestamos
         tk.Label(frame_historial_prestamos, text="Historial de Préstamos por Libro", font=("Arial", 12, "bold")).pack(
@@ -459,27 +309,117 @@ class BibliotecaApp:
         self.historial_text = tk.Text(frame_historial_prestamos, wrap=tk.WORD, height=10, width=50)
         self.historial_text.pack(pady=5)
         self.historial_text.config(state=tk.DISABLED)
+        # El historial consulta también los préstamos archivados
+        tk.Label(frame_historial_prestamos,
+                 text="Archivar préstamos devueltos hace más de (días):").pack(pady=(10, 0))
+        self.archivo_dias_entry = tk.Entry(frame_historial_prestamos)
+        self.archivo_dias_entry.pack(pady=2)
+        self.archivo_dias_entry.insert(0, str(DatabaseManager.DIAS_ARCHIVO))
+        tk.Button(frame_historial_prestamos, text="Archivar Historial Antiguo",
+                  command=self._archivar_prestamos_gui).pack(pady=5)
+
+        # Vencidos: se cargan por páginas, del más antiguo al más reciente (índice por vencimiento)
+        frame_vencidos = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
+        self.frames["vencidos_frame"] = frame_vencidos
+        tk.Label(frame_vencidos, text="Préstamos Vencidos", font=("Arial", 12, "bold")).pack(pady=10)
+        frame_tabla_vencidos = tk.Frame(frame_vencidos)
+        frame_tabla_vencidos.pack(fill=tk.BOTH, expand=True, pady=5)
+        columnas = [("isbn", "ISBN", 100), ("titulo", "Título", 220), ("dni", "DNI", 90), ("nombre", "Usuario", 160),
+                    ("vencimiento", "Vencimiento", 130), ("retraso", "Días de retraso", 100)]
+        self.vencidos_tree = ttk.Treeview(frame_tabla_vencidos, columns=[c[0] for c in columnas], show="headings",
+                                          height=20)
+        for columna, titulo, ancho in columnas:
+            self.vencidos_tree.heading(columna, text=titulo)
+            self.vencidos_tree.column(columna, width=ancho, stretch=True)
+        scroll_vencidos = ttk.Scrollbar(frame_tabla_vencidos, orient=tk.VERTICAL, command=self.vencidos_tree.yview)
+        self.vencidos_tree.configure(yscrollcommand=scroll_vencidos.set)
+        self.vencidos_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll_vencidos.pack(side=tk.RIGHT, fill=tk.Y)
+        self.vencidos_info = tk.Label(frame_vencidos, text="")
+        self.vencidos_info.pack()
+        frame_botones_vencidos = tk.Frame(frame_vencidos)
+        frame_botones_vencidos.pack(pady=5)
+        tk.Button(frame_botones_vencidos, text="Actualizar", command=self._ver_vencidos_gui).pack(side=tk.LEFT, padx=2)
+        self.vencidos_mas_button = tk.Button(frame_botones_vencidos, text="Cargar Más", state=tk.DISABLED,
+                                             command=self._cargar_mas_vencidos_gui)
+        self.vencidos_mas_button.pack(side=tk.LEFT, padx=2)
+        self._vencidos_ahora = None  # Momento de referencia de la consulta mostrada
+        self._vencidos_total = 0
+        self._vencidos_ultimo = None  # (fecha_vencimiento, id) de la última fila cargada
+
+    def create_stats_frame(self):
+        frame_estadisticas = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
+        self.frames["estadisticas_frame"] = frame_estadisticas
+        tk.Label(frame_estadisticas, text="Estadísticas de Préstamos", font=("Arial", 12, "bold")).pack(pady=10)
+        frame_botones_estadisticas = tk.Frame(frame_estadisticas)
+        frame_botones_estadisticas.pack(pady=5)
+        tk.Button(frame_botones_estadisticas, text="Ver Más Prestados", command=self._ver_estadisticas_gui).pack(
+            side=tk.LEFT, padx=2)
+        tk.Button(frame_botones_estadisticas, text="Recalcular Contadores",
+                  command=self._reconstruir_contadores_gui).pack(side=tk.LEFT, padx=2)
+        self.estadisticas_text = tk.Text(frame_estadisticas, wrap=tk.WORD, height=25, width=70)
+        self.estadisticas_text.pack(pady=5)
+        self.estadisticas_text.config(state=tk.DISABLED)
 
     def create_export_frame(self):
         frame_exportar_info = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
         self.frames["exportar_informacion_frame"] = frame_exportar_info
         tk.Label(frame_exportar_info, text="Exportar Información", font=("Arial", 12, "bold")).pack(pady=10)
-        tk.Label(frame_exportar_info, text="Nombre del archivo:").pack()
+        tk.Label(frame_exportar_info, text="Nombre del archivo (.txt, .csv o .jsonl):").pack()
         self.export_filename_entry = tk.Entry(frame_exportar_info)
         self.export_filename_entry.pack(pady=2)
         self.export_filename_entry.insert(0, "biblioteca_data.txt")
         tk.Button(frame_exportar_info, text="Seleccionar Ruta y Exportar", command=self._exportar_informacion_gui).pack(
             pady=10)
 
+    def create_metrics_frame(self):
+        frame_metricas = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
+        self.frames["metricas_frame"] = frame_metricas
+        tk.Label(frame_metricas, text="Métricas de la Base de Datos", font=("Arial", 12, "bold")).pack(pady=10)
+        frame_botones_metricas = tk.Frame(frame_metricas)
+        frame_botones_metricas.pack(pady=5)
+        tk.Button(frame_botones_metricas, text="Actualizar", command=self._ver_metricas_gui).pack(side=tk.LEFT, padx=2)
+        tk.Button(frame_botones_metricas, text="Guardar Volcado...", command=self._volcar_metricas_gui).pack(
+            side=tk.LEFT, padx=2)
+        tk.Button(frame_botones_metricas, text="Reiniciar", command=self._reiniciar_metricas_gui).pack(side=tk.LEFT,
+                                                                                                      padx=2)
+        self.metricas_text = tk.Text(frame_metricas, wrap=tk.NONE, height=25, width=110)
+        self.metricas_text.pack(pady=5, fill=tk.BOTH, expand=True)
+        self.metricas_text.config(state=tk.DISABLED)
+
+    # Listado virtualizado: solo se mantienen en el Treeview unas pocas páginas alrededor de la zona visible
+    TAMANO_PAGINA_LISTADO = 100
+    MAX_PAGINAS_LISTADO = 3
+
     def create_list_frames(self):
         frame_listar_libros = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
         self.frames["listar_libros_frame"] = frame_listar_libros
         tk.Label(frame_listar_libros, text="Listado de Libros", font=("Arial", 12, "bold")).pack(pady=10)
-        self.list_libros_text = tk.Text(frame_listar_libros, wrap=tk.WORD, height=20, width=70)
-        self.list_libros_text.pack(pady=5)
-        self.list_libros_text.config(state=tk.DISABLED)
+
+        frame_tabla = tk.Frame(frame_listar_libros)
+        frame_tabla.pack(fill=tk.BOTH, expand=True, pady=5)
+        columnas = [("isbn", "ISBN", 90), ("titulo", "Título", 220), ("autor", "Autor", 160),
+                    ("editorial", "Editorial", 130), ("estado", "Estado", 90), ("prestado_a", "Prestado a", 200)]
+        self.lista_libros_tree = ttk.Treeview(frame_tabla, columns=[c[0] for c in columnas], show="headings",
+                                              height=20)
+        for columna, titulo, ancho in columnas:
+            self.lista_libros_tree.heading(columna, text=titulo)
+            self.lista_libros_tree.column(columna, width=ancho, stretch=True)
+        self.lista_libros_scroll = ttk.Scrollbar(frame_tabla, orient=tk.VERTICAL,
+                                                 command=self.lista_libros_tree.yview)
+        self.lista_libros_tree.configure(yscrollcommand=self._on_lista_libros_scroll)
+        self.lista_libros_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.lista_libros_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.lista_libros_info = tk.Label(frame_listar_libros, text="")
+        self.lista_libros_info.pack()
         tk.Button(frame_listar_libros, text="Actualizar Lista", command=self._listar_libros_gui).pack(pady=10)
 
+        self._lista_hay_anteriores = False
+        self._lista_hay_siguientes = False
+        self._lista_cargando = False
+        self._lista_total = 0
+
     def create_graph_frames(self):
         # Código para crear los frames del grafo (sin cambios significativos aquí)
         frame_grafo = tk.Frame(self.main_frame, bd=2, relief=tk.RIDGE)
@@ -525,7 +465,7 @@ class BibliotecaApp:
             'prestado_a': []  # Esto ya no se usa para registrar, solo para la vista si se carga
         }
 
-        if biblioteca_isbn.insertar_libro(libro):  # Llama a la capa de abstracción de la biblioteca
+        if self.biblioteca_isbn.insertar_libro(libro):  # Llama a la capa de abstracción de la biblioteca
             self.set_status(f"Libro '{titulo}' con ISBN '{isbn}' registrado con éxito.")
             self.reg_isbn_entry.delete(0, tk.END)
             self.reg_titulo_entry.delete(0, tk.END)
@@ -547,15 +487,16 @@ class BibliotecaApp:
             self.set_status("El ISBN debe ser numérico.", True)
             return
 
-        libro_encontrado = biblioteca_isbn.buscar_libro_por_isbn(isbn_busqueda)  # Usa el método de la biblioteca
+        # Usa el método de la biblioteca
+        libro_encontrado = self.biblioteca_isbn.buscar_libro_por_isbn(isbn_busqueda, incluir_historial=False)
         if libro_encontrado:
             disponibilidad = "Disponible" if libro_encontrado['disponible'] else "No disponible"
 
-            ultimo_prestamo_dni = db_manager.get_current_borrower(isbn_busqueda)  # Consulta activa en la DB
+            # El registro ya trae el préstamo activo (dni_prestatario/nombre_prestatario): sin más consultas
             ultimo_prestamo = ""
-            if ultimo_prestamo_dni:
-                nombre_usuario = db_manager.get_usuario(ultimo_prestamo_dni)['nombre']
-                ultimo_prestamo = f", Último prestado a: {nombre_usuario} (DNI: {ultimo_prestamo_dni})"
+            if libro_encontrado.dni_prestatario:
+                nombre_usuario = libro_encontrado.nombre_prestatario or "Usuario borrado"
+                ultimo_prestamo = f", Último prestado a: {nombre_usuario} (DNI: {libro_encontrado.dni_prestatario})"
 
             info_text = (f"ISBN: {libro_encontrado['isbn']}\n"
                          f"Título: {libro_encontrado['titulo']}\n"
@@ -568,6 +509,31 @@ class BibliotecaApp:
             self.set_status("No se encontró ningún libro con ese ISBN.", True)
             self.libro_encontrado_info.config(text="")
 
+    def _buscar_libros_texto_gui(self):
+        texto = self.buscar_texto_entry.get().strip()
+
+        self.buscar_texto_resultados.config(state=tk.NORMAL)
+        self.buscar_texto_resultados.delete(1.0, tk.END)
+
+        if not texto:
+            self.set_status("Por favor, ingrese el texto a buscar.", True)
+            self.buscar_texto_resultados.config(state=tk.DISABLED)
+            return
+
+        libros = self.biblioteca_isbn.buscar_libros_por_texto(texto)  # Ordenados por relevancia
+        if libros:
+            for libro in libros:
+                disponibilidad = "Disponible" if libro['disponible'] else "No disponible"
+                self.buscar_texto_resultados.insert(
+                    tk.END, f"ISBN: {libro['isbn']} - {libro['titulo']}\n"
+                            f"  Autor: {libro['autor']}, Editorial: {libro['editorial']}, Estado: {disponibilidad}\n")
+            self.set_status(f"Se encontraron {len(libros)} libro(s) para '{texto}'.")
+        else:
+            self.buscar_texto_resultados.insert(tk.END, "No se encontraron libros.")
+            self.set_status(f"No se encontraron libros para '{texto}'.", True)
+
+        self.buscar_texto_resultados.config(state=tk.DISABLED)
+
     def _borrar_libro_gui(self):
         isbn_borrar = self.borrar_isbn_entry.get().strip()
 
@@ -582,13 +548,13 @@ class BibliotecaApp:
         if messagebox.askyesno("Confirmar Borrado",
                                f"¿Está seguro de que desea borrar el libro con ISBN '{isbn_borrar}'?"):
             # Antes de borrar, verificar si está prestado actualmente
-            libro = db_manager.get_libro(isbn_borrar)
+            libro = self.db_manager.get_libro(isbn_borrar, incluir_historial=False)
             if libro and not libro['disponible']:
                 self.set_status(f"No se puede borrar el libro con ISBN '{isbn_borrar}'. Está actualmente prestado.",
                                 True)
                 return
 
-            if biblioteca_isbn.borrar_libro(isbn_borrar):  # Usa el método de la biblioteca
+            if self.biblioteca_isbn.borrar_libro(isbn_borrar):  # Usa el método de la biblioteca
                 self.set_status(f"Libro con ISBN '{isbn_borrar}' borrado con éxito.")
                 self.borrar_isbn_entry.delete(0, tk.END)
                 self._actualizar_grafo_libro_borrado(isbn_borrar)
@@ -609,7 +575,7 @@ class BibliotecaApp:
             self.set_status("El DNI debe ser numérico.", True)
             return
 
-        if db_manager.add_usuario(dni, nombre):  # Llama al DatabaseManager
+        if self.db_manager.add_usuario(dni, nombre):  # Llama al DatabaseManager
             self.set_status(f"Usuario '{nombre}' registrado con DNI '{dni}' con éxito.")
             self.reg_dni_entry.delete(0, tk.END)
             self.reg_nombre_entry.delete(0, tk.END)
@@ -629,7 +595,7 @@ class BibliotecaApp:
             self.set_status("El DNI debe ser numérico.", True)
             return
 
-        usuario_encontrado = db_manager.get_usuario(dni_busqueda)  # Llama al DatabaseManager
+        usuario_encontrado = self.db_manager.get_usuario(dni_busqueda)  # Llama al DatabaseManager
         if usuario_encontrado:
             self.usuario_encontrado_info.config(
                 text=f"Usuario encontrado: DNI: {usuario_encontrado['dni']}, Nombre: {usuario_encontrado['nombre']}")
@@ -652,16 +618,17 @@ class BibliotecaApp:
         if messagebox.askyesno("Confirmar Borrado",
                                f"¿Está seguro de que desea borrar el usuario con DNI '{dni_borrar}'?"):
             # Comprobar si el usuario tiene libros prestados ACTIVOS
-            libros_prestados_a_usuario = db_manager.get_libros_prestados_by_usuario(dni_borrar)
+            libros_prestados_a_usuario = self.db_manager.get_libros_prestados_by_usuario(dni_borrar)
 
             if libros_prestados_a_usuario:
-                libros_info = [db_manager.get_libro(isbn)['titulo'] for isbn in libros_prestados_a_usuario]
+                libros_info = [self.db_manager.get_libro(isbn, incluir_historial=False)['titulo'] for isbn in
+                               libros_prestados_a_usuario]
                 self.set_status(
                     f"No se puede borrar el usuario. Tiene los siguientes libros prestados: {', '.join(libros_info)}",
                     True)
                 return
 
-            if db_manager.delete_usuario(dni_borrar):  # Llama al DatabaseManager
+            if self.db_manager.delete_usuario(dni_borrar):  # Llama al DatabaseManager
                 self.set_status(f"Usuario con DNI '{dni_borrar}' borrado con éxito.")
                 self.borrar_dni_entry.delete(0, tk.END)
                 self._actualizar_grafo_usuario_borrado(dni_borrar)
@@ -671,36 +638,101 @@ class BibliotecaApp:
                     True)
 
     def _listar_libros_gui(self):
-        libros = biblioteca_isbn.listar_libros_ordenado_por_isbn()  # Usa el método de la biblioteca
-        all_users = db_manager.get_all_usuarios()  # Obtener usuarios de la DB
-
-        self.list_libros_text.config(state=tk.NORMAL)
-        self.list_libros_text.delete(1.0, tk.END)
+        # Vuelve a la primera página; el resto se pide a la BD al desplazarse por la lista
+        def cargar_primera_pagina(tarea):
+            total = self.db_manager.contar_libros()
+            tarea.comprobar_cancelacion()
+            return total, self.biblioteca_isbn.pagina_libros_ordenado_por_isbn(limite=self.TAMANO_PAGINA_LISTADO)
+
+        self._ejecutar_en_segundo_plano("Cargando listado de libros", cargar_primera_pagina,
+                                        al_terminar=self._mostrar_primera_pagina_listado)
+
+    def _mostrar_primera_pagina_listado(self, resultado):
+        self._lista_total, libros = resultado
+        self.lista_libros_tree.delete(*self.lista_libros_tree.get_children())
+        self._lista_hay_anteriores = False
+        self._lista_hay_siguientes = len(libros) == self.TAMANO_PAGINA_LISTADO
+        for libro in libros:
+            self._insertar_fila_libro(libro, tk.END)
+        self._actualizar_info_listado()
 
         if libros:
-            self.list_libros_text.insert(tk.END, "Listado de libros (ordenado por ISBN):\n\n")
-            for libro in libros:
-                disponibilidad = "Disponible" if libro['disponible'] else "No disponible"
-
-                ultimo_prestamo_dni = db_manager.get_current_borrower(libro['isbn'])
-                ultimo_prestamo = "Ninguno"
-                if ultimo_prestamo_dni:
-                    ultimo_prestamo = all_users.get(ultimo_prestamo_dni,
-                                                    "Usuario desconocido") + f" (DNI: {ultimo_prestamo_dni})"
-
-                self.list_libros_text.insert(tk.END, f"ISBN: {libro['isbn']}\n")
-                self.list_libros_text.insert(tk.END, f"  Título: {libro['titulo']}\n")
-                self.list_libros_text.insert(tk.END, f"  Autor: {libro['autor']}\n")
-                self.list_libros_text.insert(tk.END, f"  Editorial: {libro['editorial']}\n")
-                self.list_libros_text.insert(tk.END, f"  Estado: {disponibilidad}\n")
-                self.list_libros_text.insert(tk.END, f"  Prestado a: {ultimo_prestamo}\n")
-                self.list_libros_text.insert(tk.END, "--------------------------------------------------\n")
             self.set_status("Listado de libros actualizado.")
         else:
-            self.list_libros_text.insert(tk.END, "No hay libros registrados en la biblioteca.")
             self.set_status("No hay libros registrados.")
 
-        self.list_libros_text.config(state=tk.DISABLED)
+    def _insertar_fila_libro(self, libro, posicion):
+        disponibilidad = "Disponible" if libro['disponible'] else "No disponible"
+
+        ultimo_prestamo_dni = libro['dni_prestatario']
+        ultimo_prestamo = "Ninguno"
+        if ultimo_prestamo_dni:
+            ultimo_prestamo = (libro['nombre_prestatario'] or
+                               "Usuario desconocido") + f" (DNI: {ultimo_prestamo_dni})"
+
+        self.lista_libros_tree.insert("", posicion, iid=libro['isbn'], values=(
+            libro['isbn'], libro['titulo'], libro['autor'], libro['editorial'], disponibilidad, ultimo_prestamo))
+
+    def _actualizar_info_listado(self):
+        filas = self.lista_libros_tree.get_children()
+        if filas:
+            self.lista_libros_info.config(
+                text=f"{self._lista_total} libro(s) en total. En memoria: ISBN {filas[0]} a {filas[-1]}.")
+        else:
+            self.lista_libros_info.config(text="No hay libros registrados en la biblioteca.")
+
+    def _on_lista_libros_scroll(self, primero, ultimo):
+        self.lista_libros_scroll.set(primero, ultimo)
+        if self._lista_cargando:
+            return
+        # Cerca de un extremo de la ventana cargada se pide la página contigua
+        if float(ultimo) > 0.9 and self._lista_hay_siguientes:
+            self.master.after_idle(self._cargar_pagina_listado, True)
+        elif float(primero) < 0.1 and self._lista_hay_anteriores:
+            self.master.after_idle(self._cargar_pagina_listado, False)
+
+    def _cargar_pagina_listado(self, hacia_adelante):
+        if self._lista_cargando:
+            return
+        self._lista_cargando = True
+        try:
+            tree = self.lista_libros_tree
+            filas = tree.get_children()
+            if not filas:
+                return
+            fila_superior = int(tree.yview()[0] * len(filas) + 0.5)  # Índice de la primera fila visible
+
+            if hacia_adelante:
+                libros = self.biblioteca_isbn.pagina_libros_ordenado_por_isbn(
+                    despues_de=filas[-1], limite=self.TAMANO_PAGINA_LISTADO)
+                self._lista_hay_siguientes = len(libros) == self.TAMANO_PAGINA_LISTADO
+                for libro in libros:
+                    self._insertar_fila_libro(libro, tk.END)
+                # Descartar las filas más antiguas para no acumular todo el catálogo
+                sobrantes = len(tree.get_children()) - self.TAMANO_PAGINA_LISTADO * self.MAX_PAGINAS_LISTADO
+                if sobrantes > 0:
+                    tree.delete(*tree.get_children()[:sobrantes])
+                    self._lista_hay_anteriores = True
+                    fila_superior -= sobrantes
+            else:
+                libros = self.biblioteca_isbn.pagina_libros_ordenado_por_isbn(
+                    antes_de=filas[0], limite=self.TAMANO_PAGINA_LISTADO)
+                self._lista_hay_anteriores = len(libros) == self.TAMANO_PAGINA_LISTADO
+                for libro in reversed(libros):
+                    self._insertar_fila_libro(libro, 0)
+                fila_superior += len(libros)
+                sobrantes = len(tree.get_children()) - self.TAMANO_PAGINA_LISTADO * self.MAX_PAGINAS_LISTADO
+                if sobrantes > 0:
+                    tree.delete(*tree.get_children()[-sobrantes:])
+                    self._lista_hay_siguientes = True
+
+            # Mantener a la vista las mismas filas que antes de cargar/descartar
+            total_filas = len(tree.get_children())
+            if total_filas:
+                tree.yview_moveto(max(fila_superior, 0) / total_filas)
+            self._actualizar_info_listado()
+        finally:
+            self._lista_cargando = False
 
     def _prestar_libro_gui(self):
         isbn_prestamo = self.prest_isbn_entry.get().strip()
@@ -718,25 +750,17 @@ class BibliotecaApp:
             self.set_status("El DNI debe ser numérico.", True)
             return
 
-        libro_encontrado = db_manager.get_libro(isbn_prestamo)  # Obtener de la DB
-        if not libro_encontrado:
+        # Validación, cambio de disponibilidad y registro del préstamo en una sola transacción
+        resultado = self.db_manager.prestar_libro(isbn_prestamo, dni_usuario)
+        if resultado['resultado'] == DatabaseManager.LIBRO_NO_ENCONTRADO:
             self.set_status("No se encontró ningún libro con ese ISBN.", True)
-            return
-
-        usuario_encontrado = db_manager.get_usuario(dni_usuario)  # Obtener de la DB
-        if not usuario_encontrado:
+        elif resultado['resultado'] == DatabaseManager.USUARIO_NO_ENCONTRADO:
             self.set_status("El DNI ingresado no corresponde a ningún usuario registrado.", True)
-            return
-
-        if not libro_encontrado['disponible']:
-            current_borrower_dni = db_manager.get_current_borrower(isbn_prestamo)
-            current_borrower_name = db_manager.get_usuario(current_borrower_dni)[
-                'nombre'] if current_borrower_dni else "Usuario desconocido"
+        elif resultado['resultado'] == DatabaseManager.LIBRO_NO_DISPONIBLE:
+            current_borrower_name = resultado['nombre_prestatario'] or "Usuario desconocido"
             self.set_status(f"El libro ya está prestado a {current_borrower_name}.", True)
-            return
-
-        if db_manager.registrar_prestamo(isbn_prestamo, dni_usuario):  # Llama al DatabaseManager
-            self.set_status(f"Libro '{libro_encontrado['titulo']}' prestado a {usuario_encontrado['nombre']}.")
+        elif resultado['resultado'] == DatabaseManager.PRESTAMO_OK:
+            self.set_status(f"Libro '{resultado['titulo']}' prestado a {resultado['nombre']}.")
             self.prest_isbn_entry.delete(0, tk.END)
             self.prest_dni_entry.delete(0, tk.END)
             self._actualizar_grafo_prestamo(dni_usuario, isbn_prestamo)
@@ -754,24 +778,16 @@ class BibliotecaApp:
             self.set_status("El ISBN debe ser numérico.", True)
             return
 
-        libro_encontrado = db_manager.get_libro(isbn_devolucion)  # Obtener de la DB
-        if not libro_encontrado:
+        # Cierra el préstamo activo y libera el libro en una sola transacción
+        resultado = self.db_manager.devolver_libro(isbn_devolucion)
+        if resultado['resultado'] == DatabaseManager.LIBRO_NO_ENCONTRADO:
             self.set_status("No se encontró ningún libro con ese ISBN.", True)
-            return
-
-        if libro_encontrado['disponible']:
+        elif resultado['resultado'] == DatabaseManager.LIBRO_NO_PRESTADO:
             self.set_status("El libro no está prestado.", True)
-            return
-
-        # Obtener el último prestatario activo
-        dni_usuario_devolvio = db_manager.get_current_borrower(isbn_devolucion)
-        if not dni_usuario_devolvio:
-            self.set_status("Error: No se encontró un préstamo activo para este libro.", True)
-            return
-
-        if db_manager.registrar_devolucion(isbn_devolucion, dni_usuario_devolvio):  # Llama al DatabaseManager
-            nombre_usuario_devolvio = db_manager.get_usuario(dni_usuario_devolvio)['nombre']
-            self.set_status(f"Libro '{libro_encontrado['titulo']}' devuelto por {nombre_usuario_devolvio}.")
+        elif resultado['resultado'] == DatabaseManager.PRESTAMO_OK:
+            dni_usuario_devolvio = resultado['dni_prestatario']
+            nombre_usuario_devolvio = resultado['nombre_prestatario'] or "Usuario desconocido"
+            self.set_status(f"Libro '{resultado['titulo']}' devuelto por {nombre_usuario_devolvio}.")
             self.dev_isbn_entry.delete(0, tk.END)
             self._actualizar_grafo_devolucion(dni_usuario_devolvio, isbn_devolucion)
         else:
@@ -779,6 +795,200 @@ class BibliotecaApp:
                 "Error al registrar la devolución. Puede que el libro no esté prestado o no haya un registro activo.",
                 True)
 
+    # --- Mostrador por lotes ---
+    MENSAJES_LOTE = {
+        DatabaseManager.PRESTAMO_OK: "OK",
+        DatabaseManager.LIBRO_NO_ENCONTRADO: "ISBN no encontrado",
+        DatabaseManager.LIBRO_NO_DISPONIBLE: "ya prestado",
+        DatabaseManager.LIBRO_NO_PRESTADO: "no estaba prestado",
+        DatabaseManager.ISBN_REPETIDO: "repetido en el lote (se ignora)",
+        DatabaseManager.USUARIO_NO_ENCONTRADO: "usuario no encontrado",
+        DatabaseManager.ERROR_BD: "error de base de datos",
+    }
+
+    def _encolar_escaneo(self, event=None):
+        isbn = self.mostrador_isbn_entry.get().strip()
+        self.mostrador_isbn_entry.delete(0, tk.END)
+        if not isbn:
+            return
+        if not isbn.isdigit():
+            self.set_status(f"ISBN '{isbn}' ignorado: el ISBN debe ser numérico.", True)
+            return
+        self.mostrador_cola_listbox.insert(tk.END, isbn)
+        self.mostrador_cola_listbox.see(tk.END)
+        self.set_status(f"{self.mostrador_cola_listbox.size()} libro(s) en la cola del mostrador.")
+
+    def _quitar_escaneo(self):
+        for indice in reversed(self.mostrador_cola_listbox.curselection()):
+            self.mostrador_cola_listbox.delete(indice)
+
+    def _vaciar_cola_mostrador(self):
+        self.mostrador_cola_listbox.delete(0, tk.END)
+
+    def _cola_mostrador(self):
+        isbns = list(self.mostrador_cola_listbox.get(0, tk.END))
+        if not isbns:
+            self.set_status("La cola del mostrador está vacía. Escanee al menos un ISBN.", True)
+        return isbns
+
+    def _mostrar_resultados_lote(self, titulo, resultados):
+        lineas = [titulo]
+        for r in resultados:
+            mensaje = self.MENSAJES_LOTE.get(r['resultado'], r['resultado'])
+            if r['resultado'] == DatabaseManager.LIBRO_NO_DISPONIBLE and r['nombre_prestatario']:
+                mensaje += f" a {r['nombre_prestatario']}"
+            lineas.append(f"  {r['isbn']} {r['titulo'] or ''}: {mensaje}")
+        self.mostrador_resultados_text.config(state=tk.NORMAL)
+        self.mostrador_resultados_text.delete(1.0, tk.END)
+        self.mostrador_resultados_text.insert(tk.END, "\n".join(lineas))
+        self.mostrador_resultados_text.config(state=tk.DISABLED)
+
+    def _prestar_lote_gui(self):
+        dni_usuario = self.mostrador_dni_entry.get().strip()
+        if not dni_usuario:
+            self.set_status("El DNI del usuario es obligatorio para prestar.", True)
+            return
+        if not dni_usuario.isdigit():
+            self.set_status("El DNI debe ser numérico.", True)
+            return
+        isbns = self._cola_mostrador()
+        if not isbns:
+            return
+
+        resultados = self.db_manager.prestar_lote(dni_usuario, isbns)
+        prestados = [r['isbn'] for r in resultados if r['resultado'] == DatabaseManager.PRESTAMO_OK]
+        for isbn in prestados:
+            self._actualizar_grafo_prestamo(dni_usuario, isbn, informar=False)
+
+        nombre = resultados[0]['nombre'] or dni_usuario
+        self._mostrar_resultados_lote(f"Préstamo a {nombre}:", resultados)
+        if resultados[0]['resultado'] == DatabaseManager.USUARIO_NO_ENCONTRADO:
+            self.set_status("El DNI ingresado no corresponde a ningún usuario registrado.", True)
+            return
+        self.set_status(f"{len(prestados)} de {len(isbns)} libro(s) prestados a {nombre}.",
+                        len(prestados) < len(isbns))
+        if prestados:
+            self._vaciar_cola_mostrador()
+
+    def _devolver_lote_gui(self):
+        isbns = self._cola_mostrador()
+        if not isbns:
+            return
+
+        resultados = self.db_manager.devolver_lote(isbns)
+        devueltos = [r for r in resultados if r['resultado'] == DatabaseManager.PRESTAMO_OK]
+        for r in devueltos:
+            self._actualizar_grafo_devolucion(r['dni_prestatario'], r['isbn'], informar=False)
+
+        self._mostrar_resultados_lote("Devolución:", resultados)
+        self.set_status(f"{len(devueltos)} de {len(isbns)} libro(s) devueltos.", len(devueltos) < len(isbns))
+        if devueltos:
+            self._vaciar_cola_mostrador()
+
+    # --- Estadísticas de préstamos (contadores materializados) ---
+    def _ver_estadisticas_gui(self, limite=10):
+        lineas = [f"Libros más prestados (top {limite}):"]
+        for isbn, titulo, prestamos in self.db_manager.get_libros_mas_prestados(limite):
+            lineas.append(f"  {prestamos:6d}  {titulo or 'Libro borrado'} (ISBN: {isbn})")
+        lineas.append(f"\nUsuarios más activos (top {limite}):")
+        for dni, nombre, prestamos in self.db_manager.get_usuarios_mas_activos(limite):
+            lineas.append(f"  {prestamos:6d}  {nombre or 'Usuario borrado'} (DNI: {dni})")
+        lineas.append(f"\nAutores más prestados (top {limite}):")
+        for autor, prestamos in self.db_manager.get_autores_mas_prestados(limite):
+            lineas.append(f"  {prestamos:6d}  {autor}")
+        lineas.append("\nÚltimos días con actividad (préstamos / devoluciones):")
+        for dia, prestamos, devoluciones in self.db_manager.get_circulacion_por_dia(limite=7):
+            lineas.append(f"  {dia}: {prestamos} / {devoluciones}")
+
+        self.estadisticas_text.config(state=tk.NORMAL)
+        self.estadisticas_text.delete(1.0, tk.END)
+        self.estadisticas_text.insert(tk.END, "\n".join(lineas))
+        self.estadisticas_text.config(state=tk.DISABLED)
+        self.set_status("Estadísticas de préstamos actualizadas.")
+
+    def _reconstruir_contadores_gui(self):
+        def al_terminar(ok):
+            if ok:
+                self._ver_estadisticas_gui()
+            else:
+                self.set_status("Error al recalcular los contadores de préstamos.", True)
+
+        self._ejecutar_en_segundo_plano("Recalculando contadores",
+                                        lambda tarea: self.db_manager.reconstruir_contadores(),
+                                        al_terminar=al_terminar)
+
+    # --- Préstamos vencidos ---
+    TAMANO_PAGINA_VENCIDOS = 100
+
+    def _ver_vencidos_gui(self):
+        # Mismo instante para el recuento y todas las páginas: la lista no cambia al ir cargando más
+        ahora = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+        def cargar(tarea):
+            total = self.db_manager.contar_vencidos(ahora)
+            tarea.comprobar_cancelacion()
+            return total, self.db_manager.get_pagina_vencidos(limite=self.TAMANO_PAGINA_VENCIDOS, ahora=ahora)
+
+        def al_terminar(resultado):
+            self._vencidos_ahora = ahora
+            self._vencidos_total, filas = resultado
+            self._vencidos_ultimo = None
+            self.vencidos_tree.delete(*self.vencidos_tree.get_children())
+            self._mostrar_pagina_vencidos(filas)
+            self.set_status("Préstamos vencidos actualizados.")
+
+        self._ejecutar_en_segundo_plano("Buscando préstamos vencidos", cargar, al_terminar=al_terminar)
+
+    def _cargar_mas_vencidos_gui(self):
+        if self._vencidos_ultimo is None:
+            return
+        filas = self.db_manager.get_pagina_vencidos(despues_de=self._vencidos_ultimo,
+                                                    limite=self.TAMANO_PAGINA_VENCIDOS, ahora=self._vencidos_ahora)
+        self._mostrar_pagina_vencidos(filas)
+
+    def _mostrar_pagina_vencidos(self, filas):
+        ahora = datetime.strptime(self._vencidos_ahora, "%Y-%m-%d %H:%M:%S")
+        for id_prestamo, isbn, titulo, dni, nombre, _, vencimiento in filas:
+            retraso = (ahora - datetime.strptime(vencimiento, "%Y-%m-%d %H:%M:%S")).days
+            self.vencidos_tree.insert("", tk.END, iid=str(id_prestamo), values=(
+                isbn, titulo or "Libro borrado", dni, nombre or "Usuario borrado", vencimiento, retraso))
+        if filas:
+            self._vencidos_ultimo = (filas[-1][6], filas[-1][0])
+        mostrados = len(self.vencidos_tree.get_children())
+        self.vencidos_mas_button.config(state=tk.NORMAL if mostrados < self._vencidos_total else tk.DISABLED)
+        self.vencidos_info.config(text=f"{self._vencidos_total} préstamo(s) vencido(s) a {self._vencidos_ahora} "
+                                       f"(UTC). Mostrando {mostrados}.")
+
+    # --- Métricas de la base de datos ---
+    def _ver_metricas_gui(self):
+        metricas = self.db_manager.metricas
+        texto = metricas.resumen() if metricas else (
+            "La instrumentación está desactivada (DatabaseManager(instrumentar=True) para activarla).")
+        self.metricas_text.config(state=tk.NORMAL)
+        self.metricas_text.delete(1.0, tk.END)
+        self.metricas_text.insert(tk.END, texto)
+        self.metricas_text.config(state=tk.DISABLED)
+        self.set_status("Métricas actualizadas.")
+
+    def _volcar_metricas_gui(self):
+        if not self.db_manager.metricas:
+            self.set_status("La instrumentación de la base de datos está desactivada.", True)
+            return
+        ruta = filedialog.asksaveasfilename(defaultextension=".json", initialfile="biblioteca_metricas.json",
+                                            filetypes=[("JSON", "*.json"), ("Texto", "*.txt")])
+        if not ruta:
+            return
+        try:
+            self.db_manager.metricas.volcar(ruta)
+            self.set_status(f"Métricas guardadas en '{ruta}'.")
+        except OSError as e:
+            self.set_status(f"Error al guardar las métricas: {e}", True)
+
+    def _reiniciar_metricas_gui(self):
+        if self.db_manager.metricas:
+            self.db_manager.metricas.reiniciar()
+        self._ver_metricas_gui()
+
     def _historial_prestamos_gui(self):
         isbn_historial = self.hist_isbn_entry.get().strip()
 
@@ -795,12 +1005,13 @@ class BibliotecaApp:
             self.historial_text.config(state=tk.DISABLED)
             return
 
-        libro_encontrado = db_manager.get_libro(isbn_historial)  # Obtener de la DB
+        # El historial se lee abajo
+        libro_encontrado = self.db_manager.get_libro(isbn_historial, incluir_historial=False)
         if libro_encontrado:
             self.historial_text.insert(tk.END, f"Historial de préstamos del libro '{libro_encontrado['titulo']}':\n\n")
 
-            historial_dnis = db_manager.get_historial_prestamos_libro(isbn_historial)  # Obtener de la DB
-            all_users = db_manager.get_all_usuarios()  # Obtener usuarios de la DB
+            historial_dnis = self.db_manager.get_historial_prestamos_libro(isbn_historial)  # Obtener de la DB
+            all_users = self.db_manager.get_all_usuarios()  # Obtener usuarios de la DB
 
             if historial_dnis:
                 for i, dni in enumerate(historial_dnis):
@@ -828,99 +1039,139 @@ class BibliotecaApp:
 
         ruta_completa = os.path.join(ruta_guardado, nombre_archivo)
 
-        try:
-            with open(ruta_completa, 'w', encoding='utf-8') as archivo:
-                archivo.write("--- Información de Libros ---\n")
-                libros = biblioteca_isbn.listar_libros_ordenado_por_isbn()  # Usa el método de la biblioteca
-                all_users = db_manager.get_all_usuarios()  # Obtener usuarios de la DB
-
-                if libros:
-                    for libro in libros:
-                        disponibilidad = "Disponible" if libro['disponible'] else "No disponible"
-                        ultimo_prestamo_dni = db_manager.get_current_borrower(libro['isbn'])
-                        ultimo_prestamo_nombre = all_users.get(ultimo_prestamo_dni,
-                                                               'Ninguno') if ultimo_prestamo_dni else 'Ninguno'
-
-                        archivo.write(
-                            f"ISBN: {libro['isbn']}, Título: {libro['titulo']}, Autor: {libro['autor']}, Editorial: {libro['editorial']}, Estado: {disponibilidad}, Prestado a: {ultimo_prestamo_nombre} (DNI: {ultimo_prestamo_dni})\n")
-                else:
-                    archivo.write("No hay libros registrados.\n")
-
-                archivo.write("\n--- Información de Usuarios ---\n")
-                usuarios_data = db_manager.get_all_usuarios()  # Obtener usuarios de la DB
-                if usuarios_data:
-                    for dni, nombre in usuarios_data.items():
-                        archivo.write(f"DNI: {dni}, Nombre: {nombre}\n")
-                else:
-                    archivo.write("No hay usuarios registrados.\n")
-
-                archivo.write("\n--- Historial de Préstamos ---\n")
-                # Esto es más complejo, tendrías que iterar sobre la tabla de préstamos en la DB
-                db_manager.cursor.execute(
-                    "SELECT isbn_libro, dni_usuario, fecha_prestamo, activo FROM prestamos ORDER BY fecha_prestamo DESC")
-                prestamos_raw = db_manager.cursor.fetchall()
-
-                if prestamos_raw:
-                    for p_isbn, p_dni, p_fecha, p_activo in prestamos_raw:
-                        libro_info = db_manager.get_libro(p_isbn)
-                        usuario_info = db_manager.get_usuario(p_dni)
-
-                        titulo_libro = libro_info['titulo'] if libro_info else f"ISBN {p_isbn} (desconocido)"
-                        nombre_usuario = usuario_info['nombre'] if usuario_info else f"DNI {p_dni} (desconocido)"
-
-                        estado_prestamo = "ACTIVO" if p_activo == 1 else "DEVUELTO"
-
-                        archivo.write(f"Libro: '{titulo_libro}' (ISBN: {p_isbn})\n")
-                        archivo.write(f"  Usuario: '{nombre_usuario}' (DNI: {p_dni})\n")
-                        archivo.write(f"  Fecha Préstamo: {p_fecha}, Estado: {estado_prestamo}\n")
-                        archivo.write("  ---------------------------------------\n")
-                else:
-                    archivo.write("No hay historial de préstamos registrado.\n")
+        def exportar(tarea):
+            # Exportación en streaming; el formato (txt, csv, jsonl) se deduce de la extensión del archivo
+            try:
+                exportar_informacion(self.db_manager, ruta_completa, al_avanzar=lambda lineas: tarea.informar_progreso(
+                    lineas, None, f"{lineas} líneas escritas"))
+            except TareaCancelada:
+                os.remove(ruta_completa)  # No dejar un archivo a medias
+                raise
 
+        def al_terminar(_):
             self.set_status(f"Información exportada con éxito al archivo '{ruta_completa}'.")
             messagebox.showinfo("Exportación Exitosa", f"Información exportada a:\n{ruta_completa}")
 
-        except Exception as e:
+        def al_fallar(e):
             self.set_status(f"Ocurrió un error al exportar la información: {e}", True)
             messagebox.showerror("Error de Exportación", f"No se pudo exportar la información: {e}")
 
+        self._ejecutar_en_segundo_plano("Exportando información", exportar, al_terminar=al_terminar,
+                                        al_fallar=al_fallar)
+
+    def _archivar_prestamos_gui(self):
+        dias = self.archivo_dias_entry.get().strip()
+        if not dias.isdigit():
+            self.set_status("El número de días debe ser un entero positivo.", True)
+            return
+
+        def archivar(tarea):
+            # Lotes cortos: entre lote y lote la GUI puede seguir prestando y devolviendo
+            return self.db_manager.archivar_prestamos(int(dias), pausa=0.01, al_avanzar=lambda archivados: (
+                tarea.informar_progreso(archivados, None, f"{archivados} préstamos archivados")))
+
+        def al_terminar(archivados):
+            activos, archivo = self.db_manager.contar_prestamos()
+            self.set_status(
+                f"{archivados} préstamos archivados ({activos} en la tabla principal, {archivo} en el archivo).")
+
+        self._ejecutar_en_segundo_plano("Archivando préstamos", archivar, al_terminar=al_terminar)
+
     # --- Métodos para la gestión y consulta del Grafo (adaptados para usar DBManager) ---
 
     def _reconstruir_grafo_desde_bd(self):
         """
-        Reconstruye el grafo completamente desde los datos de la base de datos.
-        Esto se llama al inicio de la aplicación para cargar el estado persistente.
+        Carga el grafo de su instantánea y lo pone al día con el diario de cambios o, si la
+        instantánea no existe o no corresponde a la base de datos, lo reconstruye completamente
+        (y guarda una instantánea nueva). Esto se llama al inicio de la aplicación.
+        """
+        # Se construye un grafo nuevo en segundo plano y se sustituye al terminar; lo que cambie
+        # mientras tanto está en el diario de cambios, a partir de la marca del grafo nuevo.
+        def reconstruir(tarea):
+            nuevo_grafo = GrafoBiblioteca(self.db_manager)
+            ruta = self.ruta_instantanea_grafo
+            if ruta and nuevo_grafo.cargar_instantanea(ruta) and nuevo_grafo.sincronizar() is not None:
+                return nuevo_grafo, True
+            nuevo_grafo.reconstruir(al_avanzar=tarea.informar_progreso)
+            if ruta:
+                nuevo_grafo.guardar_instantanea(ruta)
+            return nuevo_grafo, False
+
+        def al_terminar(resultado):
+            nuevo_grafo, de_instantanea = resultado
+            self._reconstruir_pendiente = False
+            if nuevo_grafo.sincronizar() is None:
+                self._reconstruir_grafo_desde_bd()  # Se podaron cambios durante la carga
+                return
+            self.grafo = nuevo_grafo
+            self._guardar_marca_grafo()
+            self.cache_resultados.limpiar()
+            if de_instantanea:
+                self.set_status("Grafo cargado de la instantánea y puesto al día con la base de datos.")
+            else:
+                self.set_status("Grafo reconstruido desde la base de datos al inicio.")
+
+        def al_fallar(error):
+            self._reconstruir_pendiente = False
+            self.set_status(f"Error al reconstruir el grafo: {error}", True)
+
+        def al_cancelar():
+            self._reconstruir_pendiente = False
+            self.set_status("Reconstrucción del grafo cancelada; se mantiene el grafo actual.", True)
+
+        self._reconstruir_pendiente = True
+        self._ejecutar_en_segundo_plano("Reconstruyendo grafo", reconstruir, al_terminar=al_terminar,
+                                        al_fallar=al_fallar, al_cancelar=al_cancelar)
+
+    # Cada cuánto se aplican al grafo los cambios del diario, y cuántos como mucho cada vez
+    INTERVALO_SINCRONIZACION_MS = 2000
+    CAMBIOS_POR_SINCRONIZACION = 5000
+
+    def _sincronizar_grafo(self):
+        """
+        Aplica al grafo los cambios del diario posteriores a su marca e invalida los resultados
+        afectados. Los cambios hechos desde esta ventana ya se aplicaron en los _actualizar_grafo_*
+        (aplicarlos otra vez no hace nada); así también llegan los de otros procesos.
         """
-        grafo_biblioteca.clear()  # Limpiar cualquier estado anterior
-
-        # Añadir nodos de usuarios
-        all_users = db_manager.get_all_usuarios()
-        for dni, nombre in all_users.items():
-            grafo_biblioteca.add_node(f"u_{dni}", type='usuario', dni=dni, nombre=nombre)
-
-        # Añadir nodos de libros
-        all_libros = db_manager.get_all_libros()
-        for libro in all_libros:
-            grafo_biblioteca.add_node(f"l_{libro['isbn']}", type='libro', isbn=libro['isbn'], titulo=libro['titulo'],
-                                      autor=libro['autor'], editorial=libro['editorial'])
-
-        # Añadir aristas de préstamos activos
-        db_manager.cursor.execute("SELECT isbn_libro, dni_usuario FROM prestamos WHERE activo = 1")
-        active_loans = db_manager.cursor.fetchall()
-        for isbn, dni in active_loans:
-            usuario_id = f"u_{dni}"
-            libro_id = f"l_{isbn}"
-            if grafo_biblioteca.has_node(usuario_id) and grafo_biblioteca.has_node(libro_id):
-                grafo_biblioteca.add_edge(usuario_id, libro_id, type='presta')
-
-        self.set_status("Grafo reconstruido desde la base de datos al inicio.")
+        cambios = self.grafo.sincronizar(limite=self.CAMBIOS_POR_SINCRONIZACION)
+        if cambios is None:
+            # Se podaron cambios que el grafo no había aplicado
+            self._reconstruir_grafo_desde_bd()
+            return
+        if cambios:
+            self._guardar_marca_grafo()
+        for cambio in cambios:
+            if cambio.dni is not None:
+                self.cache_resultados.invalidar_usuario(cambio.dni)
+            if cambio.isbn is not None:
+                self.cache_resultados.invalidar_libro(cambio.isbn)
+        # Préstamos llegados por el diario (también los de otros procesos): el historial ha cambiado
+        if any(cambio.tabla == 'prestamos' for cambio in cambios):
+            self.recomendador.invalidar()
+
+    def _sincronizar_grafo_periodicamente(self):
+        # No mientras el grafo actual se va a sustituir, ni si no se llegó a cargar (carga cancelada)
+        if not self._reconstruir_pendiente and self.grafo.marca is not None:
+            self._sincronizar_grafo()
+        self.master.after(self.INTERVALO_SINCRONIZACION_MS, self._sincronizar_grafo_periodicamente)
+
+    def _guardar_marca_grafo(self):
+        # Cambios que el grafo ya aplicó: podar_cambios puede borrarlos (si los demás consumidores también)
+        self.db_manager.guardar_marca_cambios(GrafoBiblioteca.CONSUMIDOR_CAMBIOS, self.grafo.marca)
+
+    def _guardar_instantanea_grafo(self):
+        # Al cerrar: el próximo arranque carga el grafo en vez de reconstruirlo. Con la instantánea al
+        # día, el diario ya no hace falta hasta su marca y se poda, para que no crezca sin límite.
+        if self._reconstruir_pendiente or not self.ruta_instantanea_grafo or self.grafo.sincronizar() is None:
+            return
+        if self.grafo.guardar_instantanea(self.ruta_instantanea_grafo):
+            self._guardar_marca_grafo()
+            self.db_manager.podar_cambios()
 
     def _actualizar_grafo_libro_creado(self, libro):
         """Añade un nodo de libro al grafo."""
-        libro_id = f"l_{libro['isbn']}"
-        if not grafo_biblioteca.has_node(libro_id):
-            grafo_biblioteca.add_node(libro_id, type='libro', isbn=libro['isbn'], titulo=libro['titulo'],
-                                      autor=libro['autor'], editorial=libro['editorial'])
+        self.cache_resultados.invalidar_libro(libro['isbn'])
+        if self.grafo.agregar_libro(libro):
             self.set_status(f"Grafo: Libro '{libro['titulo']}' añadido como nodo.", is_error=False)
         else:
             self.set_status(
@@ -929,18 +1180,16 @@ class BibliotecaApp:
 
     def _actualizar_grafo_libro_borrado(self, isbn):
         """Elimina un nodo de libro y sus aristas asociadas del grafo."""
-        libro_id = f"l_{isbn}"
-        if grafo_biblioteca.has_node(libro_id):
-            grafo_biblioteca.remove_node(libro_id)
+        self.cache_resultados.invalidar_libro(isbn)
+        if self.grafo.eliminar_libro(isbn):
             self.set_status(f"Grafo: Libro '{isbn}' y sus relaciones eliminados del grafo.", is_error=False)
         else:
             self.set_status(f"Grafo: Advertencia - Libro '{isbn}' no encontrado como nodo para borrar.", is_error=True)
 
     def _actualizar_grafo_usuario_creado(self, dni, nombre):
         """Añade un nodo de usuario al grafo."""
-        usuario_id = f"u_{dni}"
-        if not grafo_biblioteca.has_node(usuario_id):
-            grafo_biblioteca.add_node(usuario_id, type='usuario', dni=dni, nombre=nombre)
+        self.cache_resultados.invalidar_usuario(dni)
+        if self.grafo.agregar_usuario(dni, nombre):
             self.set_status(f"Grafo: Usuario '{nombre}' añadido como nodo.", is_error=False)
         else:
             self.set_status(f"Grafo: Advertencia - Usuario '{nombre}' (DNI: {dni}) ya existía como nodo.",
@@ -948,56 +1197,48 @@ class BibliotecaApp:
 
     def _actualizar_grafo_usuario_borrado(self, dni):
         """Elimina un nodo de usuario y sus aristas asociadas del grafo."""
-        usuario_id = f"u_{dni}"
-        if grafo_biblioteca.has_node(usuario_id):
-            grafo_biblioteca.remove_node(usuario_id)
+        self.cache_resultados.invalidar_usuario(dni)
+        if self.grafo.eliminar_usuario(dni):
             self.set_status(f"Grafo: Usuario '{dni}' y sus relaciones eliminados del grafo.", is_error=False)
         else:
             self.set_status(f"Grafo: Advertencia - Usuario '{dni}' no encontrado como nodo para borrar.", is_error=True)
 
-    def _actualizar_grafo_prestamo(self, dni_usuario, isbn_libro):
-        """Añade una arista de préstamo en el grafo."""
-        usuario_id = f"u_{dni_usuario}"
-        libro_id = f"l_{isbn_libro}"
-
-        if not grafo_biblioteca.has_node(usuario_id):
-            # En un sistema real, esto no debería pasar si el usuario ya está en la BD.
-            # Aquí lo añadimos preventivamente para que el grafo refleje el estado.
-            usuario_data = db_manager.get_usuario(dni_usuario)
-            if usuario_data:
-                grafo_biblioteca.add_node(usuario_id, type='usuario', dni=dni_usuario, nombre=usuario_data['nombre'])
-                self.set_status(f"Grafo: Usuario {usuario_data['nombre']} añadido al grafo por préstamo.",
-                                is_error=False)
-            else:
-                self.set_status(f"Grafo: Error - Usuario {dni_usuario} no encontrado en DB al registrar préstamo.",
-                                True)
-                return
-
-        if not grafo_biblioteca.has_node(libro_id):
-            libro_data = db_manager.get_libro(isbn_libro)
-            if libro_data:
-                grafo_biblioteca.add_node(libro_id, type='libro', isbn=isbn_libro, titulo=libro_data['titulo'],
-                                          autor=libro_data['autor'], editorial=libro_data['editorial'])
-                self.set_status(f"Grafo: Libro {libro_data['titulo']} añadido al grafo por préstamo.", is_error=False)
-            else:
-                self.set_status(f"Grafo: Error - Libro {isbn_libro} no encontrado en DB al registrar préstamo.", True)
-                return
-
-        grafo_biblioteca.add_edge(usuario_id, libro_id, type='presta')
-        self.set_status(
-            f"Grafo: Préstamo registrado de '{db_manager.get_usuario(dni_usuario)['nombre']}' a libro '{db_manager.get_libro(isbn_libro)['titulo']}'.",
-            False)
+    def _actualizar_grafo_prestamo(self, dni_usuario, isbn_libro, informar=True):
+        """Añade una arista de préstamo en el grafo (informar=False no toca la barra de estado si va bien)."""
+        # Solo se invalidan los resultados que dependen de este usuario o de este libro
+        self.cache_resultados.invalidar_usuario(dni_usuario)
+        self.cache_resultados.invalidar_libro(isbn_libro)
+        self.recomendador.invalidar()  # El historial ha cambiado
+
+        # En un sistema real, los nodos ya deberían existir si están en la BD.
+        # Aquí se añaden preventivamente para que el grafo refleje el estado.
+        if not self.grafo.asegurar_usuario(dni_usuario):
+            self.set_status(f"Grafo: Error - Usuario {dni_usuario} no encontrado en DB al registrar préstamo.", True)
+            return
 
-    def _actualizar_grafo_devolucion(self, dni_usuario, isbn_libro):
-        """Elimina una arista de préstamo del grafo."""
-        usuario_id = f"u_{dni_usuario}"
-        libro_id = f"l_{isbn_libro}"
+        if not self.grafo.asegurar_libro(isbn_libro):
+            self.set_status(f"Grafo: Error - Libro {isbn_libro} no encontrado en DB al registrar préstamo.", True)
+            return
 
-        if grafo_biblioteca.has_edge(usuario_id, libro_id):
-            grafo_biblioteca.remove_edge(usuario_id, libro_id)
-            self.set_status(
-                f"Grafo: Préstamo de '{db_manager.get_usuario(dni_usuario)['nombre']}' a libro '{db_manager.get_libro(isbn_libro)['titulo']}' eliminado.",
-                False)
+        self.grafo.agregar_prestamo(dni_usuario, isbn_libro)
+        if not informar:
+            return
+        nombre = self.db_manager.get_usuario(dni_usuario)['nombre']
+        titulo = self.db_manager.get_libro(isbn_libro, incluir_historial=False)['titulo']
+        self.set_status(f"Grafo: Préstamo registrado de '{nombre}' a libro '{titulo}'.", False)
+
+    def _actualizar_grafo_devolucion(self, dni_usuario, isbn_libro, informar=True):
+        """Elimina una arista de préstamo del grafo (informar=False no toca la barra de estado si va bien)."""
+        self.cache_resultados.invalidar_usuario(dni_usuario)
+        self.cache_resultados.invalidar_libro(isbn_libro)
+        self.recomendador.invalidar()  # El historial ha cambiado
+
+        if self.grafo.eliminar_prestamo(dni_usuario, isbn_libro):
+            if not informar:
+                return
+            nombre = self.db_manager.get_usuario(dni_usuario)['nombre']
+            titulo = self.db_manager.get_libro(isbn_libro, incluir_historial=False)['titulo']
+            self.set_status(f"Grafo: Préstamo de '{nombre}' a libro '{titulo}' eliminado.", False)
         else:
             self.set_status(
                 f"Grafo: Advertencia - No se encontró préstamo de '{dni_usuario}' a '{isbn_libro}' en el grafo para eliminar.",
@@ -1013,49 +1254,51 @@ class BibliotecaApp:
         self.grafo_results_text.insert(tk.END, message + "\n\n")
         self.grafo_results_text.config(state=tk.DISABLED)
 
+    def _usuarios_similares_cacheados(self, dni):
+        clave = ('similares', dni)
+        similares = self.cache_resultados.get(clave)
+        if similares is None:
+            similares = self.grafo.usuarios_similares(dni)
+            # Cambia si el usuario o alguno de sus libros cambia de prestatario
+            libros = self.grafo.isbns_de_usuario(dni)
+            self.cache_resultados.put(clave, similares, usuarios=[dni], libros=libros)
+        return similares
+
+    def _clave_recomendaciones(self, dni, limite):
+        # Con la generación del modelo: al invalidarlo, las recomendaciones guardadas dejan de usarse
+        return ('recomendaciones', dni, limite, self.recomendador.generacion)
+
+    def _guardar_recomendaciones(self, clave, recomendaciones, libros_usuario):
+        # Depende del historial del usuario y de la disponibilidad de los libros recomendados
+        dni = clave[1]
+        libros = set(libros_usuario).union(isbn for isbn, _, _ in recomendaciones)
+        self.cache_resultados.put(clave, recomendaciones, usuarios=[dni], libros=libros)
+
     def _buscar_usuarios_similares_gui(self):
         self._limpiar_resultados_grafo()
         dni_base = self.grafo_similares_dni_entry.get().strip()
-        usuario_base_id = f"u_{dni_base}"
 
-        if not dni_base.isdigit() or usuario_base_id not in grafo_biblioteca:
+        if not dni_base.isdigit() or not self.grafo.contiene_usuario(dni_base):
             self.set_status("DNI no válido o usuario no registrado en el grafo.", True)
             self._mostrar_resultados_grafo("Error: DNI no válido o usuario no registrado en el grafo.")
             return
 
-        usuario_data = db_manager.get_usuario(dni_base)
+        usuario_data = self.db_manager.get_usuario(dni_base)
         usuario_nombre = usuario_data['nombre'] if usuario_data else dni_base
 
         self.set_status(f"Buscando usuarios similares a {usuario_nombre}...", is_error=False)
         self._mostrar_resultados_grafo(f"Usuarios similares a {usuario_nombre} (DNI: {dni_base}):\n")
 
-        libros_prestados_por_base = set(neighbor for neighbor in grafo_biblioteca.successors(usuario_base_id) if
-                                        grafo_biblioteca.nodes[neighbor]['type'] == 'libro')
-
-        if not libros_prestados_por_base:
+        if not self.grafo.libros_de_usuario(id_usuario(dni_base)):
             self._mostrar_resultados_grafo(f"  El usuario {usuario_nombre} no ha prestado ningún libro aún.")
             self.set_status("El usuario no ha prestado ningún libro.", is_error=True)
             return
 
-        similares_encontrados = {}  # DNI: count_shared_books
-
-        # Iterar solo sobre nodos de tipo 'usuario' en el grafo
-        for node_id in grafo_biblioteca.nodes:
-            if node_id.startswith('u_') and node_id != usuario_base_id:
-                current_dni = node_id.replace('u_', '')
-                libros_prestados_por_actual = set(neighbor for neighbor in grafo_biblioteca.successors(node_id) if
-                                                  grafo_biblioteca.nodes[neighbor]['type'] == 'libro')
-
-                libros_comunes = libros_prestados_por_base.intersection(libros_prestados_por_actual)
-
-                if len(libros_comunes) > 0:
-                    similares_encontrados[current_dni] = len(libros_comunes)
-
-        if similares_encontrados:
-            sorted_similares = sorted(similares_encontrados.items(), key=lambda item: item[1], reverse=True)
+        sorted_similares = self._usuarios_similares_cacheados(dni_base)
+        if sorted_similares:
             for dni, count in sorted_similares:
-                nombre_similar = db_manager.get_usuario(dni)['nombre'] if db_manager.get_usuario(
-                    dni) else "Usuario desconocido"
+                usuario_similar = self.db_manager.get_usuario(dni)
+                nombre_similar = usuario_similar['nombre'] if usuario_similar else "Usuario desconocido"
                 self._mostrar_resultados_grafo(f"  - {nombre_similar} (DNI: {dni}) - {count} libro(s) en común.")
         else:
             self._mostrar_resultados_grafo("  No se encontraron usuarios con libros en común.")
@@ -1064,52 +1307,53 @@ class BibliotecaApp:
     def _recomendar_libros_gui(self):
         self._limpiar_resultados_grafo()
         dni_recomendar = self.grafo_recomendar_dni_entry.get().strip()
-        usuario_id = f"u_{dni_recomendar}"
 
-        if not dni_recomendar.isdigit() or usuario_id not in grafo_biblioteca:
+        if not dni_recomendar.isdigit() or not self.grafo.contiene_usuario(dni_recomendar):
             self.set_status("DNI no válido o usuario no registrado en el grafo.", True)
             self._mostrar_resultados_grafo("Error: DNI no válido o usuario no registrado en el grafo.")
             return
 
-        usuario_data = db_manager.get_usuario(dni_recomendar)
+        usuario_data = self.db_manager.get_usuario(dni_recomendar)
         usuario_nombre = usuario_data['nombre'] if usuario_data else dni_recomendar
 
         self.set_status(f"Generando recomendaciones para {usuario_nombre}...", is_error=False)
         self._mostrar_resultados_grafo(f"Libros recomendados para {usuario_nombre} (DNI: {dni_recomendar}):\n")
 
-        libros_ya_prestados = set(neighbor for neighbor in grafo_biblioteca.successors(usuario_id) if
-                                  grafo_biblioteca.nodes[neighbor]['type'] == 'libro')
-
-        recomendaciones_candidatas = {}
-
-        similares_encontrados = {}
-        for node_id in grafo_biblioteca.nodes:
-            if node_id.startswith('u_') and node_id != usuario_id:
-                libros_prestados_por_otro = set(neighbor for neighbor in grafo_biblioteca.successors(node_id) if
-                                                grafo_biblioteca.nodes[neighbor]['type'] == 'libro')
-                if libros_prestados_por_otro.intersection(libros_ya_prestados):
-                    similares_encontrados[node_id] = libros_prestados_por_otro
-
-        if similares_encontrados:
-            for similar_user_id, libros_otro_usuario in similares_encontrados.items():
-                for libro_id in libros_otro_usuario:
-                    if libro_id not in libros_ya_prestados:
-                        # Asegurarse de que el libro esté disponible para recomendar
-                        isbn_libro = libro_id.replace('l_', '')
-                        libro_db_info = db_manager.get_libro(isbn_libro)
-                        if libro_db_info and libro_db_info['disponible']:
-                            recomendaciones_candidatas[libro_id] = recomendaciones_candidatas.get(libro_id, 0) + 1
-
-        if recomendaciones_candidatas:
-            sorted_recomendaciones = sorted(recomendaciones_candidatas.items(), key=lambda item: item[1], reverse=True)
-            count = 0
-            for libro_id, score in sorted_recomendaciones:
-                libro_data = grafo_biblioteca.nodes[libro_id]  # Obtener datos del libro del grafo
+        limite = 5  # Limitar a 5 recomendaciones
+        # Generación de antes de calcular: si el modelo se invalida mientras tanto, el resultado no se reutiliza
+        clave = self._clave_recomendaciones(dni_recomendar, limite)
+        recomendaciones = self.cache_resultados.get(clave)
+        if recomendaciones is not None:
+            self._mostrar_recomendaciones(recomendaciones)
+            return
+
+        def calcular(tarea):
+            # Modelo item-item sobre todo el historial (entrenarlo puede tardar con historiales grandes)
+            return (self.recomendador.recomendar(dni_recomendar, limite=limite),
+                    self.recomendador.historial_usuario(dni_recomendar))
+
+        def al_terminar(resultado):
+            recomendaciones_modelo, historial = resultado
+            self._guardar_recomendaciones(clave, recomendaciones_modelo, historial)
+            self._mostrar_recomendaciones(recomendaciones_modelo)
+
+        def al_fallar(error):
+            if not isinstance(error, ImportError):
+                self.set_status(f"Error al generar recomendaciones: {error}", True)
+                return
+            # Sin numpy/scipy instalados: recomendaciones a partir de los préstamos activos del grafo
+            recomendaciones_grafo = self.grafo.recomendar_libros(dni_recomendar, limite=limite)
+            self._guardar_recomendaciones(clave, recomendaciones_grafo, self.grafo.isbns_de_usuario(dni_recomendar))
+            self._mostrar_recomendaciones(recomendaciones_grafo)
+
+        self._ejecutar_en_segundo_plano(f"Generando recomendaciones para {usuario_nombre}", calcular,
+                                        al_terminar=al_terminar, al_fallar=al_fallar)
+
+    def _mostrar_recomendaciones(self, recomendaciones):
+        if recomendaciones:
+            for isbn, titulo, score in recomendaciones:
                 self._mostrar_resultados_grafo(
-                    f"  - Título: {libro_data['titulo']} (ISBN: {libro_data['isbn']}) - Puntuación: {score}")
-                count += 1
-                if count >= 5:  # Limitar a 5 recomendaciones
-                    break
+                    f"  - Título: {titulo} (ISBN: {isbn}) - Puntuación: {round(score, 2)}")
         else:
             self._mostrar_resultados_grafo(
                 "  No se encontraron recomendaciones de libros para este usuario. Pruebe prestando más libros o registrando más usuarios/libros.")
@@ -1120,50 +1364,51 @@ class BibliotecaApp:
         self.set_status("Mostrando estructura general del grafo...", is_error=False)
         self._mostrar_resultados_grafo("Estructura General del Grafo:\n")
 
-        num_nodes = grafo_biblioteca.number_of_nodes()
-        num_edges = grafo_biblioteca.number_of_edges()
+        num_nodes = self.grafo.numero_nodos()
+        num_edges = self.grafo.numero_aristas()
 
         self._mostrar_resultados_grafo(f"  Número total de nodos: {num_nodes}")
         self._mostrar_resultados_grafo(f"  Número total de aristas: {num_edges}\n")
 
+        stats = self.cache_resultados.estadisticas()
+        self._mostrar_resultados_grafo(
+            f"  Caché de resultados: {stats['entradas']}/{stats['capacidad']} entradas, "
+            f"{stats['aciertos']} aciertos, {stats['fallos']} fallos, {stats['invalidaciones']} invalidaciones")
+        for tipo, stats in self.db_manager.estadisticas_cache().items():
+            self._mostrar_resultados_grafo(
+                f"  Caché de {tipo}: {stats['entradas']}/{stats['capacidad']} entradas, {stats['aciertos']} aciertos, "
+                f"{stats['fallos']} fallos, {stats['expulsiones']} expulsiones")
+        self._mostrar_resultados_grafo("")
+
         self._mostrar_resultados_grafo("Nodos (primeros 20 si hay muchos):\n")
-        nodes_list = list(grafo_biblioteca.nodes(data=True))
-        for i, (node_id, data) in enumerate(nodes_list):
-            if i >= 20:
-                self._mostrar_resultados_grafo("  ... (más nodos)")
-                break
+        for node_id, data in self.grafo.nodos(limite=20):
             node_info = f"    - {node_id} (Tipo: {data.get('type', 'desconocido')})"
+            registro = data.get('registro')
             if data.get('type') == 'libro':
-                node_info += f", Título: {data.get('titulo', 'N/A')}"
+                node_info += f", Título: {registro.titulo if registro else 'N/A'}"
             elif data.get('type') == 'usuario':
-                node_info += f", Nombre: {data.get('nombre', 'N/A')}"
+                node_info += f", Nombre: {registro.nombre if registro else 'N/A'}"
             self._mostrar_resultados_grafo(node_info)
+        if num_nodes > 20:
+            self._mostrar_resultados_grafo("  ... (más nodos)")
         self._mostrar_resultados_grafo("\nAristas (primeras 20 si hay muchas):\n")
-        edges_list = list(grafo_biblioteca.edges(data=True))
-        for i, (u, v, data) in enumerate(edges_list):
-            if i >= 20:
-                self._mostrar_resultados_grafo("  ... (más aristas)")
-                break
+        for u, v, data in self.grafo.aristas(limite=20):
             self._mostrar_resultados_grafo(f"    - ({u}) -> ({v}) (Tipo: {data.get('type', 'desconocido')})")
+        if num_edges > 20:
+            self._mostrar_resultados_grafo("  ... (más aristas)")
 
         self._mostrar_resultados_grafo("\nPréstamos Activos Recientes (primeros 10 si hay muchos):\n")
 
-        prestamos_encontrados = 0
-        db_manager.cursor.execute(
-            "SELECT isbn_libro, dni_usuario, fecha_prestamo FROM prestamos WHERE activo = 1 ORDER BY fecha_prestamo DESC LIMIT 10")
-        active_loans_recent = db_manager.cursor.fetchall()
+        active_loans_recent = self.db_manager.get_prestamos_activos_recientes(limite=10)
 
         if active_loans_recent:
-            for isbn, dni, fecha_prestamo in active_loans_recent:
-                nombre_usuario = db_manager.get_usuario(dni)['nombre'] if db_manager.get_usuario(
-                    dni) else "Usuario desconocido"
-                libro_info = db_manager.get_libro(isbn)
-                titulo_libro = libro_info['titulo'] if libro_info else f"ISBN {isbn} (desconocido)"
+            for isbn, titulo, dni, nombre, fecha_prestamo in active_loans_recent:
+                nombre_usuario = nombre or "Usuario desconocido"
+                titulo_libro = titulo or f"ISBN {isbn} (desconocido)"
 
                 self._mostrar_resultados_grafo(
                     f"  - '{nombre_usuario}' (DNI: {dni}) prestó '{titulo_libro}' (ISBN: {isbn}) el {fecha_prestamo}")
-                prestamos_encontrados += 1
-            if prestamos_encontrados >= 10:
+            if len(active_loans_recent) >= 10:
                 self._mostrar_resultados_grafo("  ... (más préstamos activos)")
         else:
             self._mostrar_resultados_grafo("  No hay préstamos activos registrados.")
@@ -1174,5 +1419,8 @@ class BibliotecaApp:
 # --- INICIO DE LA APLICACIÓN ---
 if __name__ == "__main__":
     root = tk.Tk()
-    app = BibliotecaApp(root)
+    # pool=True: los hilos de trabajo de la GUI usan cada uno su propia conexión
+    # instrumentar=True: métricas de consultas (menú "Métricas de la BD") y registro de consultas lentas
+    app = BibliotecaApp(root, DatabaseManager(pool=True, instrumentar=True,
+                                              archivo_lentas="biblioteca_consultas_lentas.jsonl"))
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+Analítica por lotes, sin interfaz: usuarios similares y libros recomendados para todos los usuarios
+con historial (por ejemplo, para los envíos nocturnos), repartida entre varios procesos.
+
+1. Se toma una instantánea coherente de la base de datos con la API de copia de seguridad de SQLite,
+   así los préstamos que se hagan mientras tanto no afectan al cálculo.
+2. Cada proceso del ProcessPoolExecutor abre la instantánea en solo lectura y carga el historial
+   (pares usuario-libro distintos, como iterar_pares_historial) y los libros disponibles.
+3. Los usuarios se reparten en bloques de tamano_bloque. Cada bloque devuelve sus filas y el proceso
+   principal las escribe de una vez en analitica_resultados (guardar_resultados_analitica); al
+   terminar, los resultados de la ejecución sustituyen a los de la anterior.
+
+Similitud entre usuarios: libros en común en todo el historial (GrafoBiblioteca.usuarios_similares
+solo mira los préstamos activos). Recomendaciones: libros disponibles que han leído los `vecinos`
+usuarios más parecidos y el usuario no, puntuados por la suma de la similitud de quienes los leyeron.
+
+    python biblioteca_analitica.py --db biblioteca.db --procesos 8
+"""
+import argparse
+import heapq
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from biblioteca_db import DatabaseManager
+
+LIMITE = 5  # Usuarios similares y recomendaciones que se guardan por usuario
+VECINOS = 50  # Usuarios más similares que se tienen en cuenta para recomendar
+TAMANO_BLOQUE = 500  # Usuarios por tarea enviada a los procesos
+
+
+def _uri_solo_lectura(ruta):
+    return Path(ruta).resolve().as_uri() + "?mode=ro"
+
+
+def tomar_instantanea(db_name, destino):
+    """Copia coherente de db_name en destino (API de backup de SQLite), sin WAL para abrirla en solo lectura."""
+    origen = sqlite3.connect(_uri_solo_lectura(db_name), uri=True)
+    copia = sqlite3.connect(destino)
+    try:
+        origen.backup(copia)
+        copia.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        copia.close()
+        origen.close()
+
+
+def usuarios_con_historial(ruta_instantanea):
+    conn = sqlite3.connect(_uri_solo_lectura(ruta_instantanea), uri=True)
+    try:
+        return [dni for (dni,) in conn.execute("SELECT DISTINCT dni_usuario FROM prestamos_historial ORDER BY 1")]
+    finally:
+        conn.close()
+
+
+# --- Procesos de trabajo ---
+_datos = None  # (libros_de, lectores_de, disponibles) cargados por _iniciar_proceso
+
+
+def cargar_datos(ruta_instantanea):
+    """
+    Lee la instantánea en solo lectura: {dni: set(isbn)} del historial, {isbn: [dni, ...]} (índice
+    inverso) y el conjunto de ISBN disponibles.
+    """
+    libros_de = {}
+    lectores_de = {}
+    conn = sqlite3.connect(_uri_solo_lectura(ruta_instantanea), uri=True)
+    try:
+        for dni, isbn in conn.execute(DatabaseManager.SQL_PARES_HISTORIAL):
+            libros_de.setdefault(dni, set()).add(isbn)
+            lectores_de.setdefault(isbn, []).append(dni)
+        disponibles = {isbn for (isbn,) in conn.execute("SELECT isbn FROM libros WHERE disponible = 1")}
+    finally:
+        conn.close()
+    return libros_de, lectores_de, disponibles
+
+
+def _iniciar_proceso(ruta_instantanea):
+    global _datos
+    _datos = cargar_datos(ruta_instantanea)
+
+
+def analizar_usuario(dni, libros_de, lectores_de, disponibles, limite=LIMITE, vecinos=VECINOS):
+    """
+    Devuelve (similares, recomendaciones): listas de (dni, libros en común) y (isbn, puntuación), de
+    mayor a menor (a igualdad, por DNI o ISBN).
+    """
+    propios = libros_de.get(dni, set())
+    comunes = Counter()
+    for isbn in propios:
+        comunes.update(lectores_de[isbn])
+    comunes.pop(dni, None)
+    cercanos = heapq.nsmallest(max(limite, vecinos), comunes.items(), key=lambda item: (-item[1], item[0]))
+
+    puntuaciones = Counter()
+    for otro, en_comun in cercanos[:vecinos]:
+        for isbn in libros_de[otro]:
+            if isbn not in propios and isbn in disponibles:
+                puntuaciones[isbn] += en_comun
+    recomendaciones = heapq.nsmallest(limite, puntuaciones.items(), key=lambda item: (-item[1], item[0]))
+    return cercanos[:limite], recomendaciones
+
+
+def _analizar_bloque(dnis, limite, vecinos):
+    # Filas (dni, tipo, posicion, valor, puntuacion) para guardar_resultados_analitica
+    libros_de, lectores_de, disponibles = _datos
+    filas = []
+    for dni in dnis:
+        similares, recomendaciones = analizar_usuario(dni, libros_de, lectores_de, disponibles, limite, vecinos)
+        filas.extend((dni, DatabaseManager.ANALITICA_SIMILAR, posicion, otro, float(en_comun))
+                     for posicion, (otro, en_comun) in enumerate(similares))
+        filas.extend((dni, DatabaseManager.ANALITICA_RECOMENDACION, posicion, isbn, float(puntuacion))
+                     for posicion, (isbn, puntuacion) in enumerate(recomendaciones))
+    return len(dnis), filas
+
+
+# --- Proceso principal ---
+def ejecutar_analitica(db_manager, procesos=None, limite=LIMITE, vecinos=VECINOS, tamano_bloque=TAMANO_BLOQUE,
+                       instantanea=None, al_avanzar=None):
+    """
+    Calcula y guarda los resultados de todos los usuarios con historial. Devuelve el id de la
+    ejecución, o None si falla (los resultados anteriores se conservan).
+    procesos: tamaño del ProcessPoolExecutor (por defecto, uno por CPU).
+    instantanea: ruta donde dejar la copia de la base de datos; por defecto, un temporal que se borra al acabar.
+    al_avanzar(usuarios_procesados, total), si se indica, se llama tras guardar cada bloque.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    temporal = instantanea is None
+    if temporal:
+        descriptor, instantanea = tempfile.mkstemp(prefix="biblioteca_instantanea_", suffix=".db")
+        os.close(descriptor)
+    ejecucion = None
+    procesados = 0
+    completada = False
+    try:
+        tomar_instantanea(db_manager.db_name, instantanea)
+        dnis = usuarios_con_historial(instantanea)
+        ejecucion = db_manager.iniciar_analitica()
+        if ejecucion is None:
+            return None
+
+        bloques = iter([dnis[i:i + tamano_bloque] for i in range(0, len(dnis), tamano_bloque)])
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso,
+                                 initargs=(instantanea,)) as pool:
+            # Como mucho dos bloques pendientes por proceso: los resultados no se acumulan en memoria
+            pendientes = set()
+            while True:
+                while len(pendientes) < 2 * procesos:
+                    bloque = next(bloques, None)
+                    if bloque is None:
+                        break
+                    pendientes.add(pool.submit(_analizar_bloque, bloque, limite, vecinos))
+                if not pendientes:
+                    break
+                terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    usuarios, filas = futuro.result()
+                    if not db_manager.guardar_resultados_analitica(ejecucion, filas):
+                        pool.shutdown(cancel_futures=True)
+                        return None
+                    procesados += usuarios
+                    if al_avanzar:
+                        al_avanzar(procesados, len(dnis))
+
+        completada = db_manager.terminar_analitica(ejecucion, procesados)
+        return ejecucion if completada else None
+    except (sqlite3.Error, OSError, BrokenProcessPool) as e:
+        print(f"Error en la analítica por lotes: {e}")
+        return None
+    finally:
+        if ejecucion is not None and not completada:
+            db_manager.terminar_analitica(ejecucion, procesados, completada=False)
+        if temporal:
+            for ruta in (instantanea, instantanea + "-journal"):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Usuarios similares y recomendaciones para todos los usuarios")
+    parser.add_argument("--db", default="biblioteca.db")
+    parser.add_argument("--procesos", type=int, help="Procesos de trabajo (por defecto, uno por CPU)")
+    parser.add_argument("--limite", type=int, default=LIMITE, help="Resultados de cada tipo por usuario")
+    parser.add_argument("--vecinos", type=int, default=VECINOS, help="Usuarios similares usados para recomendar")
+    parser.add_argument("--tamano-bloque", type=int, default=TAMANO_BLOQUE, help="Usuarios por tarea")
+    parser.add_argument("--instantanea", help="Conserva la instantánea de la base de datos en esta ruta")
+    args = parser.parse_args(argv)
+
+    def avanzar(procesados, total):
+        print(f"\r{procesados}/{total} usuarios", end="", flush=True)
+
+    db = DatabaseManager(args.db)
+    try:
+        inicio = time.perf_counter()
+        ejecucion = ejecutar_analitica(db, args.procesos, args.limite, args.vecinos, args.tamano_bloque,
+                                       args.instantanea, avanzar)
+        print()
+        if ejecucion is None:
+            return 1
+        print(f"Ejecución {ejecucion} completada en {time.perf_counter() - inicio:.1f} s: {db.get_ultima_analitica()}")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
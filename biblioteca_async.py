@@ -0,0 +1,126 @@
+"""
+Acceso a datos para servicios asyncio (quioscos de autoservicio, envío de avisos...).
+
+DatabaseManagerAsync ofrece los métodos públicos de DatabaseManager como corrutinas. Cada llamada se
+ejecuta en un ThreadPoolExecutor acotado (max_hilos) sobre un DatabaseManager en modo pool, de modo
+que cada hilo de trabajo tiene su propia conexión y cursor y el bucle de eventos nunca se bloquea.
+Varias consultas pueden ir a la vez con asyncio.gather: con WAL las lecturas no se esperan entre sí,
+y las escrituras las serializa SQLite (busy_timeout). Si hay más llamadas que hilos, esperan turno
+en el ejecutor.
+
+Los recorridos iterar_* son iteradores asíncronos (async for). Cada recorrido lee por bloques de
+tamano_lote con una conexión propia (nueva_conexion_lectura): entre bloques no ocupa ningún hilo,
+y los bloques, aunque los lean hilos distintos, no se mezclan con sus transacciones.
+
+    async with DatabaseManagerAsync("biblioteca.db") as db:
+        libro, usuario = await asyncio.gather(db.get_libro(isbn), db.get_usuario(dni))
+        async for prestamo in db.iterar_historial_prestamos():
+            ...
+"""
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from biblioteca_db import DatabaseManager
+
+# Métodos de DatabaseManager que no tienen sentido en la versión asíncrona
+METODOS_EXCLUIDOS = ("close", "cerrar_conexion_hilo", "nueva_conexion_lectura", "cerrar_conexion")
+
+
+class DatabaseManagerAsync:
+    # Resultados de prestar_libro / devolver_libro / *_lote, igual que en DatabaseManager
+    PRESTAMO_OK = DatabaseManager.PRESTAMO_OK
+    LIBRO_NO_ENCONTRADO = DatabaseManager.LIBRO_NO_ENCONTRADO
+    USUARIO_NO_ENCONTRADO = DatabaseManager.USUARIO_NO_ENCONTRADO
+    LIBRO_NO_DISPONIBLE = DatabaseManager.LIBRO_NO_DISPONIBLE
+    LIBRO_NO_PRESTADO = DatabaseManager.LIBRO_NO_PRESTADO
+    ISBN_REPETIDO = DatabaseManager.ISBN_REPETIDO
+    ERROR_BD = DatabaseManager.ERROR_BD
+
+    def __init__(self, db_name="biblioteca.db", max_hilos=4, **opciones):
+        # opciones: las de DatabaseManager (synchronous, busy_timeout, tamano_cache, instrumentar...).
+        # Abre la base de datos y aplica las migraciones de forma síncrona: crearlo antes de arrancar el bucle.
+        self.db = DatabaseManager(db_name, pool=True, **opciones)
+        self.metricas = self.db.metricas
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="biblioteca-async")
+        self._cerrado = False
+
+    async def _ejecutar(self, funcion, *args, **kwargs):
+        if self._cerrado:
+            raise RuntimeError("DatabaseManagerAsync ya está cerrado")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(funcion, *args, **kwargs))
+
+    async def _iterar(self, nombre, *args, tamano_lote=DatabaseManager.TAMANO_LOTE, **kwargs):
+        conexion = await self._ejecutar(self.db.nueva_conexion_lectura)
+        filas = getattr(self.db, nombre)(*args, tamano_lote=tamano_lote, conexion=conexion, **kwargs)
+        # Si se cancela la espera de un bloque, el hilo sigue leyéndolo: terminar() espera a que acabe
+        lock = threading.Lock()
+
+        def leer_bloque():
+            with lock:
+                return list(islice(filas, tamano_lote))
+
+        def terminar():
+            with lock:
+                try:
+                    filas.close()
+                except sqlite3.ProgrammingError:
+                    pass  # La conexión ya la cerró close()
+                self.db.cerrar_conexion(conexion)
+
+        try:
+            while True:
+                bloque = await self._ejecutar(leer_bloque)
+                if not bloque:
+                    break
+                for fila in bloque:
+                    yield fila
+        finally:
+            # También si el consumidor sale del async for antes de tiempo (break, excepción, cancelación)
+            if self._cerrado:
+                terminar()  # cerrar() ya esperó a los hilos
+            else:
+                await asyncio.get_running_loop().run_in_executor(self._pool, terminar)
+
+    async def cerrar(self):
+        """Espera a que terminen las llamadas en curso y cierra las conexiones."""
+        if self._cerrado:
+            return
+        self._cerrado = True
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._pool.shutdown)
+        self.db.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.cerrar()
+
+
+def _corrutina(nombre):
+    async def metodo(self, *args, **kwargs):
+        return await self._ejecutar(getattr(self.db, nombre), *args, **kwargs)
+    return metodo
+
+
+def _iterador(nombre):
+    def metodo(self, *args, **kwargs):
+        return self._iterar(nombre, *args, **kwargs)
+    return metodo
+
+
+# Un método por cada método público de DatabaseManager (libros, usuarios, préstamos, historial,
+# estadísticas...): corrutina, o iterador asíncrono para los iterar_*
+for _nombre, _valor in vars(DatabaseManager).items():
+    if _nombre.startswith('_') or _nombre in METODOS_EXCLUIDOS or not callable(_valor):
+        continue
+    _metodo = _iterador(_nombre) if _nombre.startswith('iterar_') else _corrutina(_nombre)
+    _metodo.__name__ = _metodo.__qualname__ = _nombre
+    _metodo.__doc__ = _valor.__doc__
+    setattr(DatabaseManagerAsync, _nombre, _metodo)
+del _nombre, _valor, _metodo
@@ -0,0 +1,445 @@
+"""
+Generador de datos sintéticos y banco de pruebas de rendimiento (sin interfaz gráfica).
+
+    python biblioteca_bench.py --escala 0.01            # 10k libros, 1k usuarios, 100k préstamos
+    python biblioteca_bench.py --base bench_base.json   # compara con una ejecución anterior
+    python biblioteca_bench.py --guardar-base bench_base.json
+
+Con la escala por defecto (1) se generan 1M de libros, 100k usuarios y 10M de préstamos. Los datos
+se generan con una semilla fija, así dos ejecuciones con los mismos parámetros miden lo mismo; la
+base de datos generada se reutiliza mientras los parámetros no cambien.
+
+Los casos se miden sobre una copia de la base generada (copiar_base): los que escriben, como
+archivar_prestamos o podar_cambios, no cambian la base que se reutiliza en la siguiente ejecución.
+
+Los resultados se escriben en JSON (mediana y mínimo en segundos por caso). Con --base, un caso
+cuya mediana supere la de la base en más de --tolerancia se marca como regresión y el programa
+termina con código 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from biblioteca_db import DatabaseManager
+from biblioteca_grafo import GrafoBiblioteca
+from biblioteca_modelo import exportar_informacion, FORMATOS_EXPORTACION
+from biblioteca_recomendaciones import MotorRecomendaciones
+
+LIBROS = 1_000_000
+USUARIOS = 100_000
+PRESTAMOS = 10_000_000
+FRACCION_PRESTADOS = 0.05  # Libros con un préstamo activo al terminar la generación
+FECHA_INICIO = datetime(2015, 1, 1)
+DIAS_HISTORIAL = 10 * 365
+
+PREFIJO_ISBN = 9780000000000
+PREFIJO_DNI = 10000000
+
+
+def isbn_sintetico(i):
+    return str(PREFIJO_ISBN + i)
+
+
+def dni_sintetico(i):
+    return str(PREFIJO_DNI + i)
+
+
+# --- Generación de datos ---
+def _parametros_generacion(libros, usuarios, prestamos, semilla):
+    return {'libros': libros, 'usuarios': usuarios, 'prestamos': prestamos, 'semilla': semilla}
+
+
+def _parametros_guardados(db_name):
+    if not os.path.exists(db_name):
+        return None
+    conn = sqlite3.connect(db_name)
+    try:
+        row = conn.execute("SELECT parametros FROM bench_parametros").fetchone()
+        return json.loads(row[0]) if row else None
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def _indice_popular(rng, n, sesgo=1.2):
+    # Popularidad de cola larga: unos pocos libros/usuarios concentran muchos préstamos
+    return min(int(rng.paretovariate(sesgo)) - 1, n - 1) if rng.random() < 0.5 else rng.randrange(n)
+
+
+def generar_datos(db_name, libros=LIBROS, usuarios=USUARIOS, prestamos=PRESTAMOS, semilla=42,
+                  tamano_lote=DatabaseManager.TAMANO_LOTE, al_avanzar=print):
+    """
+    Crea (o rehace) db_name con datos sintéticos reproducibles. Los préstamos son en su mayoría
+    devoluciones antiguas; FRACCION_PRESTADOS de los libros termina con un préstamo activo.
+    """
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(db_name + sufijo):
+            os.remove(db_name + sufijo)
+    rng = random.Random(semilla)
+    db = DatabaseManager(db_name, synchronous="OFF", tamano_cache=0)
+    try:
+        # Sin diario de cambios durante la carga: serían tantas filas como libros, usuarios y préstamos.
+        # Tampoco contadores: se calculan de una vez al final con reconstruir_contadores.
+        triggers = db._triggers_diario() + db._triggers_contadores()
+        for nombre_trigger, _ in triggers:
+            db.cursor.execute(f"DROP TRIGGER IF EXISTS {nombre_trigger}")
+
+        inicio = time.perf_counter()
+        # Desplazamientos aleatorios para que el orden de inserción no coincida con el de las claves
+        orden_libros = list(range(libros))
+        rng.shuffle(orden_libros)
+        db.add_libros_bulk(({'isbn': isbn_sintetico(i), 'titulo': f"Título {i} volumen {i % 97}",
+                             'autor': f"Autor {i % (libros // 10 + 1)}", 'editorial': f"Editorial {i % 500}",
+                             'disponible': True} for i in orden_libros), tamano_lote, diferir_indices=True)
+        al_avanzar(f"{libros} libros en {time.perf_counter() - inicio:.1f}s")
+
+        inicio = time.perf_counter()
+        db.add_usuarios_bulk(({'dni': dni_sintetico(i), 'nombre': f"Usuario {i}"} for i in range(usuarios)),
+                             tamano_lote, diferir_indices=True)
+        al_avanzar(f"{usuarios} usuarios en {time.perf_counter() - inicio:.1f}s")
+
+        inicio = time.perf_counter()
+        prestados = rng.sample(range(libros), min(libros, int(libros * FRACCION_PRESTADOS), prestamos))
+        devueltos = prestamos - len(prestados)
+        indices = db._indices_secundarios("prestamos")
+        db.cursor.execute("BEGIN")
+        for nombre_indice, _ in indices:
+            db.cursor.execute(f"DROP INDEX IF EXISTS {nombre_indice}")
+
+        plazo = timedelta(days=db.dias_prestamo)
+
+        def filas_devueltas():
+            for _ in range(devueltos):
+                fecha = FECHA_INICIO + timedelta(seconds=rng.randrange(DIAS_HISTORIAL * 86400))
+                devolucion = fecha + timedelta(days=rng.randint(1, 30))
+                yield (isbn_sintetico(_indice_popular(rng, libros)), dni_sintetico(_indice_popular(rng, usuarios)),
+                       fecha.strftime("%Y-%m-%d %H:%M:%S"), devolucion.strftime("%Y-%m-%d %H:%M:%S"),
+                       (fecha + plazo).strftime("%Y-%m-%d %H:%M:%S"))
+
+        filas = filas_devueltas()
+        insertados = 0
+        while insertados < devueltos:
+            lote = [next(filas) for _ in range(min(tamano_lote * 10, devueltos - insertados))]
+            db.cursor.executemany("INSERT INTO prestamos (isbn_libro, dni_usuario, fecha_prestamo, fecha_devolucion, "
+                                  "fecha_vencimiento, activo) VALUES (?, ?, ?, ?, ?, 0)", lote)
+            insertados += len(lote)
+        fin_historial = FECHA_INICIO + timedelta(days=DIAS_HISTORIAL)
+
+        def filas_activas():
+            for i in prestados:
+                fecha = fin_historial + timedelta(seconds=rng.randrange(30 * 86400))
+                yield (isbn_sintetico(i), dni_sintetico(_indice_popular(rng, usuarios)),
+                       fecha.strftime("%Y-%m-%d %H:%M:%S"), (fecha + plazo).strftime("%Y-%m-%d %H:%M:%S"))
+
+        db.cursor.executemany("INSERT INTO prestamos (isbn_libro, dni_usuario, fecha_prestamo, fecha_vencimiento, "
+                              "activo) VALUES (?, ?, ?, ?, 1)", filas_activas())
+        db.cursor.executemany("UPDATE libros SET disponible = 0 WHERE isbn = ?",
+                              ((isbn_sintetico(i),) for i in prestados))
+        for _, sql_indice in indices:
+            db.cursor.execute(sql_indice)
+        for _, sql_trigger in triggers:
+            db.cursor.execute(sql_trigger)
+        db.cursor.execute("CREATE TABLE bench_parametros (parametros TEXT)")
+        db.cursor.execute("INSERT INTO bench_parametros VALUES (?)",
+                          (json.dumps(_parametros_generacion(libros, usuarios, prestamos, semilla)),))
+        db.conn.commit()
+        db.reconstruir_contadores()  # Con los triggers ya recreados: los préstamos posteriores se siguen contando
+        db.cursor.execute("ANALYZE")
+        al_avanzar(f"{prestamos} préstamos en {time.perf_counter() - inicio:.1f}s")
+    finally:
+        db.close()
+
+
+def copiar_base(origen, destino):
+    """Copia coherente de origen en destino (API de backup de SQLite) para medir sin modificar origen."""
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(destino + sufijo):
+            os.remove(destino + sufijo)
+    conn_origen = sqlite3.connect(origen)
+    conn_destino = sqlite3.connect(destino)
+    try:
+        conn_origen.backup(conn_destino)
+    finally:
+        conn_destino.close()
+        conn_origen.close()
+
+
+# --- Medición ---
+class Caso:
+    """Un caso del banco: funcion() se mide repeticiones veces; preparar() (opcional) no se mide."""
+
+    def __init__(self, nombre, funcion, repeticiones=5, preparar=None):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.repeticiones = repeticiones
+        self.preparar = preparar
+
+
+def _consumir(iterable):
+    n = 0
+    for _ in iterable:
+        n += 1
+    return n
+
+
+def casos(db, libros, usuarios, semilla, repeticiones=5):
+    """
+    Lista de casos sobre una base generada con generar_datos (se usan las claves sintéticas). Algunos
+    casos escriben y no deshacen sus cambios (archivo, poda del diario): usar una copia (copiar_base).
+    """
+    rng = random.Random(semilla + 1)
+    isbns = [isbn_sintetico(rng.randrange(libros)) for _ in range(repeticiones * 20)]
+    dnis = [dni_sintetico(_indice_popular(rng, usuarios)) for _ in range(repeticiones * 20)]
+    isbn_prestado = db.get_prestamos_activos_recientes(1)[0][0]
+    isbn_nuevo, dni_nuevo = isbn_sintetico(libros + 1), dni_sintetico(usuarios + 1)
+    lote = [isbn_sintetico(libros + 10 + i) for i in range(20)]
+    lote_libros = [{'isbn': isbn, 'titulo': "Lote", 'autor': "Bench", 'editorial': "Bench", 'disponible': True}
+                   for isbn in lote]
+    ruta_export = os.path.join(tempfile.gettempdir(), "biblioteca_bench_export")
+    ruta_grafo = os.path.join(tempfile.gettempdir(), "biblioteca_bench.grafo")
+    grafo = GrafoBiblioteca(db)
+    motor = MotorRecomendaciones(db)
+    claves = iter(range(10 ** 9))
+
+    def ciclo(claves_lista):
+        # Recorre las claves de prueba sin repetir (así la caché de entidades no falsea las lecturas)
+        return lambda: claves_lista[next(claves) % len(claves_lista)]
+
+    isbn_siguiente, dni_siguiente = ciclo(isbns), ciclo(dnis)
+
+    def prestar_y_devolver():
+        db.prestar_libro(isbn_nuevo, dnis[0])
+        db.devolver_libro(isbn_nuevo)
+
+    def registrar_y_devolver():
+        db.registrar_prestamo(isbn_nuevo, dnis[0])
+        db.registrar_devolucion(isbn_nuevo, dnis[0])
+
+    def lote_circulacion():
+        db.prestar_lote(dnis[0], lote)
+        db.devolver_lote(lote)
+
+    def sincronizar_ultimos():
+        # Vuelve a aplicar los últimos 1000 cambios del diario (el grafo ya está reconstruido)
+        grafo.marca = max(db.get_ultimo_cambio() - 1000, 0)
+        grafo.sincronizar()
+
+    def alta_y_baja_bulk():
+        db.add_libros_bulk(lote_libros)
+        for isbn in lote:
+            db.delete_libro(isbn)
+
+    # Resultados de analítica sintéticos: 5 recomendaciones para cada uno de 100 usuarios
+    filas_analitica = [(dni_sintetico(u), db.ANALITICA_RECOMENDACION, posicion, isbn_sintetico(u + posicion), 1.0)
+                       for u in range(min(usuarios, 100)) for posicion in range(5)]
+    ejecucion_analitica = []
+
+    def iniciar_analitica():
+        ejecucion_analitica[:] = [db.iniciar_analitica()]
+
+    def completar_analitica():
+        # Ejecución completada con resultados (también si guardar_resultados_analitica no se midió)
+        if not ejecucion_analitica:
+            iniciar_analitica()
+            db.guardar_resultados_analitica(ejecucion_analitica[0], filas_analitica)
+        db.terminar_analitica(ejecucion_analitica[0], min(usuarios, 100))
+
+    dni_analizado = ciclo([fila[0] for fila in filas_analitica[::5]])
+
+    def marcar_cambios():
+        # Un consumidor que ya aplicó todo el diario: podar_cambios puede borrarlo entero
+        db.guardar_marca_cambios("bench", db.get_ultimo_cambio())
+
+    lista = [
+        # Libros
+        Caso("add_libro+delete_libro", lambda: (db.add_libro(dict(lote_libros[0], isbn=isbn_nuevo)),
+                                                db.delete_libro(isbn_nuevo)), repeticiones),
+        Caso("get_libro", lambda: db.get_libro(isbn_siguiente()), repeticiones * 10, preparar=db.limpiar_cache),
+        Caso("get_libro_sin_historial", lambda: db.get_libro(isbn_siguiente(), incluir_historial=False),
+             repeticiones * 10, preparar=db.limpiar_cache),
+        Caso("get_libro_cache", lambda: db.get_libro(isbns[0], incluir_historial=False), repeticiones * 10),
+        Caso("get_all_libros", db.get_all_libros, 1),
+        Caso("get_pagina_libros", lambda: db.get_pagina_libros(despues_de=isbn_siguiente()), repeticiones * 10),
+        Caso("contar_libros", db.contar_libros, repeticiones),
+        Caso("buscar_libros", lambda: db.buscar_libros("volumen 42"), repeticiones),
+        Caso("update_libro_disponibilidad", lambda: (db.update_libro_disponibilidad(isbn_nuevo, False),
+                                                     db.update_libro_disponibilidad(isbn_nuevo, True)), repeticiones,
+             preparar=lambda: db.add_libro(dict(lote_libros[0], isbn=isbn_nuevo))),
+        # Usuarios
+        Caso("add_usuario+delete_usuario", lambda: (db.add_usuario(dni_nuevo, "Bench"),
+                                                    db.delete_usuario(dni_nuevo)), repeticiones),
+        Caso("get_usuario", lambda: db.get_usuario(dni_siguiente()), repeticiones * 10, preparar=db.limpiar_cache),
+        Caso("get_all_usuarios", db.get_all_usuarios, repeticiones),
+        Caso("add_libros_bulk+delete_libro", alta_y_baja_bulk, repeticiones),
+        # Préstamos
+        Caso("prestar_libro+devolver_libro", prestar_y_devolver, repeticiones),
+        Caso("registrar_prestamo+registrar_devolucion", registrar_y_devolver, repeticiones),
+        Caso("prestar_lote+devolver_lote", lote_circulacion, repeticiones,
+             preparar=lambda: db.add_libros_bulk(lote_libros)),
+        Caso("get_historial_prestamos_libro", lambda: db.get_historial_prestamos_libro(isbn_siguiente()),
+             repeticiones * 10),
+        Caso("get_current_borrower", lambda: db.get_current_borrower(isbn_prestado), repeticiones * 10),
+        Caso("get_libros_prestados_by_usuario", lambda: db.get_libros_prestados_by_usuario(dni_siguiente()),
+             repeticiones * 10),
+        Caso("get_prestamos_activos", db.get_prestamos_activos, repeticiones),
+        Caso("get_prestamos_activos_recientes", db.get_prestamos_activos_recientes, repeticiones),
+        Caso("get_libros_resumen", lambda: db.get_libros_resumen(isbns[:100]), repeticiones),
+        Caso("get_historial_prestamos_todos", db.get_historial_prestamos_todos, 1),
+        Caso("contar_prestamos", db.contar_prestamos, repeticiones),
+        Caso("get_pagina_vencidos", db.get_pagina_vencidos, repeticiones * 10),
+        Caso("contar_vencidos", db.contar_vencidos, repeticiones),
+        # Diario de cambios
+        Caso("get_ultimo_cambio", db.get_ultimo_cambio, repeticiones * 10),
+        Caso("get_cambios", lambda: db.get_cambios(max(db.get_ultimo_cambio() - 1000, 0)), repeticiones),
+        # Contadores de circulación
+        Caso("get_libros_mas_prestados", db.get_libros_mas_prestados, repeticiones * 10),
+        Caso("get_usuarios_mas_activos", db.get_usuarios_mas_activos, repeticiones * 10),
+        Caso("get_autores_mas_prestados", db.get_autores_mas_prestados, repeticiones * 10),
+        Caso("get_circulacion_por_dia", db.get_circulacion_por_dia, repeticiones),
+        Caso("get_circulacion_por_dia(limite=7)", lambda: db.get_circulacion_por_dia(limite=7),
+             repeticiones * 10),
+        Caso("reconstruir_contadores", db.reconstruir_contadores, 1),
+        # Recorridos en streaming
+        Caso("iterar_catalogo", lambda: _consumir(db.iterar_catalogo()), 1),
+        Caso("iterar_usuarios", lambda: _consumir(db.iterar_usuarios()), 1),
+        Caso("iterar_historial_prestamos", lambda: _consumir(db.iterar_historial_prestamos()), 1),
+        Caso("iterar_pares_historial", lambda: _consumir(db.iterar_pares_historial()), 1),
+        Caso("iterar_vencidos", lambda: _consumir(db.iterar_vencidos()), 1),
+        # Grafo
+        Caso("grafo.reconstruir", grafo.reconstruir, 1),
+        Caso("grafo.sincronizar", sincronizar_ultimos, repeticiones),
+        Caso("grafo.guardar_instantanea", lambda: grafo.guardar_instantanea(ruta_grafo), 1),
+        Caso("grafo.cargar_instantanea", lambda: grafo.cargar_instantanea(ruta_grafo), repeticiones),
+        Caso("grafo.usuarios_similares", lambda: grafo.usuarios_similares(dni_siguiente()), repeticiones),
+        Caso("grafo.recomendar_libros", lambda: grafo.recomendar_libros(dni_siguiente()), repeticiones),
+    ]
+    for formato in FORMATOS_EXPORTACION:
+        lista.append(Caso(f"exportar_informacion.{formato}",
+                          lambda formato=formato: exportar_informacion(db, f"{ruta_export}.{formato}", formato), 1))
+    try:
+        from biblioteca_recomendaciones import _numpy_scipy
+        _numpy_scipy()
+    except ImportError:
+        print("numpy/scipy no disponibles: se omiten los casos de MotorRecomendaciones")
+    else:
+        lista += [
+            Caso("recomendaciones.entrenar", motor.entrenar, 1),
+            Caso("recomendaciones.recomendar", lambda: motor.recomendar(dni_siguiente()), repeticiones),
+            Caso("recomendaciones.recomendar_todos", motor.recomendar_todos, 1),
+        ]
+    lista += [
+        # Resultados de la analítica por lotes
+        Caso("guardar_resultados_analitica", lambda: db.guardar_resultados_analitica(ejecucion_analitica[0],
+                                                                                     filas_analitica),
+             repeticiones, preparar=iniciar_analitica),
+        Caso("get_resultados_analitica", lambda: db.get_resultados_analitica(dni_analizado()), repeticiones * 10,
+             preparar=completar_analitica),
+        # Mantenimiento: cambian la base sin vuelta atrás, por eso van al final
+        Caso("guardar_marca_cambios", marcar_cambios, repeticiones * 10),
+        Caso("podar_cambios", db.podar_cambios, 1, preparar=marcar_cambios),
+        Caso("archivar_prestamos", db.archivar_prestamos, 1),
+    ]
+    return lista
+
+
+def medir(lista, filtro=None, al_avanzar=print):
+    resultados = {}
+    for caso in lista:
+        if filtro and filtro not in caso.nombre:
+            continue
+        if caso.preparar:
+            caso.preparar()
+        tiempos = []
+        for _ in range(caso.repeticiones):
+            inicio = time.perf_counter()
+            caso.funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        resultados[caso.nombre] = {'mediana': statistics.median(tiempos), 'minimo': min(tiempos),
+                                   'repeticiones': caso.repeticiones}
+        al_avanzar(f"{caso.nombre:45s} {resultados[caso.nombre]['mediana'] * 1000:12.3f} ms")
+    return resultados
+
+
+def comparar(resultados, base, tolerancia=0.2):
+    """Lista de (caso, mediana_base, mediana_actual, cociente) de los casos que empeoran más que tolerancia."""
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if not anterior or not anterior['mediana']:
+            continue
+        cociente = actual['mediana'] / anterior['mediana']
+        if cociente > 1 + tolerancia:
+            regresiones.append((nombre, anterior['mediana'], actual['mediana'], cociente))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento de la biblioteca")
+    parser.add_argument("--db", default="bench_biblioteca.db", help="Base de datos sintética (se reutiliza)")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplica el número de libros, usuarios y préstamos")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--filtro", help="Solo los casos cuyo nombre contiene este texto")
+    parser.add_argument("--regenerar", action="store_true", help="Rehace la base aunque los parámetros coincidan")
+    parser.add_argument("--salida", default="bench_resultados.json", help="Resultados en JSON")
+    parser.add_argument("--base", help="Resultados anteriores (JSON) con los que comparar")
+    parser.add_argument("--guardar-base", help="Además, guarda los resultados como nueva base")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento relativo permitido (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    libros = max(1, int(LIBROS * args.escala))
+    usuarios = max(1, int(USUARIOS * args.escala))
+    prestamos = max(1, int(PRESTAMOS * args.escala))
+    parametros = _parametros_generacion(libros, usuarios, prestamos, args.semilla)
+    if args.regenerar or _parametros_guardados(args.db) != parametros:
+        print(f"Generando datos sintéticos en {args.db}: {parametros}")
+        generar_datos(args.db, libros, usuarios, prestamos, args.semilla)
+
+    # Se mide sobre una copia: la base generada queda como estaba para la siguiente ejecución
+    copia = os.path.join(tempfile.gettempdir(), f"biblioteca_bench_{os.getpid()}.db")
+    copiar_base(args.db, copia)
+    db = DatabaseManager(copia)
+    try:
+        resultados = medir(casos(db, libros, usuarios, args.semilla, args.repeticiones), args.filtro)
+    finally:
+        db.close()
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(copia + sufijo):
+                os.remove(copia + sufijo)
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': parametros,
+        'entorno': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                    'plataforma': platform.platform()},
+        'resultados': resultados,
+    }
+    for ruta in filter(None, (args.salida, args.guardar_base)):
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+
+    if args.base:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        if base.get('parametros') != parametros:
+            print(f"Aviso: la base se midió con otros parámetros ({base.get('parametros')})")
+        regresiones = comparar(resultados, base['resultados'], args.tolerancia)
+        for nombre, anterior, actual, cociente in regresiones:
+            print(f"REGRESIÓN {nombre}: {anterior * 1000:.3f} ms -> {actual * 1000:.3f} ms (x{cociente:.2f})")
+        if regresiones:
+            return 1
+        print("Sin regresiones respecto a la base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Cachés LRU acotadas en memoria para la biblioteca.
+
+CacheLRU es la caché básica (con contadores de aciertos, fallos y expulsiones). CacheResultados
+añade un índice de dependencias por usuario y por libro, para invalidar solo las entradas
+afectadas por un préstamo, una devolución o un alta/baja, en lugar de vaciar la caché entera.
+"""
+import threading
+from collections import OrderedDict
+
+_NO_ENCONTRADO = object()
+
+
+class CacheLRU:
+    def __init__(self, capacidad=1024):
+        if capacidad <= 0:
+            raise ValueError("La capacidad de la caché debe ser positiva")
+        self.capacidad = capacidad
+        self._datos = OrderedDict()
+        self._lock = threading.RLock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __contains__(self, clave):
+        return clave in self._datos
+
+    def get(self, clave, defecto=None):
+        with self._lock:
+            valor = self._datos.get(clave, _NO_ENCONTRADO)
+            if valor is _NO_ENCONTRADO:
+                self.fallos += 1
+                return defecto
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def put(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                clave_expulsada, _ = self._datos.popitem(last=False)
+                self.expulsiones += 1
+                self._al_expulsar(clave_expulsada)
+
+    def invalidar(self, clave):
+        with self._lock:
+            if self._datos.pop(clave, _NO_ENCONTRADO) is not _NO_ENCONTRADO:
+                self._al_expulsar(clave)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._al_limpiar()
+
+    def _al_expulsar(self, clave):
+        # Punto de extensión para las subclases que mantienen índices auxiliares
+        pass
+
+    def _al_limpiar(self):
+        pass
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'capacidad': self.capacidad,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expulsiones': self.expulsiones,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            }
+
+
+class CacheResultados(CacheLRU):
+    """
+    Caché de resultados (recomendaciones, usuarios similares) con dependencias.
+    Cada entrada declara de qué usuarios (DNI) y libros (ISBN) depende su resultado.
+    """
+
+    def __init__(self, capacidad=256):
+        super().__init__(capacidad)
+        self._por_usuario = {}  # dni -> {claves}
+        self._por_libro = {}  # isbn -> {claves}
+        self._dependencias = {}  # clave -> (dnis, isbns)
+        self.invalidaciones = 0
+
+    def put(self, clave, valor, usuarios=(), libros=()):
+        with self._lock:
+            self._quitar_dependencias(clave)
+            usuarios, libros = frozenset(usuarios), frozenset(libros)
+            self._dependencias[clave] = (usuarios, libros)
+            for dni in usuarios:
+                self._por_usuario.setdefault(dni, set()).add(clave)
+            for isbn in libros:
+                self._por_libro.setdefault(isbn, set()).add(clave)
+            super().put(clave, valor)
+
+    def invalidar_usuario(self, dni):
+        with self._lock:
+            for clave in list(self._por_usuario.get(dni, ())):
+                self.invalidar(clave)
+                self.invalidaciones += 1
+
+    def invalidar_libro(self, isbn):
+        with self._lock:
+            for clave in list(self._por_libro.get(isbn, ())):
+                self.invalidar(clave)
+                self.invalidaciones += 1
+
+    def _quitar_dependencias(self, clave):
+        usuarios, libros = self._dependencias.pop(clave, ((), ()))
+        for indice, valores in ((self._por_usuario, usuarios), (self._por_libro, libros)):
+            for valor in valores:
+                claves = indice.get(valor)
+                if claves is not None:
+                    claves.discard(clave)
+                    if not claves:
+                        del indice[valor]
+
+    def _al_expulsar(self, clave):
+        self._quitar_dependencias(clave)
+
+    def _al_limpiar(self):
+        self._por_usuario.clear()
+        self._por_libro.clear()
+        self._dependencias.clear()
+
+    def estadisticas(self):
+        estadisticas = super().estadisticas()
+        estadisticas['invalidaciones'] = self.invalidaciones
+        return estadisticas
@@ -0,0 +1,1510 @@
+"""
+Acceso a la base de datos SQLite de la biblioteca: migraciones del esquema y DatabaseManager.
+
+No depende de tkinter ni de networkx, así que puede importarse desde scripts, pruebas o procesos
+en segundo plano. Nada se conecta a la base de datos hasta que se crea un DatabaseManager.
+"""
+import sqlite3  # Importamos SQLite
+import threading
+import time
+from itertools import islice
+
+from biblioteca_cache import CacheLRU
+from biblioteca_metricas import MetricasBD
+from biblioteca_registros import RegistroInvalido, fila_cambio, fila_libro, fila_prestamo, fila_usuario
+
+
+# --- Migraciones del esquema ---
+# Cada migración es (versión, descripción, pasos). Un paso es una sentencia SQL o una función que
+# recibe el cursor (para cambios que necesitan comprobar el estado actual, como ALTER TABLE).
+# La versión aplicada se guarda en PRAGMA user_version, así las bases existentes se actualizan solas.
+
+def _migracion_fecha_devolucion(cursor):
+    # registrar_devolucion ya escribe esta columna, pero el esquema original no la tenía
+    cursor.execute("PRAGMA table_info(prestamos)")
+    columnas = [row[1] for row in cursor.fetchall()]
+    if 'fecha_devolucion' not in columnas:
+        cursor.execute("ALTER TABLE prestamos ADD COLUMN fecha_devolucion TEXT")
+
+
+DIAS_PRESTAMO = 14  # Plazo de préstamo por defecto
+
+
+def _migracion_vencimientos(cursor):
+    # Fecha de vencimiento de cada préstamo; a los existentes se les aplica el plazo por defecto
+    cursor.execute("PRAGMA table_info(prestamos)")
+    columnas = [row[1] for row in cursor.fetchall()]
+    if 'fecha_vencimiento' not in columnas:
+        cursor.execute("ALTER TABLE prestamos ADD COLUMN fecha_vencimiento TEXT")
+    cursor.execute("UPDATE prestamos SET fecha_vencimiento = datetime(fecha_prestamo, ?) WHERE fecha_vencimiento IS NULL",
+                   (f"+{DIAS_PRESTAMO} days",))
+
+
+def _migracion_busqueda_fts(cursor):
+    # Índice de texto completo sobre título, autor y editorial, sincronizado con triggers.
+    # remove_diacritics hace la búsqueda insensible a tildes; prefix acelera las búsquedas por prefijo.
+    # Si SQLite no se compiló con FTS5 se omite y buscar_libros usa LIKE.
+    # libros no tiene INTEGER PRIMARY KEY: VACUUM puede renumerar sus rowid y dejar el índice apuntando
+    # a otras filas. Por eso la base se compacta con DatabaseManager.compactar, que lo reconstruye.
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS libros_fts USING fts5(
+                titulo, autor, editorial,
+                content='libros', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Búsqueda de texto completo no disponible (FTS5): {e}")
+        return
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS libros_fts_insert AFTER INSERT ON libros BEGIN
+            INSERT INTO libros_fts (rowid, titulo, autor, editorial)
+            VALUES (new.rowid, new.titulo, new.autor, new.editorial);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS libros_fts_delete AFTER DELETE ON libros BEGIN
+            INSERT INTO libros_fts (libros_fts, rowid, titulo, autor, editorial)
+            VALUES ('delete', old.rowid, old.titulo, old.autor, old.editorial);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS libros_fts_update AFTER UPDATE OF titulo, autor, editorial ON libros BEGIN
+            INSERT INTO libros_fts (libros_fts, rowid, titulo, autor, editorial)
+            VALUES ('delete', old.rowid, old.titulo, old.autor, old.editorial);
+            INSERT INTO libros_fts (rowid, titulo, autor, editorial)
+            VALUES (new.rowid, new.titulo, new.autor, new.editorial);
+        END
+    """)
+    cursor.execute("INSERT INTO libros_fts (libros_fts) VALUES ('rebuild')")  # Indexar los libros existentes
+
+
+# Contadores de circulación materializados (migración 6). Cuentan todo el historial: archivar
+# préstamos no los reduce. Esta consulta los recalcula desde cero (migración y reconstruir_contadores).
+SQL_RECONSTRUIR_CONTADORES = [
+    "DELETE FROM contador_libros",
+    "DELETE FROM contador_usuarios",
+    "DELETE FROM contador_autores",
+    "DELETE FROM contador_dias",
+    "INSERT INTO contador_libros (isbn, prestamos) SELECT isbn_libro, COUNT(*) FROM prestamos_historial GROUP BY isbn_libro",
+    "INSERT INTO contador_usuarios (dni, prestamos) SELECT dni_usuario, COUNT(*) FROM prestamos_historial GROUP BY dni_usuario",
+    '''
+    INSERT INTO contador_autores (autor, prestamos)
+    SELECT l.autor, SUM(c.prestamos) FROM contador_libros c JOIN libros l ON l.isbn = c.isbn GROUP BY l.autor
+    ''',
+    '''
+    INSERT INTO contador_dias (dia, prestamos, devoluciones)
+    SELECT dia, SUM(prestamos), SUM(devoluciones) FROM (
+        SELECT date(fecha_prestamo) AS dia, 1 AS prestamos, 0 AS devoluciones FROM prestamos_historial
+        UNION ALL
+        SELECT date(fecha_devolucion), 0, 1 FROM prestamos_historial WHERE activo = 0 AND fecha_devolucion IS NOT NULL
+    ) GROUP BY dia
+    ''',
+]
+
+
+def _migracion_contadores(cursor):
+    for sql in SQL_RECONSTRUIR_CONTADORES:
+        cursor.execute(sql)
+
+
+MIGRACIONES = [
+    (1, "Esquema inicial", [
+        '''
+        CREATE TABLE IF NOT EXISTS libros (
+            isbn TEXT PRIMARY KEY UNIQUE,
+            titulo TEXT NOT NULL,
+            autor TEXT NOT NULL,
+            editorial TEXT NOT NULL,
+            disponible INTEGER NOT NULL DEFAULT 1
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            dni TEXT PRIMARY KEY UNIQUE,
+            nombre TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS prestamos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            isbn_libro TEXT NOT NULL,
+            dni_usuario TEXT NOT NULL,
+            fecha_prestamo TEXT NOT NULL,
+            activo INTEGER NOT NULL DEFAULT 1, -- 1 si prestado, 0 si devuelto
+            FOREIGN KEY (isbn_libro) REFERENCES libros(isbn) ON DELETE CASCADE,
+            FOREIGN KEY (dni_usuario) REFERENCES usuarios(dni) ON DELETE CASCADE
+        )
+        ''',
+    ]),
+    (2, "Columna fecha_devolucion en prestamos", [
+        _migracion_fecha_devolucion,
+    ]),
+    (3, "Índices de préstamos", [
+        # get_current_borrower, historial por libro y comprobación de borrado de libros
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_libro_activo ON prestamos (isbn_libro, activo, fecha_prestamo)",
+        # get_libros_prestados_by_usuario y comprobación de borrado de usuarios
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_usuario_activo ON prestamos (dni_usuario, activo)",
+        # Recorrido de préstamos activos al reconstruir el grafo (índice que cubre la consulta)
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_activo ON prestamos (activo, isbn_libro, dni_usuario)",
+    ]),
+    (4, "Búsqueda de texto completo en libros (FTS5)", [
+        _migracion_busqueda_fts,
+    ]),
+    (5, "Archivo de préstamos devueltos", [
+        # Partición fría: préstamos devueltos hace tiempo, movidos por archivar_prestamos (mismo id)
+        '''
+        CREATE TABLE IF NOT EXISTS prestamos_archivo (
+            id INTEGER PRIMARY KEY,
+            isbn_libro TEXT NOT NULL,
+            dni_usuario TEXT NOT NULL,
+            fecha_prestamo TEXT NOT NULL,
+            fecha_devolucion TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_archivo_libro ON prestamos_archivo (isbn_libro, fecha_prestamo)",
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_archivo_usuario ON prestamos_archivo (dni_usuario)",
+        # Selección de los préstamos a archivar sin recorrer los activos
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_devueltos ON prestamos (fecha_devolucion) WHERE activo = 0",
+        # Historial completo: las consultas de historial leen esta vista y no les importa dónde está cada fila
+        '''
+        CREATE VIEW IF NOT EXISTS prestamos_historial AS
+            SELECT id, isbn_libro, dni_usuario, fecha_prestamo, activo, fecha_devolucion FROM prestamos
+            UNION ALL
+            SELECT id, isbn_libro, dni_usuario, fecha_prestamo, 0, fecha_devolucion FROM prestamos_archivo
+        ''',
+    ]),
+    (6, "Contadores de circulación mantenidos por triggers", [
+        "CREATE TABLE IF NOT EXISTS contador_libros (isbn TEXT PRIMARY KEY, prestamos INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS contador_usuarios (dni TEXT PRIMARY KEY, prestamos INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS contador_autores (autor TEXT PRIMARY KEY, prestamos INTEGER NOT NULL DEFAULT 0)",
+        '''
+        CREATE TABLE IF NOT EXISTS contador_dias (
+            dia TEXT PRIMARY KEY,
+            prestamos INTEGER NOT NULL DEFAULT 0,
+            devoluciones INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        # Los top-N recorren estos índices de mayor a menor y se paran al llegar al límite
+        "CREATE INDEX IF NOT EXISTS idx_contador_libros_prestamos ON contador_libros (prestamos)",
+        "CREATE INDEX IF NOT EXISTS idx_contador_usuarios_prestamos ON contador_usuarios (prestamos)",
+        "CREATE INDEX IF NOT EXISTS idx_contador_autores_prestamos ON contador_autores (prestamos)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS contadores_prestamo AFTER INSERT ON prestamos BEGIN
+            INSERT INTO contador_libros (isbn, prestamos) VALUES (new.isbn_libro, 1)
+                ON CONFLICT (isbn) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO contador_usuarios (dni, prestamos) VALUES (new.dni_usuario, 1)
+                ON CONFLICT (dni) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO contador_autores (autor, prestamos) SELECT autor, 1 FROM libros WHERE isbn = new.isbn_libro
+                ON CONFLICT (autor) DO UPDATE SET prestamos = prestamos + 1;
+            INSERT INTO contador_dias (dia, prestamos) VALUES (date(new.fecha_prestamo), 1)
+                ON CONFLICT (dia) DO UPDATE SET prestamos = prestamos + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS contadores_devolucion AFTER UPDATE OF activo ON prestamos
+        WHEN old.activo = 1 AND new.activo = 0 BEGIN
+            INSERT INTO contador_dias (dia, devoluciones) VALUES (date(coalesce(new.fecha_devolucion, 'now')), 1)
+                ON CONFLICT (dia) DO UPDATE SET devoluciones = devoluciones + 1;
+        END
+        ''',
+        _migracion_contadores,
+    ]),
+    (7, "Resultados de la analítica por lotes", [
+        '''
+        CREATE TABLE IF NOT EXISTS analitica_ejecuciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha_inicio TEXT NOT NULL,
+            fecha_fin TEXT,
+            usuarios INTEGER NOT NULL DEFAULT 0,
+            estado TEXT NOT NULL DEFAULT 'en_curso' -- en_curso, completada o fallida
+        )
+        ''',
+        # tipo 'similar': valor es el DNI de otro usuario; tipo 'recomendacion': valor es un ISBN
+        '''
+        CREATE TABLE IF NOT EXISTS analitica_resultados (
+            ejecucion INTEGER NOT NULL,
+            dni TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            posicion INTEGER NOT NULL,
+            valor TEXT NOT NULL,
+            puntuacion REAL NOT NULL,
+            PRIMARY KEY (ejecucion, dni, tipo, posicion)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (8, "Fechas de vencimiento de los préstamos", [
+        _migracion_vencimientos,
+        # Préstamos vencidos: un único rango (activo = 1, fecha_vencimiento < ahora) recorrido en orden
+        "CREATE INDEX IF NOT EXISTS idx_prestamos_vencimiento ON prestamos (activo, fecha_vencimiento)",
+    ]),
+    (9, "Diario de cambios (captura de cambios para consumidores incrementales)", [
+        # Solo se añaden filas (y se podan por delante con podar_cambios). seq crece siempre
+        # (AUTOINCREMENT no reutiliza números aunque se poden las filas) y, como las escrituras van
+        # en transacciones BEGIN IMMEDIATE de un único escritor, el orden de seq es el orden de commit.
+        # libros: isbn; usuarios: dni; prestamos: isbn, dni y activo tal como quedó la fila.
+        '''
+        CREATE TABLE IF NOT EXISTS cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            operacion TEXT NOT NULL, -- alta, modificacion o baja
+            isbn TEXT,
+            dni TEXT,
+            activo INTEGER,
+            fecha TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+        ''',
+        # Última seq aplicada por cada consumidor con nombre (guardar_marca_cambios)
+        "CREATE TABLE IF NOT EXISTS cambios_marcas (consumidor TEXT PRIMARY KEY, seq INTEGER NOT NULL)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_libro_alta AFTER INSERT ON libros BEGIN
+            INSERT INTO cambios (tabla, operacion, isbn) VALUES ('libros', 'alta', new.isbn);
+        END
+        ''',
+        # disponible no se anota: ya lo cuentan los cambios de prestamos
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_libro_modificacion AFTER UPDATE OF titulo, autor, editorial ON libros
+        BEGIN
+            INSERT INTO cambios (tabla, operacion, isbn) VALUES ('libros', 'modificacion', new.isbn);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_libro_baja AFTER DELETE ON libros BEGIN
+            INSERT INTO cambios (tabla, operacion, isbn) VALUES ('libros', 'baja', old.isbn);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_usuario_alta AFTER INSERT ON usuarios BEGIN
+            INSERT INTO cambios (tabla, operacion, dni) VALUES ('usuarios', 'alta', new.dni);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_usuario_modificacion AFTER UPDATE OF nombre ON usuarios BEGIN
+            INSERT INTO cambios (tabla, operacion, dni) VALUES ('usuarios', 'modificacion', new.dni);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_usuario_baja AFTER DELETE ON usuarios BEGIN
+            INSERT INTO cambios (tabla, operacion, dni) VALUES ('usuarios', 'baja', old.dni);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_prestamo_alta AFTER INSERT ON prestamos BEGIN
+            INSERT INTO cambios (tabla, operacion, isbn, dni, activo)
+            VALUES ('prestamos', 'alta', new.isbn_libro, new.dni_usuario, new.activo);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_prestamo_modificacion AFTER UPDATE OF activo ON prestamos
+        WHEN old.activo <> new.activo BEGIN
+            INSERT INTO cambios (tabla, operacion, isbn, dni, activo)
+            VALUES ('prestamos', 'modificacion', new.isbn_libro, new.dni_usuario, new.activo);
+        END
+        ''',
+        # Archivar préstamos devueltos no cambia nada para los consumidores: solo se anota el borrado de activos
+        '''
+        CREATE TRIGGER IF NOT EXISTS cambios_prestamo_baja AFTER DELETE ON prestamos WHEN old.activo = 1 BEGIN
+            INSERT INTO cambios (tabla, operacion, isbn, dni, activo)
+            VALUES ('prestamos', 'baja', old.isbn_libro, old.dni_usuario, 0);
+        END
+        ''',
+    ]),
+    (10, "Identificador de la base de datos", [
+        "CREATE TABLE IF NOT EXISTS propiedades (clave TEXT PRIMARY KEY, valor TEXT NOT NULL)",
+        # Distingue esta base de datos de cualquier otra (p. ej. en las instantáneas del grafo)
+        "INSERT OR IGNORE INTO propiedades (clave, valor) VALUES ('id_bd', lower(hex(randomblob(16))))",
+    ]),
+]
+
+ESQUEMA_VERSION = MIGRACIONES[-1][0]
+
+
+# --- Database Manager Class ---
+class DatabaseManager:
+    NIVELES_SYNCHRONOUS = ("OFF", "NORMAL", "FULL", "EXTRA")
+    METODOS_MAPA = ("get_all_usuarios", "get_libros_resumen")  # Devuelven un dict clave -> fila
+
+    def __init__(self, db_name="biblioteca.db", pool=False, synchronous="NORMAL", mmap_size=256 * 1024 * 1024,
+                 busy_timeout=5000, tamano_cache=4096, instrumentar=False, umbral_lento_ms=100, archivo_lentas=None,
+                 dias_prestamo=DIAS_PRESTAMO):
+        # pool=True: cada hilo obtiene su propia conexión (y cursor), así el trabajo en segundo plano
+        # no comparte estado con el hilo de la GUI. Con WAL las lecturas no se bloquean por las escrituras.
+        # Nota: con ":memory:" cada conexión del pool vería una base de datos distinta.
+        if synchronous.upper() not in self.NIVELES_SYNCHRONOUS:
+            raise ValueError(f"Nivel de synchronous no válido: {synchronous}")
+        self.db_name = db_name
+        self.pool = pool
+        self.synchronous = synchronous.upper()
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout  # milisegundos
+        self.dias_prestamo = dias_prestamo  # Plazo de los préstamos nuevos si no se indica otro
+        self._local = threading.local()
+        self._conexiones = []  # Todas las conexiones abiertas, para cerrarlas en close()
+        self._conexiones_lock = threading.Lock()
+        self._conn_compartida = None
+        self._cursor_compartido = None
+        # Caché de registros de libros y usuarios (tamano_cache=0 la desactiva), ver get_libro/get_usuario
+        self._cache_libros = CacheLRU(tamano_cache) if tamano_cache else None
+        self._cache_usuarios = CacheLRU(tamano_cache) if tamano_cache else None
+        self._cache_lock = threading.Lock()
+        self._generacion_cache = 0
+        # instrumentar=True: latencias por método y por sentencia SQL y registro de consultas lentas
+        # (ver biblioteca_metricas); se lee con self.metricas.resumen() o self.metricas.volcar(ruta)
+        self.metricas = MetricasBD(db_name, umbral_lento_ms, archivo_lentas=archivo_lentas) if instrumentar else None
+        if self.metricas:
+            for nombre, valor in vars(DatabaseManager).items():
+                if callable(valor) and not nombre.startswith('_'):
+                    setattr(self, nombre, self.metricas.envolver(nombre, getattr(self, nombre),
+                                                                 nombre in self.METODOS_MAPA))
+        self._connect()
+        self._aplicar_migraciones()
+
+    @property
+    def conn(self):
+        if not self.pool:
+            return self._conn_compartida
+        if getattr(self._local, 'conn', None) is None:
+            self._connect()
+        return self._local.conn
+
+    @property
+    def cursor(self):
+        if not self.pool:
+            return self._cursor_compartido
+        if getattr(self._local, 'cursor', None) is None:
+            self._connect()
+        return self._local.cursor
+
+    def _nueva_conexion(self):
+        # check_same_thread=False solo para poder cerrar desde close(); cada conexión la usa un único hilo
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout / 1000, check_same_thread=not self.pool)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        if self.metricas:
+            self.metricas.instalar(conn)
+        with self._conexiones_lock:
+            self._conexiones.append(conn)
+        return conn
+
+    def _connect(self):
+        try:
+            conn = self._nueva_conexion()
+            if self.pool:
+                self._local.conn = conn
+                self._local.cursor = conn.cursor()
+            else:
+                self._conn_compartida = conn
+                self._cursor_compartido = conn.cursor()
+        except sqlite3.Error as e:
+            print(f"Error al conectar a la base de datos: {e}")
+            # Considera manejar este error en la GUI también
+
+    def cerrar_conexion_hilo(self):
+        # Cierra la conexión del hilo actual (modo pool); útil al terminar un hilo de trabajo
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self.cerrar_conexion(conn)
+            self._local.conn = None
+            self._local.cursor = None
+
+    def nueva_conexion_lectura(self):
+        """
+        Conexión adicional, no ligada a ningún hilo (solo en modo pool), para un recorrido iterar_*
+        que avance desde hilos distintos sin mezclarse con las transacciones de la conexión del hilo.
+        Se cierra con cerrar_conexion(), o en close().
+        """
+        if not self.pool:
+            raise ValueError("nueva_conexion_lectura requiere DatabaseManager(pool=True)")
+        return self._nueva_conexion()
+
+    def cerrar_conexion(self, conn):
+        with self._conexiones_lock:
+            if conn in self._conexiones:
+                self._conexiones.remove(conn)
+        conn.close()
+
+    def get_version_esquema(self):
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+
+    def _aplicar_migraciones(self):
+        # Aplica en orden las migraciones pendientes; cada una en su propia transacción
+        try:
+            version_actual = self.get_version_esquema()
+            for version, descripcion, pasos in MIGRACIONES:
+                if version <= version_actual:
+                    continue
+                self.cursor.execute("BEGIN")
+                try:
+                    for paso in pasos:
+                        if callable(paso):
+                            paso(self.cursor)
+                        else:
+                            self.cursor.execute(paso)
+                    self.cursor.execute(f"PRAGMA user_version = {int(version)}")
+                    self.conn.commit()
+                except sqlite3.Error:
+                    self.conn.rollback()
+                    raise
+                print(f"Migración {version} aplicada: {descripcion}")
+            print("Tablas verificadas/creadas con éxito.")
+        except sqlite3.Error as e:
+            print(f"Error al aplicar migraciones: {e}")
+            # Considera manejar este error en la GUI
+
+    def close(self):
+        with self._conexiones_lock:
+            conexiones, self._conexiones = self._conexiones, []
+        for conn in conexiones:
+            conn.close()
+        self._conn_compartida = None
+        self._cursor_compartido = None
+        if self.metricas:
+            self.metricas.cerrar()
+
+    # --- Caché de libros y usuarios ---
+    # get_libro/get_usuario pasan por una caché LRU acotada. Cada escritura hecha con este
+    # DatabaseManager invalida las claves afectadas después del commit; los cambios que otro proceso
+    # haga en el mismo fichero no se ven hasta que la entrada se expulsa, se llama a limpiar_cache()
+    # o se pasan sus entradas del diario de cambios a invalidar_cache_cambios().
+    def _leer_con_cache(self, cache, clave, leer):
+        if cache is None:
+            return leer(clave)
+        registro = cache.get(clave)
+        if registro is None:
+            generacion = self._generacion_cache
+            registro = leer(clave)
+            with self._cache_lock:
+                # Si hubo una escritura mientras se leía, lo leído puede ser anterior: no se guarda
+                if registro is not None and generacion == self._generacion_cache:
+                    cache.put(clave, registro)
+        return registro  # Los registros son inmutables: se puede devolver el de la caché
+
+    def _invalidar_cache(self, cache, claves):
+        if cache is None:
+            return
+        with self._cache_lock:
+            self._generacion_cache += 1
+            for clave in claves:
+                cache.invalidar(clave)
+
+    def _invalidar_libros(self, isbns):
+        self._invalidar_cache(self._cache_libros, isbns)
+
+    def _invalidar_usuarios(self, dnis):
+        self._invalidar_cache(self._cache_usuarios, dnis)
+
+    def invalidar_cache_cambios(self, cambios):
+        # Invalida lo que tocan los registros Cambio (get_cambios): los préstamos cambian el libro (disponible)
+        self._invalidar_libros({cambio.isbn for cambio in cambios if cambio.isbn is not None})
+        self._invalidar_usuarios({cambio.dni for cambio in cambios if cambio.tabla == 'usuarios'})
+
+    def limpiar_cache(self):
+        for cache in (self._cache_libros, self._cache_usuarios):
+            if cache is not None:
+                with self._cache_lock:
+                    self._generacion_cache += 1
+                    cache.limpiar()
+
+    def estadisticas_cache(self):
+        # {'libros': {...}, 'usuarios': {...}} con aciertos, fallos, expulsiones... (vacío si está desactivada)
+        if self._cache_libros is None:
+            return {}
+        return {'libros': self._cache_libros.estadisticas(), 'usuarios': self._cache_usuarios.estadisticas()}
+
+    # --- Métodos para Libros ---
+    def add_libro(self, libro):
+        try:
+            self.cursor.execute(
+                "INSERT INTO libros (isbn, titulo, autor, editorial, disponible) VALUES (?, ?, ?, ?, ?)",
+                (libro['isbn'], libro['titulo'], libro['autor'], libro['editorial'], 1 if libro['disponible'] else 0)
+            )
+            self.conn.commit()
+            return True
+        except sqlite3.IntegrityError:  # Si el ISBN ya existe
+            self.conn.rollback()  # Si no, la transacción implícita sigue abierta y bloquea las escrituras
+            return False
+        except sqlite3.Error as e:
+            print(f"Error al añadir libro: {e}")
+            self.conn.rollback()
+            return False
+
+    def get_libro(self, isbn, incluir_historial=True):
+        # El historial ('prestado_a') no se cachea: con incluir_historial=False basta la caché
+        libro = self._leer_con_cache(self._cache_libros, isbn, self._leer_libro)
+        if libro and incluir_historial:
+            libro = libro._replace(prestado_a=self.get_historial_prestamos_libro(isbn))  # Recuperar historial
+        return libro
+
+    def _leer_libro(self, isbn):
+        # Libro con su prestatario actual (las escrituras de préstamos invalidan la caché)
+        registros = self._registros(self.SQL_CATALOGO_BASE + " WHERE l.isbn = ?", (isbn,), fila_libro)
+        return registros[0] if registros else None
+
+    def delete_libro(self, isbn):
+        try:
+            # Primero, asegurarse de que no haya préstamos activos para este libro
+            self.cursor.execute("SELECT COUNT(*) FROM prestamos WHERE isbn_libro = ? AND activo = 1", (isbn,))
+            if self.cursor.fetchone()[0] > 0:
+                return False  # No se puede borrar si hay préstamos activos
+
+            self.cursor.execute("DELETE FROM libros WHERE isbn = ?", (isbn,))
+            self.conn.commit()
+            self._invalidar_libros([isbn])
+            return self.cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Error al borrar libro: {e}")
+            self.conn.rollback()
+            return False
+
+    # Catálogo con el prestatario actual (y su nombre) resuelto en la propia consulta
+    SQL_CATALOGO_BASE = """
+        SELECT l.isbn, l.titulo, l.autor, l.editorial, l.disponible, p.dni_usuario, u.nombre
+        FROM libros l
+        LEFT JOIN prestamos p ON p.id = (
+            SELECT id FROM prestamos
+            WHERE isbn_libro = l.isbn AND activo = 1
+            ORDER BY fecha_prestamo DESC LIMIT 1
+        )
+        LEFT JOIN usuarios u ON u.dni = p.dni_usuario
+    """
+    SQL_CATALOGO = SQL_CATALOGO_BASE + " ORDER BY l.isbn"
+
+    def _registros(self, sql, parametros=(), fabrica=fila_libro):
+        # Ejecuta la consulta en un cursor propio cuya row_factory construye los registros (Libro, Usuario...)
+        cursor = self.conn.cursor()
+        try:
+            cursor.row_factory = fabrica
+            cursor.execute(sql, parametros)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def get_all_libros(self, incluir_historial=False):
+        # Carga el catálogo completo junto con el prestatario actual y su nombre en una sola consulta.
+        # El historial ('prestado_a') es opcional y, si se pide, se obtiene con una única consulta adicional.
+        libros_data = self._registros(self.SQL_CATALOGO)
+
+        if incluir_historial:
+            historiales = self.get_historial_prestamos_todos()
+            libros_data = [libro._replace(prestado_a=historiales.get(libro.isbn, [])) for libro in libros_data]
+        return libros_data
+
+    def get_pagina_libros(self, despues_de=None, antes_de=None, limite=100):
+        """
+        Página del catálogo ordenado por ISBN usando paginación por clave (keyset), sin OFFSET:
+        'despues_de' devuelve los libros siguientes a ese ISBN y 'antes_de' los anteriores.
+        Cada página cuesta lo mismo sin importar en qué parte del catálogo esté.
+        """
+        if antes_de is not None:
+            libros = self._registros(self.SQL_CATALOGO_BASE + " WHERE l.isbn < ? ORDER BY l.isbn DESC LIMIT ?",
+                                     (antes_de, limite))
+            libros.reverse()
+            return libros
+        if despues_de is not None:
+            return self._registros(self.SQL_CATALOGO_BASE + " WHERE l.isbn > ? ORDER BY l.isbn LIMIT ?",
+                                   (despues_de, limite))
+        return self._registros(self.SQL_CATALOGO + " LIMIT ?", (limite,))
+
+    def contar_libros(self):
+        self.cursor.execute("SELECT COUNT(*) FROM libros")
+        return self.cursor.fetchone()[0]
+
+    def get_historial_prestamos_todos(self):
+        # Historial de todos los libros en una sola consulta: {isbn: [dni, ...]} ordenado por fecha
+        self.cursor.execute(
+            "SELECT isbn_libro, dni_usuario FROM prestamos_historial ORDER BY isbn_libro, fecha_prestamo ASC")
+        historiales = {}
+        for isbn, dni in self.cursor.fetchall():
+            historiales.setdefault(isbn, []).append(dni)
+        return historiales
+
+    def tiene_busqueda_fts(self):
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'libros_fts'")
+        return self.cursor.fetchone() is not None
+
+    @staticmethod
+    def _consulta_fts(texto):
+        # Cada palabra se busca como prefijo ("cerv*"), y todas deben aparecer (AND implícito).
+        # Las comillas se eliminan para que el texto del usuario no se interprete como sintaxis FTS5.
+        palabras = [p.replace('"', '') for p in texto.split()]
+        return " ".join(f'"{p}"*' for p in palabras if p)
+
+    def buscar_libros(self, texto, limite=50):
+        """
+        Busca libros por título, autor o editorial, sin distinguir tildes ni mayúsculas, admitiendo prefijos.
+        Devuelve registros Libro (sin prestatario) ordenados por relevancia (bm25).
+        """
+        consulta = self._consulta_fts(texto)
+        if not consulta:
+            return []
+        if self.tiene_busqueda_fts():
+            return self._registros("""
+                SELECT l.isbn, l.titulo, l.autor, l.editorial, l.disponible
+                FROM libros_fts
+                JOIN libros l ON l.rowid = libros_fts.rowid
+                WHERE libros_fts MATCH ?
+                ORDER BY bm25(libros_fts, 10.0, 5.0, 1.0)
+                LIMIT ?
+            """, (consulta, limite))
+        else:
+            # Sin FTS5: recorrido completo con LIKE (sensible a tildes)
+            patron = f"%{texto.strip()}%"
+            return self._registros("""
+                SELECT isbn, titulo, autor, editorial, disponible FROM libros
+                WHERE titulo LIKE ? OR autor LIKE ? OR editorial LIKE ?
+                ORDER BY titulo LIMIT ?
+            """, (patron, patron, patron, limite))
+
+    def reconstruir_busqueda(self):
+        # Vuelve a indexar libros_fts desde libros (si los rowid de libros cambiaron, p. ej. tras VACUUM)
+        if not self.tiene_busqueda_fts():
+            return True
+        try:
+            self.cursor.execute("INSERT INTO libros_fts (libros_fts) VALUES ('rebuild')")
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error al reconstruir el índice de búsqueda: {e}")
+            self.conn.rollback()
+            return False
+
+    def compactar(self):
+        """
+        VACUUM de la base de datos seguido de reconstruir_busqueda: VACUUM puede renumerar los rowid de
+        libros, a los que apunta libros_fts (content_rowid='rowid'). Un VACUUM hecho por otra vía
+        (sqlite3, otra herramienta) debe ir seguido de INSERT INTO libros_fts (libros_fts) VALUES ('rebuild').
+        """
+        try:
+            self.conn.commit()  # VACUUM no puede ejecutarse dentro de una transacción
+            self.cursor.execute("VACUUM")
+        except sqlite3.Error as e:
+            print(f"Error al compactar la base de datos: {e}")
+            return False
+        return self.reconstruir_busqueda()
+
+    def update_libro_disponibilidad(self, isbn, disponible):
+        try:
+            self.cursor.execute("UPDATE libros SET disponible = ? WHERE isbn = ?", (1 if disponible else 0, isbn))
+            self.conn.commit()
+            self._invalidar_libros([isbn])
+            return self.cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Error al actualizar disponibilidad: {e}")
+            self.conn.rollback()
+            return False
+
+    # --- Métodos para Usuarios ---
+    def add_usuario(self, dni, nombre):
+        try:
+            self.cursor.execute("INSERT INTO usuarios (dni, nombre) VALUES (?, ?)", (dni, nombre))
+            self.conn.commit()
+            return True
+        except sqlite3.IntegrityError:  # Si el DNI ya existe
+            self.conn.rollback()
+            return False
+        except sqlite3.Error as e:
+            print(f"Error al añadir usuario: {e}")
+            self.conn.rollback()
+            return False
+
+    def get_usuario(self, dni):
+        return self._leer_con_cache(self._cache_usuarios, dni, self._leer_usuario)
+
+    def _leer_usuario(self, dni):
+        registros = self._registros("SELECT dni, nombre FROM usuarios WHERE dni = ?", (dni,), fila_usuario)
+        return registros[0] if registros else None
+
+    def delete_usuario(self, dni):
+        try:
+            # Primero, asegurarse de que no tenga préstamos activos
+            self.cursor.execute("SELECT COUNT(*) FROM prestamos WHERE dni_usuario = ? AND activo = 1", (dni,))
+            if self.cursor.fetchone()[0] > 0:
+                return False  # No se puede borrar si tiene préstamos activos
+
+            self.cursor.execute("DELETE FROM usuarios WHERE dni = ?", (dni,))
+            self.conn.commit()
+            self._invalidar_usuarios([dni])
+            return self.cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Error al borrar usuario: {e}")
+            self.conn.rollback()
+            return False
+
+    def get_all_usuarios(self):
+        self.cursor.execute("SELECT dni, nombre FROM usuarios")
+        usuarios_data = {}
+        for row in self.cursor.fetchall():
+            usuarios_data[row[0]] = row[1]
+        return usuarios_data
+
+    # --- Carga masiva (importaciones) ---
+    TAMANO_LOTE = 5000
+    MAX_PARAMETROS = 900  # Por debajo del límite de variables por sentencia de SQLite antiguos
+
+    def add_libros_bulk(self, libros, tamano_lote=TAMANO_LOTE, diferir_indices=False):
+        """
+        Inserta un iterable de libros (dicts como en add_libro) en una sola transacción, por lotes con executemany.
+        Los ISBN duplicados, los registros incompletos y los que no son un dict (p. ej. RegistroInvalido)
+        no abortan la carga: se devuelven en 'conflictos' como tuplas (posición en la entrada, isbn, motivo).
+        """
+        def preparar(libro):
+            isbn = str(libro.get('isbn') or '').strip()
+            campos = [str(libro.get(c) or '').strip() for c in ('titulo', 'autor', 'editorial')]
+            if not isbn or not all(campos):
+                return isbn, None, "Datos incompletos"
+            if not isbn.isdigit():
+                return isbn, None, "El ISBN debe ser numérico"
+            return isbn, (isbn, *campos, 1 if libro.get('disponible', True) else 0), None
+
+        return self._insertar_bulk(
+            libros, preparar, "libros", "isbn",
+            "INSERT OR IGNORE INTO libros (isbn, titulo, autor, editorial, disponible) VALUES (?, ?, ?, ?, ?)",
+            "ISBN duplicado", tamano_lote, diferir_indices)
+
+    def add_usuarios_bulk(self, usuarios, tamano_lote=TAMANO_LOTE, diferir_indices=False):
+        """Igual que add_libros_bulk para usuarios (dicts con 'dni' y 'nombre')."""
+        def preparar(usuario):
+            dni = str(usuario.get('dni') or '').strip()
+            nombre = str(usuario.get('nombre') or '').strip()
+            if not dni or not nombre:
+                return dni, None, "Datos incompletos"
+            if not dni.isdigit():
+                return dni, None, "El DNI debe ser numérico"
+            return dni, (dni, nombre), None
+
+        return self._insertar_bulk(
+            usuarios, preparar, "usuarios", "dni",
+            "INSERT OR IGNORE INTO usuarios (dni, nombre) VALUES (?, ?)",
+            "DNI duplicado", tamano_lote, diferir_indices)
+
+    def _claves_existentes(self, tabla, columna, claves):
+        existentes = set()
+        for i in range(0, len(claves), self.MAX_PARAMETROS):
+            bloque = claves[i:i + self.MAX_PARAMETROS]
+            marcadores = ", ".join("?" * len(bloque))
+            self.cursor.execute(f"SELECT {columna} FROM {tabla} WHERE {columna} IN ({marcadores})", bloque)
+            existentes.update(row[0] for row in self.cursor.fetchall())
+        return existentes
+
+    def _indices_secundarios(self, tabla):
+        # Índices creados explícitamente (los automáticos de PRIMARY KEY/UNIQUE tienen sql NULL)
+        self.cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                            (tabla,))
+        return self.cursor.fetchall()
+
+    def _insertar_bulk(self, registros, preparar, tabla, columna_clave, sql_insert, motivo_duplicado, tamano_lote,
+                       diferir_indices):
+        resultado = {'insertados': 0, 'conflictos': []}
+        indices = self._indices_secundarios(tabla) if diferir_indices else []
+        iterador = enumerate(registros, start=1)
+        try:
+            self.cursor.execute("BEGIN")
+            for nombre_indice, _ in indices:
+                self.cursor.execute(f"DROP INDEX IF EXISTS {nombre_indice}")
+
+            while True:
+                lote = list(islice(iterador, tamano_lote))
+                if not lote:
+                    break
+                filas = {}  # clave -> tupla de valores (conserva el orden de inserción)
+                for posicion, registro in lote:
+                    if isinstance(registro, RegistroInvalido):
+                        resultado['conflictos'].append((posicion, '', registro.motivo))
+                        continue
+                    if not isinstance(registro, dict):
+                        resultado['conflictos'].append((posicion, '', "Registro no válido: se esperaba un objeto"))
+                        continue
+                    clave, valores, error = preparar(registro)
+                    if error:
+                        resultado['conflictos'].append((posicion, clave, error))
+                    elif clave in filas:
+                        resultado['conflictos'].append((posicion, clave, motivo_duplicado))
+                    else:
+                        filas[clave] = (posicion, valores)
+
+                existentes = self._claves_existentes(tabla, columna_clave, list(filas))
+                nuevas = []
+                for clave, (posicion, valores) in filas.items():
+                    if clave in existentes:
+                        resultado['conflictos'].append((posicion, clave, motivo_duplicado))
+                    else:
+                        nuevas.append(valores)
+                self.cursor.executemany(sql_insert, nuevas)
+                resultado['insertados'] += len(nuevas)
+
+            for _, sql_indice in indices:
+                self.cursor.execute(sql_indice)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            print(f"Error en la carga masiva de {tabla}: {e}")
+            resultado['insertados'] = 0
+            resultado['error'] = str(e)
+        except BaseException:
+            # Error al leer la entrada (archivo, generador del llamador...) o interrupción: no dejar la
+            # transacción abierta, que el siguiente commit confirmaría a medias (con los índices quitados)
+            self.conn.rollback()
+            raise
+        resultado['conflictos'].sort()
+        return resultado
+
+    # --- Recorridos en streaming (exportación) ---
+    # Usan un cursor propio y fetchmany, así no pisan self.cursor y la memoria no depende del tamaño de la tabla.
+    # conexion: la conexión a usar (por defecto la del hilo); ver nueva_conexion_lectura.
+    def _iterar_consulta(self, sql, parametros=(), tamano_lote=TAMANO_LOTE, fabrica=None, conexion=None):
+        cursor = (conexion or self.conn).cursor()
+        try:
+            if fabrica:
+                cursor.row_factory = fabrica
+            cursor.execute(sql, parametros)
+            while True:
+                filas = cursor.fetchmany(tamano_lote)
+                if not filas:
+                    break
+                yield from filas
+        finally:
+            cursor.close()
+
+    def iterar_catalogo(self, tamano_lote=TAMANO_LOTE, conexion=None):
+        # Filas (isbn, titulo, autor, editorial, disponible, dni_prestatario, nombre_prestatario)
+        return self._iterar_consulta(self.SQL_CATALOGO, (), tamano_lote, conexion=conexion)
+
+    def iterar_libros(self, tamano_lote=TAMANO_LOTE, conexion=None):
+        # Como iterar_catalogo, pero genera registros Libro
+        return self._iterar_consulta(self.SQL_CATALOGO, (), tamano_lote, fila_libro, conexion)
+
+    def iterar_usuarios(self, tamano_lote=TAMANO_LOTE, conexion=None):
+        # Registros Usuario (se pueden desempaquetar como filas (dni, nombre))
+        return self._iterar_consulta("SELECT dni, nombre FROM usuarios", (), tamano_lote, fila_usuario, conexion)
+
+    def iterar_historial_prestamos(self, tamano_lote=TAMANO_LOTE, conexion=None):
+        # Filas (isbn, titulo, dni, nombre, fecha_prestamo, activo); titulo/nombre son None si ya no existen
+        return self._iterar_consulta("""
+            SELECT p.isbn_libro, l.titulo, p.dni_usuario, u.nombre, p.fecha_prestamo, p.activo
+            FROM prestamos_historial p
+            LEFT JOIN libros l ON l.isbn = p.isbn_libro
+            LEFT JOIN usuarios u ON u.dni = p.dni_usuario
+            ORDER BY p.fecha_prestamo DESC
+        """, (), tamano_lote, conexion=conexion)
+
+    # --- Métodos para Préstamos ---
+    # Resultados de prestar_libro / devolver_libro / *_lote (clave 'resultado' del dict devuelto)
+    PRESTAMO_OK = 'ok'
+    LIBRO_NO_ENCONTRADO = 'libro_no_encontrado'
+    USUARIO_NO_ENCONTRADO = 'usuario_no_encontrado'
+    LIBRO_NO_DISPONIBLE = 'libro_no_disponible'
+    LIBRO_NO_PRESTADO = 'libro_no_prestado'
+    ISBN_REPETIDO = 'isbn_repetido'  # Solo en los lotes
+    ERROR_BD = 'error'
+
+    DIAS_PRESTAMO = DIAS_PRESTAMO
+    SQL_INSERTAR_PRESTAMO = """
+        INSERT INTO prestamos (isbn_libro, dni_usuario, fecha_prestamo, fecha_vencimiento, activo)
+        VALUES (?, ?, datetime('now'), datetime('now', ?), 1)
+    """
+
+    def _plazo(self, dias):
+        # Modificador de datetime() para la fecha de vencimiento
+        return f"{int(self.dias_prestamo if dias is None else dias):+d} days"
+
+    def prestar_libro(self, isbn_libro, dni_usuario, dias=None):
+        """
+        Préstamo completo en una única transacción con un único commit: valida libro y usuario,
+        marca el libro como no disponible con un UPDATE condicional (WHERE disponible = 1) e inserta
+        el préstamo, que vence a los 'dias' días (por defecto, dias_prestamo).
+        Si dos mostradores prestan el mismo libro a la vez, solo uno lo consigue.
+        Devuelve un dict con 'resultado' (constantes de arriba), 'titulo', 'nombre' y, si el libro ya
+        estaba prestado, 'dni_prestatario' y 'nombre_prestatario'.
+        """
+        info = {'resultado': self.ERROR_BD, 'titulo': None, 'nombre': None,
+                'dni_prestatario': None, 'nombre_prestatario': None}
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")  # Toma el bloqueo de escritura desde el principio
+            self.cursor.execute(self.SQL_CATALOGO_BASE + " WHERE l.isbn = ?", (isbn_libro,))
+            libro = self.cursor.fetchone()
+            if not libro:
+                info['resultado'] = self.LIBRO_NO_ENCONTRADO
+                self.conn.rollback()
+                return info
+            info['titulo'] = libro[1]
+
+            self.cursor.execute("SELECT nombre FROM usuarios WHERE dni = ?", (dni_usuario,))
+            usuario = self.cursor.fetchone()
+            if not usuario:
+                info['resultado'] = self.USUARIO_NO_ENCONTRADO
+                self.conn.rollback()
+                return info
+            info['nombre'] = usuario[0]
+
+            # Marcar el libro como no disponible solo si sigue disponible
+            self.cursor.execute("UPDATE libros SET disponible = 0 WHERE isbn = ? AND disponible = 1", (isbn_libro,))
+            if self.cursor.rowcount == 0:
+                info.update(resultado=self.LIBRO_NO_DISPONIBLE, dni_prestatario=libro[5], nombre_prestatario=libro[6])
+                self.conn.rollback()
+                return info
+
+            # Registrar el nuevo préstamo como activo
+            self.cursor.execute(self.SQL_INSERTAR_PRESTAMO, (isbn_libro, dni_usuario, self._plazo(dias)))
+            self.conn.commit()
+            self._invalidar_libros([isbn_libro])
+            info['resultado'] = self.PRESTAMO_OK
+            return info
+        except sqlite3.Error as e:
+            print(f"Error al registrar préstamo: {e}")
+            self.conn.rollback()
+            return info
+
+    def devolver_libro(self, isbn_libro):
+        """
+        Devolución en una única transacción: cierra el préstamo activo más reciente del libro con un
+        UPDATE condicional (WHERE activo = 1) y vuelve a marcar el libro como disponible.
+        Devuelve un dict con 'resultado', 'titulo', 'dni_prestatario' y 'nombre_prestatario'.
+        """
+        info = {'resultado': self.ERROR_BD, 'titulo': None, 'dni_prestatario': None, 'nombre_prestatario': None}
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            self.cursor.execute("""
+                SELECT l.titulo, p.id, p.dni_usuario, u.nombre
+                FROM libros l
+                LEFT JOIN prestamos p ON p.id = (
+                    SELECT id FROM prestamos
+                    WHERE isbn_libro = l.isbn AND activo = 1
+                    ORDER BY fecha_prestamo DESC LIMIT 1
+                )
+                LEFT JOIN usuarios u ON u.dni = p.dni_usuario
+                WHERE l.isbn = ?
+            """, (isbn_libro,))
+            row = self.cursor.fetchone()
+            if not row:
+                info['resultado'] = self.LIBRO_NO_ENCONTRADO
+                self.conn.rollback()
+                return info
+            titulo, id_prestamo, dni_usuario, nombre = row
+            info.update(titulo=titulo, dni_prestatario=dni_usuario, nombre_prestatario=nombre)
+
+            if id_prestamo is None or not self._cerrar_prestamo(id_prestamo, isbn_libro):
+                info['resultado'] = self.LIBRO_NO_PRESTADO
+                self.conn.rollback()
+                return info
+            self.conn.commit()
+            self._invalidar_libros([isbn_libro])
+            info['resultado'] = self.PRESTAMO_OK
+            return info
+        except sqlite3.Error as e:
+            print(f"Error al registrar devolución: {e}")
+            self.conn.rollback()
+            return info
+
+    def _cerrar_prestamo(self, id_prestamo, isbn_libro):
+        # Dentro de una transacción abierta: cierra el préstamo si sigue activo y libera el libro
+        self.cursor.execute("UPDATE prestamos SET activo = 0, fecha_devolucion = datetime('now') WHERE id = ? AND activo = 1",
+                            (id_prestamo,))
+        if self.cursor.rowcount == 0:
+            return False  # Otro mostrador lo devolvió primero
+        self.cursor.execute("UPDATE libros SET disponible = 1 WHERE isbn = ?", (isbn_libro,))
+        return True
+
+    def registrar_prestamo(self, isbn_libro, dni_usuario, dias=None):
+        return self.prestar_libro(isbn_libro, dni_usuario, dias)['resultado'] == self.PRESTAMO_OK
+
+    def registrar_devolucion(self, isbn_libro, dni_usuario):
+        # Devuelve el préstamo activo más reciente de ese libro por ese usuario, en una sola transacción
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            self.cursor.execute(
+                "SELECT id FROM prestamos WHERE isbn_libro = ? AND dni_usuario = ? AND activo = 1 ORDER BY fecha_prestamo DESC LIMIT 1",
+                (isbn_libro, dni_usuario)
+            )
+            row = self.cursor.fetchone()
+            if row and self._cerrar_prestamo(row[0], isbn_libro):
+                self.conn.commit()
+                self._invalidar_libros([isbn_libro])
+                return True
+            self.conn.rollback()
+            return False  # No se encontró un préstamo activo para ese libro/usuario
+        except sqlite3.Error as e:
+            print(f"Error al registrar devolución: {e}")
+            self.conn.rollback()
+            return False
+
+    # --- Préstamos y devoluciones por lotes (mostrador con lector de códigos) ---
+    def _filas_en_bloques(self, sql, claves):
+        # sql contiene {marcadores}; se ejecuta en bloques de como mucho MAX_PARAMETROS claves
+        filas = []
+        for i in range(0, len(claves), self.MAX_PARAMETROS):
+            bloque = claves[i:i + self.MAX_PARAMETROS]
+            self.cursor.execute(sql.format(marcadores=", ".join("?" * len(bloque))), bloque)
+            filas.extend(self.cursor.fetchall())
+        return filas
+
+    @staticmethod
+    def _resultados_lote(isbns, resultado, **campos):
+        return [dict({'isbn': isbn, 'resultado': resultado}, **campos) for isbn in isbns]
+
+    def prestar_lote(self, dni_usuario, isbns, dias=None):
+        """
+        Presta varios libros a un usuario en una única transacción. La validación se hace con
+        consultas por conjuntos (IN) en lugar de una consulta por libro, y los cambios con executemany.
+        Los libros que no se pueden prestar no impiden prestar el resto.
+        Devuelve una lista, en el orden de isbns, de dicts con 'isbn', 'resultado', 'titulo', 'nombre',
+        'dni_prestatario' y 'nombre_prestatario' (como prestar_libro). Un ISBN repetido en el lote
+        se presta una sola vez; las repeticiones devuelven ISBN_REPETIDO.
+        """
+        isbns = list(isbns)
+        unicos = list(dict.fromkeys(isbns))
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            self.cursor.execute("SELECT nombre FROM usuarios WHERE dni = ?", (dni_usuario,))
+            usuario = self.cursor.fetchone()
+            if not usuario:
+                self.conn.rollback()
+                return self._resultados_lote(isbns, self.USUARIO_NO_ENCONTRADO, titulo=None, nombre=None,
+                                             dni_prestatario=None, nombre_prestatario=None)
+            nombre = usuario[0]
+
+            # Con el bloqueo de escritura tomado, lo leído aquí no puede cambiar hasta el commit
+            libros = {row[0]: row for row in
+                      self._filas_en_bloques(self.SQL_CATALOGO_BASE + " WHERE l.isbn IN ({marcadores})", unicos)}
+            a_prestar = [isbn for isbn in unicos if isbn in libros and libros[isbn][4]]
+
+            self.cursor.executemany("UPDATE libros SET disponible = 0 WHERE isbn = ? AND disponible = 1",
+                                    [(isbn,) for isbn in a_prestar])
+            plazo = self._plazo(dias)
+            self.cursor.executemany(self.SQL_INSERTAR_PRESTAMO, [(isbn, dni_usuario, plazo) for isbn in a_prestar])
+            self.conn.commit()
+            self._invalidar_libros(a_prestar)
+        except sqlite3.Error as e:
+            print(f"Error al registrar el lote de préstamos: {e}")
+            self.conn.rollback()
+            return self._resultados_lote(isbns, self.ERROR_BD, titulo=None, nombre=None,
+                                         dni_prestatario=None, nombre_prestatario=None)
+
+        resultados = []
+        vistos = set()
+        for isbn in isbns:
+            info = {'isbn': isbn, 'resultado': self.PRESTAMO_OK, 'titulo': None, 'nombre': nombre,
+                    'dni_prestatario': None, 'nombre_prestatario': None}
+            libro = libros.get(isbn)
+            if isbn in vistos:
+                info['resultado'] = self.ISBN_REPETIDO
+            elif not libro:
+                info['resultado'] = self.LIBRO_NO_ENCONTRADO
+            elif not libro[4]:
+                info.update(resultado=self.LIBRO_NO_DISPONIBLE, dni_prestatario=libro[5], nombre_prestatario=libro[6])
+            if libro:
+                info['titulo'] = libro[1]
+            vistos.add(isbn)
+            resultados.append(info)
+        return resultados
+
+    def devolver_lote(self, isbns):
+        """
+        Devuelve varios libros en una única transacción (cada uno cierra su préstamo activo más
+        reciente, como devolver_libro). Devuelve una lista, en el orden de isbns, de dicts con
+        'isbn', 'resultado', 'titulo', 'dni_prestatario' y 'nombre_prestatario'.
+        """
+        isbns = list(isbns)
+        unicos = list(dict.fromkeys(isbns))
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            filas = self._filas_en_bloques("""
+                SELECT l.isbn, l.titulo, p.id, p.dni_usuario, u.nombre
+                FROM libros l
+                LEFT JOIN prestamos p ON p.id = (
+                    SELECT id FROM prestamos
+                    WHERE isbn_libro = l.isbn AND activo = 1
+                    ORDER BY fecha_prestamo DESC LIMIT 1
+                )
+                LEFT JOIN usuarios u ON u.dni = p.dni_usuario
+                WHERE l.isbn IN ({marcadores})
+            """, unicos)
+            libros = {row[0]: row for row in filas}
+            a_cerrar = [(row[2], isbn) for isbn, row in libros.items() if row[2] is not None]
+
+            self.cursor.executemany(
+                "UPDATE prestamos SET activo = 0, fecha_devolucion = datetime('now') WHERE id = ? AND activo = 1",
+                [(id_prestamo,) for id_prestamo, _ in a_cerrar]
+            )
+            self.cursor.executemany("UPDATE libros SET disponible = 1 WHERE isbn = ?",
+                                    [(isbn,) for _, isbn in a_cerrar])
+            self.conn.commit()
+            self._invalidar_libros([isbn for _, isbn in a_cerrar])
+        except sqlite3.Error as e:
+            print(f"Error al registrar el lote de devoluciones: {e}")
+            self.conn.rollback()
+            return self._resultados_lote(isbns, self.ERROR_BD, titulo=None, dni_prestatario=None,
+                                         nombre_prestatario=None)
+
+        resultados = []
+        vistos = set()
+        for isbn in isbns:
+            info = {'isbn': isbn, 'resultado': self.PRESTAMO_OK, 'titulo': None, 'dni_prestatario': None,
+                    'nombre_prestatario': None}
+            libro = libros.get(isbn)
+            if isbn in vistos:
+                info['resultado'] = self.ISBN_REPETIDO
+            elif not libro:
+                info['resultado'] = self.LIBRO_NO_ENCONTRADO
+            elif libro[2] is None:
+                info['resultado'] = self.LIBRO_NO_PRESTADO
+            if libro:
+                info.update(titulo=libro[1], dni_prestatario=libro[3], nombre_prestatario=libro[4])
+            vistos.add(isbn)
+            resultados.append(info)
+        return resultados
+
+    def get_historial_prestamos_libro(self, isbn_libro):
+        # Obtiene los DNI de los usuarios que han prestado este libro, ordenados por fecha (incluye el archivo)
+        self.cursor.execute(
+            "SELECT dni_usuario FROM prestamos_historial WHERE isbn_libro = ? ORDER BY fecha_prestamo ASC",
+            (isbn_libro,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_current_borrower(self, isbn_libro):
+        # Retorna el DNI del usuario que tiene el libro actualmente prestado (si lo hay)
+        self.cursor.execute(
+            "SELECT dni_usuario FROM prestamos WHERE isbn_libro = ? AND activo = 1 ORDER BY fecha_prestamo DESC LIMIT 1",
+            (isbn_libro,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def get_libros_prestados_by_usuario(self, dni_usuario):
+        # Retorna los ISBN de los libros que un usuario tiene actualmente prestados
+        self.cursor.execute("SELECT isbn_libro FROM prestamos WHERE dni_usuario = ? AND activo = 1", (dni_usuario,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_prestamos_activos(self):
+        # Registros Prestamo (isbn, dni, fecha_prestamo) de todos los préstamos activos, para construir el grafo
+        return self._registros("SELECT isbn_libro, dni_usuario, fecha_prestamo FROM prestamos WHERE activo = 1", (),
+                               fila_prestamo)
+
+    SQL_PARES_HISTORIAL = "SELECT DISTINCT dni_usuario, isbn_libro FROM prestamos_historial"
+
+    def iterar_pares_historial(self, tamano_lote=TAMANO_LOTE, conexion=None):
+        # Pares (dni, isbn) distintos de todo el historial (préstamos activos, devueltos y archivados)
+        return self._iterar_consulta(self.SQL_PARES_HISTORIAL, (), tamano_lote, conexion=conexion)
+
+    # --- Préstamos vencidos ---
+    # Todas las consultas son el rango (activo = 1, fecha_vencimiento < ahora) de idx_prestamos_vencimiento,
+    # recorrido en orden de vencimiento (el más antiguo primero): no se calcula nada fila a fila.
+    # ahora: 'AAAA-MM-DD HH:MM:SS' (por defecto, la hora actual en UTC, como datetime('now')).
+    SQL_VENCIDOS = """
+        SELECT p.id, p.isbn_libro, l.titulo, p.dni_usuario, u.nombre, p.fecha_prestamo, p.fecha_vencimiento
+        FROM prestamos p
+        LEFT JOIN libros l ON l.isbn = p.isbn_libro
+        LEFT JOIN usuarios u ON u.dni = p.dni_usuario
+        WHERE p.activo = 1 AND p.fecha_vencimiento < coalesce(:ahora, datetime('now'))
+    """
+
+    def get_pagina_vencidos(self, despues_de=None, limite=100, ahora=None):
+        """
+        Página de préstamos vencidos: filas (id, isbn, titulo, dni, nombre, fecha_prestamo,
+        fecha_vencimiento). Paginación por clave como get_pagina_libros: 'despues_de' es la
+        (fecha_vencimiento, id) de la última fila de la página anterior.
+        """
+        parametros = {'ahora': ahora, 'limite': limite, 'fecha': None, 'id': None}
+        sql = self.SQL_VENCIDOS
+        if despues_de is not None:
+            parametros['fecha'], parametros['id'] = despues_de
+            sql += " AND (p.fecha_vencimiento, p.id) > (:fecha, :id)"
+        self.cursor.execute(sql + " ORDER BY p.fecha_vencimiento, p.id LIMIT :limite", parametros)
+        return self.cursor.fetchall()
+
+    def iterar_vencidos(self, ahora=None, tamano_lote=TAMANO_LOTE, conexion=None):
+        # Las mismas filas que get_pagina_vencidos, todas, en streaming (para avisos y exportaciones)
+        return self._iterar_consulta(self.SQL_VENCIDOS + " ORDER BY p.fecha_vencimiento, p.id", {'ahora': ahora},
+                                     tamano_lote, conexion=conexion)
+
+    def contar_vencidos(self, ahora=None):
+        # Cuenta sobre el índice, sin leer las filas de prestamos
+        self.cursor.execute("""
+            SELECT COUNT(*) FROM prestamos
+            WHERE activo = 1 AND fecha_vencimiento < coalesce(:ahora, datetime('now'))
+        """, {'ahora': ahora})
+        return self.cursor.fetchone()[0]
+
+    # --- Archivo del historial ---
+    DIAS_ARCHIVO = 365
+
+    def archivar_prestamos(self, dias=DIAS_ARCHIVO, tamano_lote=1000, pausa=0.0, al_avanzar=None):
+        """
+        Mueve a prestamos_archivo los préstamos devueltos hace más de `dias` días, en transacciones
+        cortas de como mucho tamano_lote filas, para no retener el bloqueo de escritura (pausa, en
+        segundos, deja hueco entre lotes a otros escritores). Las consultas de historial siguen viendo
+        las filas a través de la vista prestamos_historial. al_avanzar(archivados) se llama tras cada lote
+        confirmado, incluido el último.
+        Devuelve el número de préstamos archivados.
+        """
+        limite = f"-{int(dias)} days"
+        # Préstamos devueltos antes de la migración 2 no tienen fecha_devolucion: cuenta la del préstamo
+        seleccion = """
+            SELECT id FROM prestamos
+            WHERE activo = 0 AND (fecha_devolucion < datetime('now', :limite)
+                                  OR (fecha_devolucion IS NULL AND fecha_prestamo < datetime('now', :limite)))
+            ORDER BY id LIMIT :lote
+        """
+        parametros = {'limite': limite, 'lote': tamano_lote}
+        archivados = 0
+        while True:
+            try:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(f"""
+                    INSERT INTO prestamos_archivo (id, isbn_libro, dni_usuario, fecha_prestamo, fecha_devolucion)
+                    SELECT id, isbn_libro, dni_usuario, fecha_prestamo, fecha_devolucion FROM prestamos
+                    WHERE id IN ({seleccion})
+                """, parametros)
+                movidos = self.cursor.rowcount
+                # Misma selección dentro de la misma transacción: borra exactamente las filas copiadas
+                self.cursor.execute(f"DELETE FROM prestamos WHERE id IN ({seleccion})", parametros)
+                self.conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error al archivar préstamos: {e}")
+                self.conn.rollback()
+                break
+            archivados += movidos
+            if al_avanzar:
+                al_avanzar(archivados)  # También tras el último lote, aunque esté incompleto
+            if movidos < tamano_lote:
+                break
+            if pausa:
+                time.sleep(pausa)
+        return archivados
+
+    def contar_prestamos(self):
+        # (préstamos en la tabla principal, préstamos archivados)
+        self.cursor.execute("SELECT (SELECT COUNT(*) FROM prestamos), (SELECT COUNT(*) FROM prestamos_archivo)")
+        return self.cursor.fetchone()
+
+    # --- Contadores de circulación (tablas contador_*, ver migración 6) ---
+    def reconstruir_contadores(self):
+        # Recalcula los contadores desde el historial completo (por si se tocaron las tablas a mano)
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            for sql in SQL_RECONSTRUIR_CONTADORES:
+                self.cursor.execute(sql)
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error al reconstruir los contadores: {e}")
+            self.conn.rollback()
+            return False
+
+    def _triggers_contadores(self):
+        # Triggers que mantienen los contadores, como (nombre, sql): las cargas de datos sintéticos los
+        # quitan y los vuelven a crear antes de reconstruir_contadores (ver _triggers_diario)
+        self.cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'prestamos' "
+                            "AND name LIKE 'contadores_%'")
+        return self.cursor.fetchall()
+
+    def get_libros_mas_prestados(self, limite=10):
+        # Filas (isbn, titulo, prestamos); titulo es None si el libro ya no existe
+        self.cursor.execute("""
+            SELECT c.isbn, l.titulo, c.prestamos FROM contador_libros c
+            LEFT JOIN libros l ON l.isbn = c.isbn
+            ORDER BY c.prestamos DESC LIMIT ?
+        """, (limite,))
+        return self.cursor.fetchall()
+
+    def get_usuarios_mas_activos(self, limite=10):
+        # Filas (dni, nombre, prestamos); nombre es None si el usuario ya no existe
+        self.cursor.execute("""
+            SELECT c.dni, u.nombre, c.prestamos FROM contador_usuarios c
+            LEFT JOIN usuarios u ON u.dni = c.dni
+            ORDER BY c.prestamos DESC LIMIT ?
+        """, (limite,))
+        return self.cursor.fetchall()
+
+    def get_autores_mas_prestados(self, limite=10):
+        # Filas (autor, prestamos)
+        self.cursor.execute("SELECT autor, prestamos FROM contador_autores ORDER BY prestamos DESC LIMIT ?", (limite,))
+        return self.cursor.fetchall()
+
+    def get_circulacion_por_dia(self, desde=None, hasta=None, limite=None):
+        """
+        Filas (dia, prestamos, devoluciones) entre dos fechas 'AAAA-MM-DD' (incluidas), en orden.
+        limite: solo los `limite` días más recientes del rango, leídos desde el final de la clave
+        primaria (ORDER BY dia DESC LIMIT) en vez de toda la serie.
+        """
+        sql = """
+            SELECT dia, prestamos, devoluciones FROM contador_dias
+            WHERE dia >= coalesce(?, '') AND dia <= coalesce(?, '9999-12-31')
+        """
+        if limite is None:
+            self.cursor.execute(sql + " ORDER BY dia", (desde, hasta))
+            return self.cursor.fetchall()
+        self.cursor.execute(sql + " ORDER BY dia DESC LIMIT ?", (desde, hasta, limite))
+        return self.cursor.fetchall()[::-1]
+
+    def get_libros_resumen(self, isbns):
+        # {isbn: (titulo, disponible)} para una colección de ISBN, en consultas IN por bloques
+        isbns = list(isbns)
+        resumen = {}
+        for i in range(0, len(isbns), self.MAX_PARAMETROS):
+            bloque = isbns[i:i + self.MAX_PARAMETROS]
+            marcadores = ", ".join("?" * len(bloque))
+            self.cursor.execute(f"SELECT isbn, titulo, disponible FROM libros WHERE isbn IN ({marcadores})", bloque)
+            for isbn, titulo, disponible in self.cursor.fetchall():
+                resumen[isbn] = (titulo, bool(disponible))
+        return resumen
+
+    def get_prestamos_activos_recientes(self, limite=10):
+        # Filas (isbn, titulo, dni, nombre, fecha_prestamo) de los préstamos activos más recientes
+        self.cursor.execute("""
+            SELECT p.isbn_libro, l.titulo, p.dni_usuario, u.nombre, p.fecha_prestamo
+            FROM prestamos p
+            LEFT JOIN libros l ON l.isbn = p.isbn_libro
+            LEFT JOIN usuarios u ON u.dni = p.dni_usuario
+            WHERE p.activo = 1
+            ORDER BY p.fecha_prestamo DESC LIMIT ?
+        """, (limite,))
+        return self.cursor.fetchall()
+
+    # --- Resultados de la analítica por lotes (ver biblioteca_analitica) ---
+    ANALITICA_SIMILAR = 'similar'
+    ANALITICA_RECOMENDACION = 'recomendacion'
+
+    def iniciar_analitica(self):
+        # Registra una ejecución en curso y devuelve su id (None si falla)
+        try:
+            self.cursor.execute("INSERT INTO analitica_ejecuciones (fecha_inicio) VALUES (datetime('now'))")
+            self.conn.commit()
+            return self.cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"Error al iniciar la analítica: {e}")
+            self.conn.rollback()
+            return None
+
+    def guardar_resultados_analitica(self, ejecucion, filas):
+        # filas: (dni, tipo, posicion, valor, puntuacion); se insertan todas en una transacción
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            self.cursor.executemany("""
+                INSERT OR REPLACE INTO analitica_resultados (ejecucion, dni, tipo, posicion, valor, puntuacion)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, ((ejecucion, *fila) for fila in filas))
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error al guardar los resultados de la analítica: {e}")
+            self.conn.rollback()
+            return False
+
+    def terminar_analitica(self, ejecucion, usuarios, completada=True):
+        # Si se completó, sus resultados sustituyen a los de ejecuciones anteriores; si no, se descartan
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            self.cursor.execute("""
+                UPDATE analitica_ejecuciones SET fecha_fin = datetime('now'), usuarios = ?, estado = ? WHERE id = ?
+            """, (usuarios, 'completada' if completada else 'fallida', ejecucion))
+            condicion = "ejecucion <> ?" if completada else "ejecucion = ?"
+            self.cursor.execute(f"DELETE FROM analitica_resultados WHERE {condicion}", (ejecucion,))
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error al terminar la analítica: {e}")
+            self.conn.rollback()
+            return False
+
+    def get_ultima_analitica(self):
+        # Fila (id, fecha_inicio, fecha_fin, usuarios, estado) de la última ejecución completada, o None
+        self.cursor.execute("""
+            SELECT id, fecha_inicio, fecha_fin, usuarios, estado FROM analitica_ejecuciones
+            WHERE estado = 'completada' ORDER BY id DESC LIMIT 1
+        """)
+        return self.cursor.fetchone()
+
+    def get_resultados_analitica(self, dni, tipo=ANALITICA_RECOMENDACION):
+        # Filas (valor, puntuacion) de la última ejecución completada, en orden
+        self.cursor.execute("""
+            SELECT valor, puntuacion FROM analitica_resultados
+            WHERE ejecucion = (SELECT max(id) FROM analitica_ejecuciones WHERE estado = 'completada')
+              AND dni = ? AND tipo = ?
+            ORDER BY posicion
+        """, (dni, tipo))
+        return self.cursor.fetchall()
+
+    # --- Diario de cambios (tabla cambios, ver migración 9) ---
+    # Un consumidor (el grafo, una caché, un servicio externo...) guarda la última seq que aplicó y
+    # después solo lee los cambios posteriores. Para empezar, se toma la marca con get_ultimo_cambio()
+    # ANTES de leer los datos completos: los cambios que entren mientras tanto se volverán a aplicar, así
+    # que aplicarlos tiene que ser idempotente (añadir lo que ya está o quitar lo que no está no hace nada).
+    CAMBIO_ALTA = 'alta'
+    CAMBIO_MODIFICACION = 'modificacion'
+    CAMBIO_BAJA = 'baja'
+    SQL_CAMBIOS = "SELECT seq, tabla, operacion, isbn, dni, activo FROM cambios WHERE seq > ? ORDER BY seq"
+
+    def get_ultimo_cambio(self):
+        # Última seq asignada (0 si aún no hay cambios); no baja aunque se poden las filas
+        self.cursor.execute("SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'cambios'), 0)")
+        return self.cursor.fetchone()[0]
+
+    def get_cambios(self, desde=0, limite=1000):
+        # Registros Cambio con seq > desde, en orden, como mucho `limite` (rango de la clave primaria)
+        return self._registros(self.SQL_CAMBIOS + " LIMIT ?", (desde, limite), fila_cambio)
+
+    def iterar_cambios(self, desde=0, tamano_lote=TAMANO_LOTE, conexion=None):
+        # Todos los cambios con seq > desde, en streaming
+        return self._iterar_consulta(self.SQL_CAMBIOS, (desde,), tamano_lote, fila_cambio, conexion)
+
+    def get_id_bd(self):
+        # Identificador aleatorio asignado a la base de datos al crearla (migración 10)
+        self.cursor.execute("SELECT valor FROM propiedades WHERE clave = 'id_bd'")
+        return self.cursor.fetchone()[0]
+
+    def get_primer_cambio(self):
+        # Seq más antigua que queda en el diario (None si está vacío). Un consumidor con una marca
+        # menor que get_primer_cambio() - 1 ha perdido cambios podados y tiene que recargar todo.
+        self.cursor.execute("SELECT min(seq) FROM cambios")
+        return self.cursor.fetchone()[0]
+
+    def get_marca_cambios(self, consumidor):
+        # Última seq que guardó el consumidor, o None si nunca guardó ninguna
+        self.cursor.execute("SELECT seq FROM cambios_marcas WHERE consumidor = ?", (consumidor,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def guardar_marca_cambios(self, consumidor, seq):
+        try:
+            self.cursor.execute("""
+                INSERT INTO cambios_marcas (consumidor, seq) VALUES (?, ?)
+                ON CONFLICT (consumidor) DO UPDATE SET seq = excluded.seq
+            """, (consumidor, seq))
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error al guardar la marca de cambios: {e}")
+            self.conn.rollback()
+            return False
+
+    def podar_cambios(self, hasta=None):
+        """
+        Borra los cambios con seq <= hasta. Por defecto, hasta la marca más baja de los consumidores
+        registrados (cambios_marcas): los que ya han aplicado todos. Sin consumidores registrados no
+        borra nada. Devuelve el número de cambios borrados.
+        """
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            if hasta is None:
+                self.cursor.execute("SELECT min(seq) FROM cambios_marcas")
+                hasta = self.cursor.fetchone()[0]
+            borrados = 0
+            if hasta is not None:
+                self.cursor.execute("DELETE FROM cambios WHERE seq <= ?", (hasta,))
+                borrados = self.cursor.rowcount
+            self.conn.commit()
+            return borrados
+        except sqlite3.Error as e:
+            print(f"Error al podar el diario de cambios: {e}")
+            self.conn.rollback()
+            return 0
+
+    def _triggers_diario(self):
+        # Triggers que llenan el diario, como (nombre, sql): las cargas de datos sintéticos los quitan y
+        # los vuelven a crear, igual que los índices (ver _indices_secundarios)
+        self.cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN "
+                            "('libros', 'usuarios', 'prestamos') AND name LIKE 'cambios_%'")
+        return self.cursor.fetchall()
@@ -0,0 +1,458 @@
+"""
+Grafo de préstamos de la biblioteca: nodos de usuarios ('u_<dni>') y libros ('l_<isbn>'),
+con una arista usuario -> libro por cada préstamo activo.
+
+Cada nodo guarda solo su tipo y el registro compacto (Libro o Usuario, ver biblioteca_registros)
+en el atributo 'registro', en lugar de copiar cada campo como un atributo más del nodo.
+
+El grafo es un consumidor del diario de cambios de la base de datos (tabla cambios): 'marca' es la
+última seq que refleja, y sincronizar() aplica solo los cambios posteriores, hechos por esta
+aplicación o por cualquier otro proceso que escriba en el mismo fichero.
+
+Para arrancar sin recorrer toda la base de datos, el grafo se guarda en una instantánea binaria
+(guardar_instantanea) marcada con el identificador de la base de datos, la versión del esquema y la
+marca del diario. cargar_instantanea solo la acepta si la marca coincide con esa base de datos y
+el diario conserva todos los cambios posteriores; después basta con sincronizar().
+
+networkx se importa de forma diferida, la primera vez que se usa el grafo, para que importar
+este módulo (o el núcleo de la biblioteca) no pague su coste.
+"""
+import gc
+import marshal
+import os
+import tempfile
+from collections.abc import MutableMapping
+from itertools import islice
+
+from biblioteca_db import ESQUEMA_VERSION
+from biblioteca_registros import Libro, Usuario
+
+# Versión del formato de las instantáneas; cambiarla si cambia lo que se guarda
+FORMATO_INSTANTANEA = 1
+
+
+def _networkx():
+    import networkx as nx
+    return nx
+
+
+class _AtributosNodo(MutableMapping):
+    """
+    Atributos de un nodo ('type' y 'registro') en dos slots en vez de un dict por nodo.
+    networkx crea uno por nodo con node_attr_dict_factory; solo admite esas dos claves.
+    """
+    __slots__ = ('type', 'registro')
+    CLAVES = __slots__
+
+    def __getitem__(self, clave):
+        if clave not in self.CLAVES:
+            raise KeyError(clave)
+        try:
+            return getattr(self, clave)
+        except AttributeError:
+            raise KeyError(clave) from None
+
+    def __setitem__(self, clave, valor):
+        if clave not in self.CLAVES:
+            raise KeyError(f"Atributo de nodo no soportado: {clave}")
+        setattr(self, clave, valor)
+
+    def __delitem__(self, clave):
+        if clave not in self.CLAVES:
+            raise KeyError(clave)
+        try:
+            delattr(self, clave)
+        except AttributeError:
+            raise KeyError(clave) from None
+
+    def update(self, otro=(), **claves):
+        # networkx llama a update() con los atributos de cada nodo nuevo: sin el update() genérico
+        # de MutableMapping, que pasa por isinstance y __setitem__ por cada clave
+        for clave, valor in dict(otro, **claves).items():
+            if clave not in self.CLAVES:
+                raise KeyError(f"Atributo de nodo no soportado: {clave}")
+            setattr(self, clave, valor)
+
+    def __iter__(self):
+        return (clave for clave in self.CLAVES if hasattr(self, clave))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def ruta_instantanea(db_name):
+    """Fichero de la instantánea del grafo de una base de datos (None para ':memory:')."""
+    return None if db_name == ":memory:" else f"{db_name}.grafo"
+
+
+def id_usuario(dni):
+    return f"u_{dni}"
+
+
+def id_libro(isbn):
+    return f"l_{isbn}"
+
+
+class GrafoBiblioteca:
+    TAMANO_LOTE_CAMBIOS = 1000
+    CONSUMIDOR_CAMBIOS = "grafo"  # Nombre de la marca del grafo en cambios_marcas (ver podar_cambios)
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._grafo = None
+        self.marca = None  # Última seq del diario de cambios aplicada (None: aún no se ha cargado)
+
+    @property
+    def grafo(self):
+        if self._grafo is None:
+            self._grafo = _networkx().DiGraph()  # Sigue siendo en memoria para el grafo
+            self._grafo.node_attr_dict_factory = _AtributosNodo
+        return self._grafo
+
+    # --- Construcción y mantenimiento ---
+    def reconstruir(self, al_avanzar=None):
+        """
+        Reconstruye el grafo completamente desde los datos de la base de datos.
+        Esto se llama al inicio de la aplicación para cargar el estado persistente.
+        al_avanzar(paso, total_pasos, mensaje), si se indica, se llama al empezar cada fase.
+        """
+        self.grafo.clear()  # Limpiar cualquier estado anterior
+        # La marca se toma antes de leer: lo que cambie durante la carga lo volverá a aplicar sincronizar()
+        self.marca = self.db_manager.get_ultimo_cambio()
+
+        # Añadir nodos de usuarios
+        if al_avanzar:
+            al_avanzar(0, 3, "Cargando usuarios")
+        for usuario in self.db_manager.iterar_usuarios():
+            self.grafo.add_node(id_usuario(usuario.dni), type='usuario', registro=usuario)
+
+        # Añadir nodos de libros
+        if al_avanzar:
+            al_avanzar(1, 3, "Cargando libros")
+        for libro in self.db_manager.iterar_libros():
+            self.grafo.add_node(id_libro(libro.isbn), type='libro', registro=libro)
+
+        # Añadir aristas de préstamos activos
+        if al_avanzar:
+            al_avanzar(2, 3, "Cargando préstamos activos")
+        for prestamo in self.db_manager.get_prestamos_activos():
+            usuario_id = id_usuario(prestamo.dni)
+            libro_id = id_libro(prestamo.isbn)
+            if self.grafo.has_node(usuario_id) and self.grafo.has_node(libro_id):
+                self.grafo.add_edge(usuario_id, libro_id, type='presta')
+
+    def agregar_libro(self, libro):
+        """Añade un nodo de libro (Libro o dict con los mismos campos). Devuelve False si ya existía."""
+        if not isinstance(libro, Libro):
+            libro = Libro.desde_dict(libro)
+        libro_id = id_libro(libro.isbn)
+        if self.grafo.has_node(libro_id):
+            return False
+        self.grafo.add_node(libro_id, type='libro', registro=libro)
+        return True
+
+    def eliminar_libro(self, isbn):
+        """Elimina un nodo de libro y sus aristas. Devuelve False si no existía."""
+        libro_id = id_libro(isbn)
+        if not self.grafo.has_node(libro_id):
+            return False
+        self.grafo.remove_node(libro_id)
+        return True
+
+    def agregar_usuario(self, dni, nombre):
+        """Añade un nodo de usuario. Devuelve False si ya existía."""
+        usuario_id = id_usuario(dni)
+        if self.grafo.has_node(usuario_id):
+            return False
+        self.grafo.add_node(usuario_id, type='usuario', registro=Usuario(dni, nombre))
+        return True
+
+    def eliminar_usuario(self, dni):
+        """Elimina un nodo de usuario y sus aristas. Devuelve False si no existía."""
+        usuario_id = id_usuario(dni)
+        if not self.grafo.has_node(usuario_id):
+            return False
+        self.grafo.remove_node(usuario_id)
+        return True
+
+    def asegurar_usuario(self, dni):
+        """
+        Garantiza que el usuario esté en el grafo, cargándolo de la BD si hace falta.
+        Devuelve el nombre del usuario, o None si tampoco existe en la BD.
+        """
+        usuario_id = id_usuario(dni)
+        if self.grafo.has_node(usuario_id):
+            return self.grafo.nodes[usuario_id]['registro'].nombre
+        usuario = self.db_manager.get_usuario(dni)
+        if not usuario:
+            return None
+        self.grafo.add_node(usuario_id, type='usuario', registro=usuario)
+        return usuario.nombre
+
+    def asegurar_libro(self, isbn):
+        """Igual que asegurar_usuario para libros; devuelve el título o None."""
+        libro_id = id_libro(isbn)
+        if self.grafo.has_node(libro_id):
+            return self.grafo.nodes[libro_id]['registro'].titulo
+        libro = self.db_manager.get_libro(isbn, incluir_historial=False)
+        if not libro:
+            return None
+        self.grafo.add_node(libro_id, type='libro', registro=libro)
+        return libro.titulo
+
+    def agregar_prestamo(self, dni, isbn):
+        """Añade la arista de préstamo (los dos nodos deben existir, ver asegurar_*)."""
+        self.grafo.add_edge(id_usuario(dni), id_libro(isbn), type='presta')
+
+    def eliminar_prestamo(self, dni, isbn):
+        """Elimina la arista de préstamo. Devuelve False si no existía."""
+        usuario_id = id_usuario(dni)
+        libro_id = id_libro(isbn)
+        if not self.grafo.has_edge(usuario_id, libro_id):
+            return False
+        self.grafo.remove_edge(usuario_id, libro_id)
+        return True
+
+    # --- Instantáneas ---
+    # Un único objeto marshal: (formato, versión de marshal, versión del esquema, id de la base de datos,
+    # marca, usuarios, libros, aristas). marshal solo admite tipos básicos: los registros se guardan como
+    # tuplas y las aristas como posiciones (usuario, libro) seguidas en las listas de usuarios y libros.
+    # Al cargar no se ejecuta código (a diferencia de pickle) y no hace falta consultar la base de datos.
+    def _version_instantanea(self):
+        return FORMATO_INSTANTANEA, marshal.version, ESQUEMA_VERSION, self.db_manager.get_id_bd()
+
+    def guardar_instantanea(self, ruta):
+        """Guarda el grafo en `ruta` (se sustituye el fichero de una vez). Devuelve True si se guardó."""
+        if self.marca is None:
+            return False  # Grafo sin cargar: no refleja ningún estado de la base de datos
+        posiciones = {'usuario': {}, 'libro': {}}
+        registros = {'usuario': [], 'libro': []}
+        for nodo, atributos in self.grafo.nodes(data=True):
+            tipo = atributos['type']
+            posiciones[tipo][nodo] = len(registros[tipo])
+            registro = atributos['registro']
+            registros[tipo].append(tuple(registro[:7]) if tipo == 'libro' else tuple(registro))
+        aristas = []
+        for usuario_id, libro_id in self.grafo.edges():
+            aristas.append(posiciones['usuario'][usuario_id])
+            aristas.append(posiciones['libro'][libro_id])
+
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        descriptor, temporal = tempfile.mkstemp(prefix=".grafo_", dir=directorio)
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(marshal.dumps((*self._version_instantanea(), self.marca, registros['usuario'],
+                                       registros['libro'], aristas)))
+            os.replace(temporal, ruta)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"Error al guardar la instantánea del grafo: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return False
+
+    def cargar_instantanea(self, ruta):
+        """
+        Carga el grafo de una instantánea de esta misma base de datos. Devuelve False, sin tocar el
+        grafo, si no existe o no sirve (otra base de datos u otra versión, o el diario ya no tiene
+        los cambios posteriores a su marca): entonces hay que reconstruir. Después, sincronizar().
+        """
+        # Desactivar el recolector de ciclos mientras se crean los objetos: ninguno forma ciclos y,
+        # si no, lo recorre una y otra vez a medida que crece el grafo (más de la mitad del tiempo).
+        recolector = gc.isenabled()
+        gc.disable()
+        try:
+            return self._cargar_instantanea(ruta)
+        finally:
+            if recolector:
+                gc.enable()
+
+    def _cargar_instantanea(self, ruta):
+        try:
+            with open(ruta, 'rb') as f:
+                # marshal.loads sobre todo el fichero: marshal.load(f) lee el fichero a trozos muy pequeños
+                *version, marca, usuarios, libros, aristas = marshal.loads(f.read())
+        except FileNotFoundError:
+            return False
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            print(f"Instantánea del grafo descartada: no se puede leer: {e}")
+            return False
+        if tuple(version) != self._version_instantanea():
+            print("Instantánea del grafo descartada: es de otra base de datos o de otra versión")
+            return False
+        if marca > self.db_manager.get_ultimo_cambio():
+            print("Instantánea del grafo descartada: es posterior a la base de datos (¿copia restaurada?)")
+            return False
+
+        marca_anterior, self.marca = self.marca, marca
+        if self.hay_cambios_perdidos():
+            self.marca = marca_anterior
+            print("Instantánea del grafo descartada: el diario ya no tiene los cambios posteriores")
+            return False
+
+        usuario_ids = [id_usuario(dni) for dni, _ in usuarios]
+        libro_ids = [id_libro(datos[0]) for datos in libros]
+        self.grafo.clear()
+        nodos = self.grafo.nodes
+        self.grafo.add_nodes_from(usuario_ids, type='usuario')
+        for usuario_id, datos in zip(usuario_ids, usuarios):
+            nodos[usuario_id]['registro'] = Usuario(*datos)
+        self.grafo.add_nodes_from(libro_ids, type='libro')
+        for libro_id, datos in zip(libro_ids, libros):
+            nodos[libro_id]['registro'] = Libro(*datos)
+        posiciones = iter(aristas)
+        self.grafo.add_edges_from(((usuario_ids[usuario], libro_ids[libro]) for usuario, libro in
+                                   zip(posiciones, posiciones)), type='presta')
+        return True
+
+    # --- Diario de cambios ---
+    def aplicar_cambio(self, cambio):
+        """
+        Aplica un registro Cambio del diario. Es idempotente: volver a aplicar un cambio que el grafo
+        ya refleja no hace nada. Devuelve True si el grafo ha cambiado.
+        """
+        db = self.db_manager
+        if cambio.tabla == 'prestamos':
+            if cambio.activo and cambio.operacion != db.CAMBIO_BAJA:
+                if self.grafo.has_edge(id_usuario(cambio.dni), id_libro(cambio.isbn)):
+                    return False
+                if self.asegurar_usuario(cambio.dni) is None or self.asegurar_libro(cambio.isbn) is None:
+                    return False  # Ya no existe: su baja llega más adelante en el diario
+                self.agregar_prestamo(cambio.dni, cambio.isbn)
+                return True
+            return self.eliminar_prestamo(cambio.dni, cambio.isbn)
+
+        if cambio.tabla == 'libros':
+            if cambio.operacion == db.CAMBIO_BAJA:
+                return self.eliminar_libro(cambio.isbn)
+            return self._refrescar_nodo(id_libro(cambio.isbn), 'libro',
+                                        db.get_libro(cambio.isbn, incluir_historial=False))
+        if cambio.tabla == 'usuarios':
+            if cambio.operacion == db.CAMBIO_BAJA:
+                return self.eliminar_usuario(cambio.dni)
+            return self._refrescar_nodo(id_usuario(cambio.dni), 'usuario', db.get_usuario(cambio.dni))
+        return False
+
+    def _refrescar_nodo(self, nodo, tipo, registro):
+        # registro: estado actual en la BD; None si ya se borró (su baja llega más adelante en el diario)
+        if registro is None:
+            return False
+        if not self.grafo.has_node(nodo):
+            self.grafo.add_node(nodo, type=tipo, registro=registro)
+            return True
+        if self.grafo.nodes[nodo]['registro'] == registro:
+            return False
+        self.grafo.nodes[nodo]['registro'] = registro
+        return True
+
+    def hay_cambios_perdidos(self):
+        """
+        True si el diario ya no tiene todos los cambios posteriores a la marca (se podaron) o si el
+        grafo aún no se ha cargado: hay que reconstruir.
+        """
+        if self.marca is None:
+            return True  # Los datos anteriores al diario no están en él
+        primero = self.db_manager.get_primer_cambio()
+        if primero is None:
+            return self.db_manager.get_ultimo_cambio() > self.marca
+        return primero > self.marca + 1
+
+    def sincronizar(self, limite=None):
+        """
+        Aplica los cambios del diario posteriores a la marca (como mucho `limite`, si se indica) y
+        avanza la marca. Devuelve la lista de registros Cambio leídos, o None si faltan cambios
+        (hay_cambios_perdidos) y hay que reconstruir el grafo.
+        """
+        if self.hay_cambios_perdidos():
+            return None
+        leidos = []
+        while limite is None or len(leidos) < limite:
+            lote = self.TAMANO_LOTE_CAMBIOS if limite is None else min(self.TAMANO_LOTE_CAMBIOS, limite - len(leidos))
+            cambios = self.db_manager.get_cambios(self.marca, lote)
+            if not cambios:
+                break
+            # Los registros de la caché de la BD pueden ser anteriores si el cambio lo hizo otro proceso
+            self.db_manager.invalidar_cache_cambios(cambios)
+            for cambio in cambios:
+                self.aplicar_cambio(cambio)
+                self.marca = cambio.seq
+            leidos.extend(cambios)
+            if len(cambios) < lote:
+                break
+        return leidos
+
+    # --- Consultas ---
+    def contiene_usuario(self, dni):
+        return id_usuario(dni) in self.grafo
+
+    def libros_de_usuario(self, usuario_id):
+        return set(neighbor for neighbor in self.grafo.successors(usuario_id) if
+                   self.grafo.nodes[neighbor]['type'] == 'libro')
+
+    def isbns_de_usuario(self, dni):
+        # ISBN de los libros que el usuario tiene prestados según el grafo
+        return [self.grafo.nodes[libro_id]['registro'].isbn for libro_id in self.libros_de_usuario(id_usuario(dni))]
+
+    def prestatarios_de_libro(self, libro_id):
+        # Índice inverso libro -> usuarios: en el DiGraph son los predecesores del nodo del libro,
+        # y networkx los mantiene al añadir o quitar aristas.
+        return set(neighbor for neighbor in self.grafo.predecessors(libro_id) if
+                   self.grafo.nodes[neighbor]['type'] == 'usuario')
+
+    def _libros_en_comun(self, usuario_id, libros_base):
+        # Solo recorre los usuarios que comparten al menos un libro con el usuario base
+        comunes = {}  # usuario_id: libros en común
+        for libro_id in libros_base:
+            for otro_id in self.prestatarios_de_libro(libro_id):
+                if otro_id != usuario_id:
+                    comunes[otro_id] = comunes.get(otro_id, 0) + 1
+        return comunes
+
+    def usuarios_similares(self, dni):
+        """Lista de (dni, libros en común) con los usuarios que comparten algún libro, de más a menos similar."""
+        usuario_base_id = id_usuario(dni)
+        libros_prestados_por_base = self.libros_de_usuario(usuario_base_id)
+        similares_encontrados = {self.grafo.nodes[otro_id]['registro'].dni: count for otro_id, count in
+                                 self._libros_en_comun(usuario_base_id, libros_prestados_por_base).items()}
+        return sorted(similares_encontrados.items(), key=lambda item: item[1], reverse=True)
+
+    def recomendar_libros(self, dni, limite=5):
+        """
+        Libros disponibles que han prestado los usuarios similares y el usuario aún no.
+        Devuelve una lista de (isbn, titulo, puntuación) de mayor a menor puntuación.
+        """
+        usuario_id = id_usuario(dni)
+        libros_ya_prestados = self.libros_de_usuario(usuario_id)
+
+        recomendaciones_candidatas = {}
+
+        for similar_user_id in self._libros_en_comun(usuario_id, libros_ya_prestados):
+            for libro_id in self.libros_de_usuario(similar_user_id):
+                if libro_id not in libros_ya_prestados:
+                    # Asegurarse de que el libro esté disponible para recomendar
+                    isbn_libro = self.grafo.nodes[libro_id]['registro'].isbn
+                    libro_db_info = self.db_manager.get_libro(isbn_libro, incluir_historial=False)
+                    if libro_db_info and libro_db_info.disponible:
+                        recomendaciones_candidatas[libro_id] = recomendaciones_candidatas.get(libro_id, 0) + 1
+
+        sorted_recomendaciones = sorted(recomendaciones_candidatas.items(), key=lambda item: item[1], reverse=True)
+        recomendaciones = []
+        for libro_id, score in sorted_recomendaciones[:limite]:
+            libro = self.grafo.nodes[libro_id]['registro']  # Obtener datos del libro del grafo
+            recomendaciones.append((libro.isbn, libro.titulo, score))
+        return recomendaciones
+
+    def numero_nodos(self):
+        return self.grafo.number_of_nodes()
+
+    def numero_aristas(self):
+        return self.grafo.number_of_edges()
+
+    def nodos(self, limite=None):
+        return list(islice(self.grafo.nodes(data=True), limite))
+
+    def aristas(self, limite=None):
+        return list(islice(self.grafo.edges(data=True), limite))
@@ -0,0 +1,266 @@
+"""
+Instrumentación de consultas para DatabaseManager.
+
+MetricasBD registra, por método de DatabaseManager y por sentencia SQL (normalizada, con los valores
+sustituidos por '?'): número de llamadas, histograma de latencias, filas devueltas (métodos) o
+modificadas (sentencias) y pasos de la máquina virtual de SQLite. Las sentencias se observan con los
+callbacks de sqlite3: set_trace_callback marca el inicio de cada una (la anterior de esa conexión
+termina ahí o al acabar el método) y set_progress_handler cuenta su trabajo.
+
+Las sentencias más lentas que umbral_lento_ms van al registro de consultas lentas junto con su
+EXPLAIN QUERY PLAN, que se obtiene al terminar el método (no se puede usar la conexión dentro de
+los callbacks) con una conexión aparte. volcar() escribe todo en JSON y texto legible.
+
+En los recorridos en streaming (iterar_*), el tiempo de una sentencia incluye lo que tarde el
+consumidor en pedir las filas.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Límites superiores de los cubos del histograma, en milisegundos
+CUBOS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+PASOS_PROGRESO = 1000  # El progress handler se llama cada tantas instrucciones de la VM
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_ESPACIOS = re.compile(r"\s+")
+_LISTAS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def normalizar_sql(sql):
+    """Quita literales y espacios sobrantes para agrupar ejecuciones de la misma sentencia."""
+    sql = _ESPACIOS.sub(" ", _LITERALES.sub("?", sql)).strip()
+    return _LISTAS.sub("?, ...", sql)  # IN (?, ?, ?) con cualquier número de valores
+
+
+class Histograma:
+    def __init__(self):
+        self.cubos = [0] * (len(CUBOS_MS) + 1)  # El último es "más de CUBOS_MS[-1]"
+        self.llamadas = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        ms = segundos * 1000
+        for i, limite in enumerate(CUBOS_MS):
+            if ms <= limite:
+                self.cubos[i] += 1
+                break
+        else:
+            self.cubos[-1] += 1
+        self.llamadas += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p):
+        # Aproximado: límite superior del cubo donde cae el percentil
+        objetivo = self.llamadas * p
+        acumulado = 0
+        for i, cantidad in enumerate(self.cubos):
+            acumulado += cantidad
+            if cantidad and acumulado >= objetivo:
+                return CUBOS_MS[i] if i < len(CUBOS_MS) else self.maximo * 1000
+        return 0.0
+
+    def como_dict(self):
+        return {
+            'llamadas': self.llamadas,
+            'total_ms': self.total * 1000,
+            'media_ms': self.total * 1000 / self.llamadas if self.llamadas else 0.0,
+            'maximo_ms': self.maximo * 1000,
+            'p50_ms': self.percentil(0.5),
+            'p95_ms': self.percentil(0.95),
+            'cubos': {f"<={limite}ms": n for limite, n in zip(CUBOS_MS, self.cubos)} | {
+                f">{CUBOS_MS[-1]}ms": self.cubos[-1]},
+        }
+
+
+class _Metrica:
+    def __init__(self):
+        self.histograma = Histograma()
+        self.filas = 0
+        self.pasos = 0
+        self.errores = 0
+
+
+class MetricasBD:
+    def __init__(self, db_name, umbral_lento_ms=100, max_lentas=200, archivo_lentas=None):
+        self.db_name = db_name
+        self.umbral_lento = umbral_lento_ms / 1000
+        self.archivo_lentas = archivo_lentas  # Si se indica, cada consulta lenta se añade también ahí
+        self.lentas = deque(maxlen=max_lentas)
+        self._metodos = {}
+        self._sentencias = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._conn_planes = None
+        self.desde = time.time()
+
+    # --- Callbacks de sqlite3 (se instalan en cada conexión nueva) ---
+    def instalar(self, conn):
+        estado = {'sql': None, 'inicio': 0.0, 'cambios': 0, 'pasos': 0}
+
+        def trazar(sql):
+            if sql.startswith("--"):
+                return  # Sentencias de triggers: se ejecutan dentro de la sentencia actual
+            self._cerrar_sentencia(conn, estado)
+            estado.update(sql=sql, inicio=time.perf_counter(), cambios=conn.total_changes, pasos=0)
+            self._sentencias_abiertas()[id(conn)] = (conn, estado)
+
+        def progreso():
+            estado['pasos'] += 1
+            return 0  # Distinto de 0 interrumpiría la consulta
+
+        conn.set_trace_callback(trazar)
+        conn.set_progress_handler(progreso, PASOS_PROGRESO)
+
+    def _sentencias_abiertas(self):
+        if not hasattr(self._local, 'abiertas'):
+            self._local.abiertas = {}  # id(conexión) -> (conexión, estado) con una sentencia en curso
+            self._local.pendientes = []  # Consultas lentas a las que falta el plan
+            self._local.profundidad = 0
+        return self._local.abiertas
+
+    def _cerrar_sentencia(self, conn, estado):
+        if estado['sql'] is None:
+            return
+        segundos = time.perf_counter() - estado['inicio']
+        clave = normalizar_sql(estado['sql'])
+        try:
+            cambios = conn.total_changes - estado['cambios']
+        except sqlite3.ProgrammingError:
+            cambios = 0  # La conexión se cerró con la sentencia abierta (cerrar_conexion)
+        with self._lock:
+            metrica = self._sentencias.get(clave)
+            if metrica is None:
+                metrica = self._sentencias[clave] = _Metrica()
+            metrica.histograma.registrar(segundos)
+            metrica.filas += cambios
+            metrica.pasos += estado['pasos'] * PASOS_PROGRESO
+        if segundos >= self.umbral_lento:
+            self._sentencias_abiertas()
+            self._local.pendientes.append((estado['sql'], segundos, datetime.now()))
+        estado['sql'] = None
+
+    # --- Métodos de DatabaseManager ---
+    def envolver(self, nombre, metodo, devuelve_mapa=False):
+        # Filas de un método: longitud de la lista devuelta, o del dict si devuelve_mapa (clave -> fila);
+        # cualquier otro resultado no nulo (un registro, aunque sea un namedtuple, o un bool) cuenta como una
+        def medido(*args, **kwargs):
+            abiertas = self._sentencias_abiertas()
+            self._local.profundidad += 1
+            inicio = time.perf_counter()
+            resultado = None
+            error = False
+            try:
+                resultado = metodo(*args, **kwargs)
+                return resultado
+            except Exception:
+                error = True
+                raise
+            finally:
+                segundos = time.perf_counter() - inicio
+                self._local.profundidad -= 1
+                with self._lock:
+                    metrica = self._metodos.get(nombre)
+                    if metrica is None:
+                        metrica = self._metodos[nombre] = _Metrica()
+                    metrica.histograma.registrar(segundos)
+                    if error:
+                        metrica.errores += 1
+                    elif (isinstance(resultado, (list, set)) or type(resultado) is tuple or
+                          (devuelve_mapa and isinstance(resultado, dict))):
+                        metrica.filas += len(resultado)
+                    elif resultado is not None:
+                        metrica.filas += 1
+                if self._local.profundidad == 0:
+                    # Fin de la llamada más externa: la última sentencia termina aquí
+                    for conn, estado in abiertas.values():
+                        self._cerrar_sentencia(conn, estado)
+                    abiertas.clear()
+                    self._registrar_lentas()
+
+        medido.__name__ = nombre
+        medido.__doc__ = metodo.__doc__
+        return medido
+
+    # --- Consultas lentas ---
+    def _plan(self, sql):
+        sentencia = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+        if sentencia not in ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT"):
+            return []
+        try:
+            if self._conn_planes is None:
+                self._conn_planes = sqlite3.connect(self.db_name, check_same_thread=False)
+            with self._lock:
+                return [row[3] for row in self._conn_planes.execute("EXPLAIN QUERY PLAN " + sql)]
+        except sqlite3.Error as e:
+            return [f"(sin plan: {e})"]
+
+    def _registrar_lentas(self):
+        pendientes = self._local.pendientes
+        while pendientes:
+            sql, segundos, momento = pendientes.pop(0)
+            lenta = {'momento': momento.isoformat(timespec='seconds'), 'ms': segundos * 1000, 'sql': sql,
+                     'plan': self._plan(sql)}
+            self.lentas.append(lenta)
+            if self.archivo_lentas:
+                try:
+                    with open(self.archivo_lentas, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(lenta, ensure_ascii=False) + "\n")
+                except OSError as e:
+                    print(f"No se pudo escribir el registro de consultas lentas: {e}")
+
+    # --- Lectura de resultados ---
+    def reiniciar(self):
+        with self._lock:
+            self._metodos.clear()
+            self._sentencias.clear()
+            self.lentas.clear()
+            self.desde = time.time()
+
+    def instantanea(self):
+        with self._lock:
+            return {
+                'desde': datetime.fromtimestamp(self.desde).isoformat(timespec='seconds'),
+                'umbral_lento_ms': self.umbral_lento * 1000,
+                'metodos': {nombre: dict(m.histograma.como_dict(), filas=m.filas, errores=m.errores)
+                            for nombre, m in self._metodos.items()},
+                'sentencias': {sql: dict(m.histograma.como_dict(), filas_modificadas=m.filas, pasos_vm=m.pasos)
+                               for sql, m in self._sentencias.items()},
+                'lentas': list(self.lentas),
+            }
+
+    def resumen(self, limite=15):
+        """Texto legible: métodos y sentencias con más tiempo total y las últimas consultas lentas."""
+        datos = self.instantanea()
+        lineas = [f"Métricas desde {datos['desde']} (consulta lenta: >= {datos['umbral_lento_ms']:.0f} ms)", ""]
+        for titulo, clave, extra in (("Métodos", 'metodos', 'filas'), ("Sentencias SQL", 'sentencias', 'pasos_vm')):
+            lineas.append(f"{titulo} (por tiempo total):")
+            ordenados = sorted(datos[clave].items(), key=lambda item: item[1]['total_ms'], reverse=True)
+            for nombre, m in ordenados[:limite]:
+                lineas.append(f"  {m['total_ms']:10.1f} ms  {m['llamadas']:7d} llamadas  media {m['media_ms']:8.3f} ms  "
+                              f"p95 {m['p95_ms']:7.1f} ms  {extra} {m[extra]}  {nombre[:100]}")
+            lineas.append("")
+        lineas.append(f"Consultas lentas (últimas {min(limite, len(datos['lentas']))}):")
+        for lenta in datos['lentas'][-limite:]:
+            lineas.append(f"  [{lenta['momento']}] {lenta['ms']:.1f} ms  {lenta['sql'][:200]}")
+            lineas.extend(f"      {paso}" for paso in lenta['plan'])
+        return "\n".join(lineas)
+
+    def volcar(self, ruta):
+        """Escribe las métricas en ruta: JSON si termina en .json, si no el resumen en texto."""
+        with open(ruta, 'w', encoding='utf-8') as f:
+            if ruta.lower().endswith(".json"):
+                json.dump(self.instantanea(), f, indent=2, ensure_ascii=False)
+            else:
+                f.write(self.resumen(limite=50))
+
+    def cerrar(self):
+        if self._conn_planes is not None:
+            self._conn_planes.close()
+            self._conn_planes = None
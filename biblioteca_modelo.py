@@ -0,0 +1,209 @@
+"""
+Lógica de negocio de la biblioteca sobre DatabaseManager: catálogo por ISBN, importación y exportación.
+
+Igual que biblioteca_db, este módulo no importa tkinter ni networkx.
+"""
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from biblioteca_db import DatabaseManager
+from biblioteca_registros import RegistroInvalido
+
+
+# --- CLASES DEL MODELO (Lógica de Negocio) - Adaptadas para usar DBManager ---
+
+# La clase BibliotecaISBN ya no necesita mantener la raíz del árbol en memoria
+# Su rol ahora es una interfaz que usa el DatabaseManager.
+class BibliotecaISBN:
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def insertar_libro(self, libro):
+        return self.db_manager.add_libro(libro)
+
+    def buscar_libro_por_isbn(self, isbn, incluir_historial=True):
+        return self.db_manager.get_libro(isbn, incluir_historial)
+
+    def listar_libros_ordenado_por_isbn(self, incluir_historial=False):
+        return self.db_manager.get_all_libros(incluir_historial)
+
+    def pagina_libros_ordenado_por_isbn(self, despues_de=None, antes_de=None, limite=100):
+        return self.db_manager.get_pagina_libros(despues_de, antes_de, limite)
+
+    def buscar_libros_por_texto(self, texto, limite=50):
+        return self.db_manager.buscar_libros(texto, limite)
+
+    def borrar_libro(self, isbn_borrar):
+        return self.db_manager.delete_libro(isbn_borrar)
+
+    def obtener_historial_completo_prestamos(self):
+        # {titulo: [nombres de usuario, del préstamo más reciente al más antiguo]}
+        historial = {}
+        libros = self.listar_libros_ordenado_por_isbn(incluir_historial=True)
+        all_users = self.db_manager.get_all_usuarios()  # Obtener usuarios de la BD
+        for libro in libros:
+            if libro['prestado_a']:
+                historial[libro['titulo']] = [all_users.get(dni, "Usuario desconocido") for dni in
+                                              reversed(libro['prestado_a'])]
+        return historial
+
+
+# --- IMPORTACIÓN DE CATÁLOGO Y USUARIOS (CSV / JSONL) ---
+def _leer_registros(ruta):
+    """
+    Genera los registros de un archivo .csv (con cabecera) o .jsonl (un objeto JSON por línea) sin cargarlo
+    entero. Las líneas que no se pueden leer se generan como RegistroInvalido, para que la carga las
+    informe como conflictos y siga con las demás.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in ('.csv', '.jsonl', '.ndjson'):
+        raise ValueError(f"Formato de archivo no soportado: {extension}")
+    with open(ruta, 'r', encoding='utf-8', newline='') as archivo:
+        if extension == '.csv':
+            lector = csv.DictReader(archivo)
+            while True:
+                try:
+                    fila = next(lector)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    fila = RegistroInvalido(f"CSV no válido (línea {lector.line_num}): {e}")
+                yield fila
+        else:
+            for numero, linea in enumerate(archivo, start=1):
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError as e:
+                    registro = RegistroInvalido(f"JSON no válido (línea {numero}): {e.msg}")
+                if not isinstance(registro, (dict, RegistroInvalido)):
+                    registro = RegistroInvalido(f"Línea {numero}: se esperaba un objeto JSON")
+                yield registro
+
+
+def _disponible_desde_texto(registro):
+    valor = registro.get('disponible', True)
+    if isinstance(valor, str):
+        return valor.strip().lower() not in ('0', 'false', 'no', 'n')
+    return bool(valor)
+
+
+def importar_libros(db_manager, ruta, tamano_lote=DatabaseManager.TAMANO_LOTE, diferir_indices=False):
+    # Columnas esperadas: isbn, titulo, autor, editorial y opcionalmente disponible
+    registros = (r if isinstance(r, RegistroInvalido) else dict(r, disponible=_disponible_desde_texto(r))
+                 for r in _leer_registros(ruta))
+    return db_manager.add_libros_bulk(registros, tamano_lote, diferir_indices)
+
+
+def importar_usuarios(db_manager, ruta, tamano_lote=DatabaseManager.TAMANO_LOTE, diferir_indices=False):
+    # Columnas esperadas: dni, nombre
+    return db_manager.add_usuarios_bulk(_leer_registros(ruta), tamano_lote, diferir_indices)
+
+
+# --- EXPORTACIÓN DE INFORMACIÓN (texto, CSV, JSONL) ---
+FORMATOS_EXPORTACION = ('txt', 'csv', 'jsonl')
+COLUMNAS_EXPORTACION_CSV = ['tipo', 'isbn', 'titulo', 'autor', 'editorial', 'estado', 'dni', 'nombre',
+                            'fecha_prestamo']
+
+
+def formato_exportacion_desde_ruta(ruta):
+    extension = os.path.splitext(ruta)[1].lower().lstrip('.')
+    return extension if extension in FORMATOS_EXPORTACION else 'txt'
+
+
+def _registros_exportacion(db_manager):
+    """Genera (tipo, dict) para libros, usuarios y préstamos leyendo la base de datos en streaming."""
+    for isbn, titulo, autor, editorial, disponible, dni, nombre in db_manager.iterar_catalogo():
+        yield 'libro', {'isbn': isbn, 'titulo': titulo, 'autor': autor, 'editorial': editorial,
+                        'estado': "Disponible" if disponible else "No disponible", 'dni': dni, 'nombre': nombre}
+    for dni, nombre in db_manager.iterar_usuarios():
+        yield 'usuario', {'dni': dni, 'nombre': nombre}
+    for isbn, titulo, dni, nombre, fecha, activo in db_manager.iterar_historial_prestamos():
+        yield 'prestamo', {'isbn': isbn, 'titulo': titulo, 'dni': dni, 'nombre': nombre, 'fecha_prestamo': fecha,
+                           'estado': "ACTIVO" if activo == 1 else "DEVUELTO"}
+
+
+def _lineas_texto(db_manager):
+    # Mismo formato que la exportación original en texto plano
+    yield "--- Información de Libros ---\n"
+    hay_datos = False
+    for isbn, titulo, autor, editorial, disponible, dni, nombre in db_manager.iterar_catalogo():
+        hay_datos = True
+        disponibilidad = "Disponible" if disponible else "No disponible"
+        yield (f"ISBN: {isbn}, Título: {titulo}, Autor: {autor}, Editorial: {editorial}, Estado: {disponibilidad}, "
+               f"Prestado a: {nombre or 'Ninguno'} (DNI: {dni})\n")
+    if not hay_datos:
+        yield "No hay libros registrados.\n"
+
+    yield "\n--- Información de Usuarios ---\n"
+    hay_datos = False
+    for dni, nombre in db_manager.iterar_usuarios():
+        hay_datos = True
+        yield f"DNI: {dni}, Nombre: {nombre}\n"
+    if not hay_datos:
+        yield "No hay usuarios registrados.\n"
+
+    yield "\n--- Historial de Préstamos ---\n"
+    hay_datos = False
+    for isbn, titulo, dni, nombre, fecha, activo in db_manager.iterar_historial_prestamos():
+        hay_datos = True
+        titulo_libro = titulo or f"ISBN {isbn} (desconocido)"
+        nombre_usuario = nombre or f"DNI {dni} (desconocido)"
+        estado_prestamo = "ACTIVO" if activo == 1 else "DEVUELTO"
+        yield (f"Libro: '{titulo_libro}' (ISBN: {isbn})\n"
+               f"  Usuario: '{nombre_usuario}' (DNI: {dni})\n"
+               f"  Fecha Préstamo: {fecha}, Estado: {estado_prestamo}\n"
+               "  ---------------------------------------\n")
+    if not hay_datos:
+        yield "No hay historial de préstamos registrado.\n"
+
+
+def _lineas_csv(db_manager):
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUMNAS_EXPORTACION_CSV, extrasaction='ignore')
+    escritor.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for tipo, registro in _registros_exportacion(db_manager):
+        escritor.writerow(dict(registro, tipo=tipo))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def exportar_informacion(db_manager, ruta, formato=None, tamano_buffer=1024 * 1024, al_avanzar=None):
+    """
+    Exporta libros, usuarios e historial de préstamos a 'ruta' en formato 'txt', 'csv' o 'jsonl'
+    (por defecto según la extensión). Lee con cursores en streaming y escribe por bloques,
+    así la memoria usada no crece con el tamaño del historial.
+    al_avanzar(lineas_escritas), si se indica, se llama tras escribir cada bloque.
+    """
+    formato = formato or formato_exportacion_desde_ruta(ruta)
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+    with open(ruta, 'w', encoding='utf-8', newline='', buffering=tamano_buffer) as archivo:
+        if formato == 'txt':
+            lineas = _lineas_texto(db_manager)
+        elif formato == 'csv':
+            lineas = _lineas_csv(db_manager)
+        else:
+            lineas = (json.dumps(dict(registro, tipo=tipo), ensure_ascii=False) + "\n"
+                      for tipo, registro in _registros_exportacion(db_manager))
+
+        # Escritura por bloques: se agrupan las líneas para reducir llamadas a write()
+        escritas = 0
+        while True:
+            bloque = list(islice(lineas, DatabaseManager.TAMANO_LOTE))
+            if not bloque:
+                break
+            archivo.write(''.join(bloque))
+            escritas += len(bloque)
+            if al_avanzar:
+                al_avanzar(escritas)
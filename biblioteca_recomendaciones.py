@@ -0,0 +1,147 @@
+"""
+Motor de recomendaciones item-item sobre el historial completo de préstamos.
+
+Construye una matriz dispersa usuario x libro (1 si el usuario ha prestado alguna vez el libro) y
+precalcula la similitud coseno entre libros con operaciones vectorizadas de NumPy/SciPy. Las
+recomendaciones de un usuario son la suma de las similitudes de los libros que ya ha leído.
+
+numpy y scipy son dependencias opcionales: se importan al entrenar el modelo. Sin ellas,
+la interfaz usa las recomendaciones del grafo (GrafoBiblioteca.recomendar_libros).
+"""
+import threading
+
+
+def _numpy_scipy():
+    import numpy as np
+    from scipy import sparse
+    return np, sparse
+
+
+class MotorRecomendaciones:
+    TAMANO_BLOQUE_DISPONIBILIDAD = 100  # Candidatos cuya disponibilidad se consulta de una vez
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._modelo = None  # (indice_usuarios, isbns, matriz usuario x libro, similitud libro x libro)
+        self.generacion = 0  # Sube con cada invalidar(): un modelo entrenado en otra generación ya no vale
+        self._lock_entrenamiento = threading.Lock()  # Evita entrenar dos veces desde hilos distintos
+
+    def invalidar(self):
+        """
+        Descarta el modelo; se vuelve a entrenar en la siguiente consulta. Si hay un entrenamiento en
+        curso (en otro hilo), su modelo no se guarda: se leyó antes de este cambio del historial.
+        """
+        self.generacion += 1
+        self._modelo = None
+
+    @property
+    def entrenado(self):
+        return self._modelo is not None
+
+    def entrenar(self):
+        np, sparse = _numpy_scipy()
+        generacion = self.generacion
+        indice_usuarios = {}
+        indice_libros = {}
+        filas = []
+        columnas = []
+        for dni, isbn in self.db_manager.iterar_pares_historial():
+            filas.append(indice_usuarios.setdefault(dni, len(indice_usuarios)))
+            columnas.append(indice_libros.setdefault(isbn, len(indice_libros)))
+
+        datos = np.ones(len(filas), dtype=np.float32)
+        matriz = sparse.csr_matrix((datos, (np.array(filas, dtype=np.int64), np.array(columnas, dtype=np.int64))),
+                                   shape=(len(indice_usuarios), len(indice_libros)))
+
+        # Coocurrencias libro x libro y normalización coseno: S = D^-1/2 (X^T X) D^-1/2
+        coocurrencias = (matriz.T @ matriz).tocsr()
+        normas = np.sqrt(coocurrencias.diagonal())
+        inversas = sparse.diags(np.divide(1.0, normas, out=np.zeros_like(normas), where=normas > 0))
+        similitud = (inversas @ coocurrencias @ inversas).tolil()
+        similitud.setdiag(0)
+        similitud = similitud.tocsr()
+        similitud.eliminate_zeros()
+
+        isbns = [None] * len(indice_libros)
+        for isbn, columna in indice_libros.items():
+            isbns[columna] = isbn
+        modelo = (indice_usuarios, isbns, matriz, similitud)
+        if generacion == self.generacion:
+            self._modelo = modelo
+        return modelo
+
+    def _asegurar_modelo(self):
+        modelo = self._modelo
+        if modelo is None:
+            with self._lock_entrenamiento:
+                modelo = self._modelo
+                if modelo is None:
+                    modelo = self.entrenar()
+        return modelo
+
+    def historial_usuario(self, dni):
+        """ISBN que el usuario ha prestado alguna vez, según el modelo entrenado."""
+        indice_usuarios, isbns, matriz, _ = self._asegurar_modelo()
+        fila = indice_usuarios.get(dni)
+        if fila is None:
+            return []
+        return [isbns[c] for c in matriz.indices[matriz.indptr[fila]:matriz.indptr[fila + 1]]]
+
+    def recomendar(self, dni, limite=5, solo_disponibles=True):
+        """Lista de (isbn, titulo, puntuación) para un usuario, de mayor a menor puntuación."""
+        np, _ = _numpy_scipy()
+        indice_usuarios, isbns, matriz, similitud = self._asegurar_modelo()
+        fila = indice_usuarios.get(dni)
+        if fila is None:
+            return []
+
+        vector = matriz[fila]
+        puntuaciones = (vector @ similitud).toarray().ravel()
+        puntuaciones[vector.indices] = 0  # Excluir los libros que ya ha leído
+        candidatos = np.flatnonzero(puntuaciones > 0)
+        candidatos = candidatos[np.argsort(-puntuaciones[candidatos], kind='stable')]
+
+        recomendaciones = []
+        # La disponibilidad cambia con cada préstamo, así que se consulta al recomendar y por bloques
+        for inicio in range(0, len(candidatos), self.TAMANO_BLOQUE_DISPONIBILIDAD):
+            bloque = candidatos[inicio:inicio + self.TAMANO_BLOQUE_DISPONIBILIDAD]
+            resumen = self.db_manager.get_libros_resumen(isbns[c] for c in bloque)
+            for columna in bloque:
+                isbn = isbns[columna]
+                if isbn not in resumen:
+                    continue  # Libro borrado después del préstamo
+                titulo, disponible = resumen[isbn]
+                if solo_disponibles and not disponible:
+                    continue
+                recomendaciones.append((isbn, titulo, float(puntuaciones[columna])))
+                if len(recomendaciones) >= limite:
+                    return recomendaciones
+        return recomendaciones
+
+    def recomendar_todos(self, limite=5, solo_disponibles=True):
+        """
+        Recomendaciones para todos los usuarios con historial en una sola pasada: {dni: [(isbn, puntuación), ...]}.
+        La matriz de puntuaciones completa se calcula con un único producto disperso X @ S.
+        """
+        np, _ = _numpy_scipy()
+        indice_usuarios, isbns, matriz, similitud = self._asegurar_modelo()
+
+        validos = np.zeros(len(isbns), dtype=bool)
+        resumen = self.db_manager.get_libros_resumen(isbns)
+        for columna, isbn in enumerate(isbns):
+            if isbn in resumen and (resumen[isbn][1] or not solo_disponibles):
+                validos[columna] = True
+
+        puntuaciones = (matriz @ similitud).tocsr()
+        puntuaciones.sort_indices()  # A igual puntuación, mismo orden que recomendar()
+        resultados = {}
+        for dni, fila in indice_usuarios.items():
+            inicio, fin = puntuaciones.indptr[fila], puntuaciones.indptr[fila + 1]
+            columnas = puntuaciones.indices[inicio:fin]
+            valores = puntuaciones.data[inicio:fin]
+            leidos = matriz.indices[matriz.indptr[fila]:matriz.indptr[fila + 1]]
+            mascara = validos[columnas] & (valores > 0) & ~np.isin(columnas, leidos)
+            columnas, valores = columnas[mascara], valores[mascara]
+            orden = np.argsort(-valores, kind='stable')[:limite]
+            resultados[dni] = [(isbns[c], float(v)) for c, v in zip(columnas[orden], valores[orden])]
+        return resultados
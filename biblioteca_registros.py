@@ -0,0 +1,81 @@
+"""
+Tipos de registro compactos para libros, usuarios, préstamos y cambios del diario.
+
+Son namedtuple: no tienen __dict__ por instancia, así que una fila ocupa bastante menos que un
+dict con las mismas claves, y se construyen directamente desde las filas de sqlite3 con
+fábricas de filas (row_factory, ver DatabaseManager._registros). Son inmutables; para cambiar un
+campo se usa _replace().
+
+Para el código que trataba los libros y usuarios como dicts, admiten también el acceso por nombre
+de campo (libro['titulo'], libro.get('prestado_a')).
+"""
+from collections import namedtuple
+
+
+class _AccesoPorClave:
+    __slots__ = ()
+
+    def __getitem__(self, clave):
+        if isinstance(clave, str):
+            try:
+                return getattr(self, clave)
+            except AttributeError:
+                raise KeyError(clave) from None
+        return tuple.__getitem__(self, clave)
+
+    def get(self, clave, defecto=None):
+        return getattr(self, clave, defecto)
+
+    def como_dict(self):
+        return self._asdict()
+
+
+class Libro(_AccesoPorClave, namedtuple('Libro', ['isbn', 'titulo', 'autor', 'editorial', 'disponible',
+                                                  'dni_prestatario', 'nombre_prestatario', 'prestado_a'],
+                                        defaults=(None, None, None))):
+    # dni_prestatario/nombre_prestatario: préstamo activo (None si está disponible o no se consultó).
+    # prestado_a: historial de DNI, solo cuando se pide (incluir_historial)
+    __slots__ = ()
+
+    @classmethod
+    def desde_dict(cls, datos):
+        # Para los libros que llegan como dict (formularios, importaciones)
+        return cls(datos['isbn'], datos['titulo'], datos['autor'], datos['editorial'],
+                   bool(datos.get('disponible', True)))
+
+
+class Usuario(_AccesoPorClave, namedtuple('Usuario', ['dni', 'nombre'])):
+    __slots__ = ()
+
+
+class Prestamo(_AccesoPorClave, namedtuple('Prestamo', ['isbn', 'dni', 'fecha_prestamo'])):
+    __slots__ = ()
+
+
+class RegistroInvalido(namedtuple('RegistroInvalido', ['motivo'])):
+    # Línea de un archivo de importación que no se pudo leer (JSON o CSV mal formado, no es un objeto...):
+    # las cargas masivas la devuelven como conflicto en vez de abortar
+    __slots__ = ()
+
+
+class Cambio(_AccesoPorClave, namedtuple('Cambio', ['seq', 'tabla', 'operacion', 'isbn', 'dni', 'activo'])):
+    # Una fila del diario de cambios (DatabaseManager.get_cambios)
+    __slots__ = ()
+
+
+# --- Fábricas de filas para sqlite3 (cursor.row_factory) ---
+def fila_libro(cursor, row):
+    # Filas (isbn, titulo, autor, editorial, disponible[, dni_prestatario, nombre_prestatario])
+    return Libro(row[0], row[1], row[2], row[3], bool(row[4]), *row[5:7])
+
+
+def fila_usuario(cursor, row):
+    return Usuario(*row)
+
+
+def fila_prestamo(cursor, row):
+    return Prestamo(*row)
+
+
+def fila_cambio(cursor, row):
+    return Cambio(*row)
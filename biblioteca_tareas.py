@@ -0,0 +1,118 @@
+"""
+Ejecución de tareas en segundo plano para que la interfaz no se bloquee.
+
+Las tareas corren en un ThreadPoolExecutor. Los hilos de trabajo nunca tocan la GUI: dejan sus
+eventos (progreso, resultado, error, cancelación) en una cola, y el hilo de la interfaz los
+procesa llamando a EjecutorTareas.procesar_eventos() (en Tkinter, desde un bucle con after()).
+
+Con DatabaseManager(pool=True) cada hilo de trabajo usa su propia conexión a la base de datos.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TareaCancelada(Exception):
+    pass
+
+
+class Tarea:
+    def __init__(self, descripcion, al_terminar=None, al_fallar=None, al_progresar=None, al_cancelar=None):
+        self.descripcion = descripcion
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.al_progresar = al_progresar
+        self.al_cancelar = al_cancelar
+        self.future = None
+        self._cancelada = threading.Event()
+        self._eventos = None  # Cola del ejecutor, asignada al enviar la tarea
+
+    @property
+    def cancelada(self):
+        return self._cancelada.is_set()
+
+    def cancelar(self):
+        self._cancelada.set()
+        if self.future is not None:
+            self.future.cancel()  # Si aún no empezó, ya no se ejecutará
+
+    def comprobar_cancelacion(self):
+        # La función de la tarea la llama en puntos seguros para poder detenerse a medias
+        if self.cancelada:
+            raise TareaCancelada()
+
+    def informar_progreso(self, actual, total=None, mensaje=None):
+        """Desde el hilo de trabajo: publica el avance (y comprueba si se pidió cancelar)."""
+        self.comprobar_cancelacion()
+        self._eventos.put(('progreso', self, (actual, total, mensaje)))
+
+
+class EjecutorTareas:
+    def __init__(self, max_hilos=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="biblioteca-tarea")
+        self._eventos = queue.SimpleQueue()
+        self._activas = set()  # Solo se modifica desde el hilo de la interfaz
+
+    def enviar(self, descripcion, funcion, *args, al_terminar=None, al_fallar=None, al_progresar=None,
+               al_cancelar=None):
+        """
+        Ejecuta funcion(tarea, *args) en un hilo de trabajo. Los callbacks se llaman desde
+        procesar_eventos(), es decir, en el hilo de la interfaz.
+        """
+        tarea = Tarea(descripcion, al_terminar, al_fallar, al_progresar, al_cancelar)
+        tarea._eventos = self._eventos
+        self._activas.add(tarea)
+        tarea.future = self._pool.submit(self._ejecutar, tarea, funcion, args)
+        return tarea
+
+    def _ejecutar(self, tarea, funcion, args):
+        try:
+            tarea.comprobar_cancelacion()
+            resultado = funcion(tarea, *args)
+            self._eventos.put(('terminada', tarea, resultado))
+        except TareaCancelada:
+            self._eventos.put(('cancelada', tarea, None))
+        except Exception as e:
+            self._eventos.put(('error', tarea, e))
+
+    def procesar_eventos(self):
+        """Despacha los eventos pendientes. Debe llamarse desde el hilo de la interfaz."""
+        procesados = 0
+        while True:
+            try:
+                tipo, tarea, dato = self._eventos.get_nowait()
+            except queue.Empty:
+                break
+            procesados += 1
+            if tipo == 'progreso':
+                if tarea.al_progresar and not tarea.cancelada:
+                    tarea.al_progresar(tarea, *dato)
+                continue
+
+            self._activas.discard(tarea)
+            if tipo == 'terminada' and not tarea.cancelada:
+                if tarea.al_terminar:
+                    tarea.al_terminar(dato)
+            elif tipo == 'error':
+                if tarea.al_fallar:
+                    tarea.al_fallar(dato)
+            elif tarea.al_cancelar:
+                tarea.al_cancelar()
+
+        # Tareas canceladas antes de empezar: su future nunca llega a ejecutar _ejecutar
+        for tarea in [t for t in self._activas if t.future.cancelled()]:
+            self._activas.discard(tarea)
+            if tarea.al_cancelar:
+                tarea.al_cancelar()
+        return procesados
+
+    def tareas_activas(self):
+        return list(self._activas)
+
+    def cancelar_todas(self):
+        for tarea in list(self._activas):
+            tarea.cancelar()
+
+    def cerrar(self, esperar=False):
+        self.cancelar_todas()
+        self._pool.shutdown(wait=esperar, cancel_futures=True)
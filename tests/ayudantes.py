@@ -0,0 +1,12 @@
+# Datos de prueba compartidos por los módulos de pruebas
+
+
+def libro(isbn, titulo="Título", autor="Autor", editorial="Editorial"):
+    return {'isbn': isbn, 'titulo': titulo, 'autor': autor, 'editorial': editorial, 'disponible': True}
+
+
+def contar_consultas(db):
+    """Activa el registro de sentencias de la conexión y devuelve la lista donde se acumulan los SELECT."""
+    consultas = []
+    db.conn.set_trace_callback(lambda sql: consultas.append(sql) if sql.lstrip().upper().startswith("SELECT") else None)
+    return consultas
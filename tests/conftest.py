@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos biblioteca_* están en la raíz del repositorio (sin paquete instalable)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from biblioteca_db import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def ruta_db(tmp_path):
+    return str(tmp_path / "biblioteca.db")
+
+
+@pytest.fixture
+def db(ruta_db):
+    manager = DatabaseManager(ruta_db)
+    yield manager
+    manager.close()
@@ -0,0 +1,64 @@
+import pytest
+
+from ayudantes import libro
+from biblioteca_analitica import analizar_usuario, ejecutar_analitica
+
+
+@pytest.fixture
+def db_con_historial(db):
+    historial = {"10": ["1", "2"], "11": ["1", "3"], "12": ["2", "3", "4"]}
+    for isbn in ("1", "2", "3", "4", "5"):
+        db.add_libro(libro(isbn, titulo=f"Libro {isbn}"))
+    for dni, isbns in historial.items():
+        db.add_usuario(dni, f"Usuario {dni}")
+        for isbn in isbns:
+            db.prestar_libro(isbn, dni)
+            db.devolver_libro(isbn)
+    return db
+
+
+def test_analizar_usuario():
+    libros_de = {"10": {"1", "2"}, "11": {"1", "3"}, "12": {"2", "3", "4"}}
+    lectores_de = {"1": {"10", "11"}, "2": {"10", "12"}, "3": {"11", "12"}, "4": {"12"}}
+
+    similares, recomendaciones = analizar_usuario("10", libros_de, lectores_de, {"3", "4"})
+
+    assert similares == [("11", 1), ("12", 1)]
+    assert recomendaciones == [("3", 2), ("4", 1)]
+    assert analizar_usuario("10", libros_de, lectores_de, {"4"})[1] == [("4", 1)]
+
+
+def test_ejecutar_analitica_guarda_resultados(db_con_historial, tmp_path):
+    avances = []
+
+    ejecucion = ejecutar_analitica(db_con_historial, procesos=2, tamano_bloque=1,
+                                   instantanea=str(tmp_path / "instantanea.db"),
+                                   al_avanzar=lambda procesados, total: avances.append((procesados, total)))
+
+    assert ejecucion is not None
+    assert avances == [(1, 3), (2, 3), (3, 3)]
+    assert db_con_historial.get_ultima_analitica()[0] == ejecucion
+    assert db_con_historial.get_resultados_analitica("10") == [("3", 2.0), ("4", 1.0)]
+    assert db_con_historial.get_resultados_analitica("10", db_con_historial.ANALITICA_SIMILAR) == [
+        ("11", 1.0), ("12", 1.0)]
+
+
+def test_ejecucion_completada_sustituye_a_la_anterior(db_con_historial):
+    primera = ejecutar_analitica(db_con_historial, procesos=1)
+    db_con_historial.prestar_libro("3", "12")  # El libro 3 deja de estar disponible
+
+    segunda = ejecutar_analitica(db_con_historial, procesos=1)
+
+    assert segunda != primera
+    assert db_con_historial.get_resultados_analitica("10") == [("4", 1.0)]
+    db_con_historial.cursor.execute("SELECT DISTINCT ejecucion FROM analitica_resultados")
+    assert db_con_historial.cursor.fetchall() == [(segunda,)]
+
+
+def test_ejecucion_fallida_conserva_los_resultados_anteriores(db_con_historial, monkeypatch):
+    anterior = ejecutar_analitica(db_con_historial, procesos=1)
+    monkeypatch.setattr(db_con_historial, "guardar_resultados_analitica", lambda ejecucion, filas: False)
+
+    assert ejecutar_analitica(db_con_historial, procesos=1) is None
+    assert db_con_historial.get_ultima_analitica()[0] == anterior
+    assert db_con_historial.get_resultados_analitica("10") == [("3", 2.0), ("4", 1.0)]
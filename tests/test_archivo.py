@@ -0,0 +1,51 @@
+from ayudantes import libro
+
+
+def _prestamos_devueltos(db, isbns, dni="10"):
+    db.add_usuario(dni, "Ana")
+    for isbn in isbns:
+        db.add_libro(libro(isbn))
+        db.prestar_libro(isbn, dni)
+        db.devolver_libro(isbn)
+    # Devueltos hace mucho: entran en el archivo
+    db.cursor.execute("UPDATE prestamos SET fecha_devolucion = '2000-01-01 00:00:00'")
+    db.conn.commit()
+
+
+def test_archivar_conserva_el_historial(db):
+    _prestamos_devueltos(db, ["1", "2", "3"])
+    db.add_libro(libro("4"))
+    db.prestar_libro("4", "10")  # Activo: no se archiva
+
+    assert db.archivar_prestamos() == 3
+
+    assert db.contar_prestamos() == (1, 3)
+    assert db.get_historial_prestamos_libro("1") == ["10"]
+    assert len(list(db.iterar_historial_prestamos())) == 4
+    assert db.get_current_borrower("4") == "10"
+
+
+def test_archivar_respeta_la_antiguedad(db):
+    _prestamos_devueltos(db, ["1", "2"])
+    db.prestar_libro("1", "10")
+    db.devolver_libro("1")  # Devuelto hoy: se queda en la tabla caliente
+
+    assert db.archivar_prestamos() == 2
+    assert db.contar_prestamos() == (1, 2)
+    assert db.get_historial_prestamos_libro("1") == ["10", "10"]
+
+
+def test_archivar_informa_de_todos_los_lotes(db):
+    _prestamos_devueltos(db, [str(i) for i in range(1, 6)])
+    avances = []
+
+    assert db.archivar_prestamos(tamano_lote=2, al_avanzar=avances.append) == 5
+    assert avances == [2, 4, 5]
+
+
+def test_archivar_en_un_solo_lote_informa_del_total(db):
+    _prestamos_devueltos(db, ["1", "2"])
+    avances = []
+
+    db.archivar_prestamos(al_avanzar=avances.append)
+    assert avances == [2]
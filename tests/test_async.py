@@ -0,0 +1,77 @@
+import asyncio
+from contextlib import aclosing
+
+import pytest
+
+from ayudantes import libro
+from biblioteca_async import DatabaseManagerAsync
+from biblioteca_db import DatabaseManager
+
+
+def _preparar(ruta_db, libros=1, usuarios=("10",)):
+    db = DatabaseManager(ruta_db)
+    for i in range(1, libros + 1):
+        db.add_libro(libro(str(i)))
+    for dni in usuarios:
+        db.add_usuario(dni, f"Usuario {dni}")
+    db.close()
+
+
+def test_expone_los_metodos_publicos():
+    publicos = {nombre for nombre, valor in vars(DatabaseManager).items()
+                if callable(valor) and not nombre.startswith('_')}
+    assert publicos - set(vars(DatabaseManagerAsync)) == {"close", "cerrar_conexion_hilo", "nueva_conexion_lectura",
+                                                          "cerrar_conexion"}
+
+
+def test_consultas_y_prestamos_concurrentes(ruta_db):
+    usuarios = [str(100 + i) for i in range(8)]
+    _preparar(ruta_db, usuarios=usuarios)
+
+    async def principal():
+        async with DatabaseManagerAsync(ruta_db, max_hilos=4) as db:
+            encontrado, usuario = await asyncio.gather(db.get_libro("1"), db.get_usuario("100"))
+            resultados = await asyncio.gather(*(db.prestar_libro("1", dni) for dni in usuarios))
+            return encontrado, usuario, [r['resultado'] for r in resultados], await db.get_current_borrower("1")
+
+    encontrado, usuario, resultados, prestatario = asyncio.run(principal())
+
+    assert (encontrado.isbn, usuario.nombre) == ("1", "Usuario 100")
+    assert resultados.count(DatabaseManagerAsync.PRESTAMO_OK) == 1
+    assert resultados.count(DatabaseManagerAsync.LIBRO_NO_DISPONIBLE) == len(usuarios) - 1
+    assert prestatario == usuarios[resultados.index(DatabaseManagerAsync.PRESTAMO_OK)]
+
+
+def test_iterar_por_bloques_y_salir_antes_de_tiempo(ruta_db):
+    _preparar(ruta_db, libros=25)
+
+    async def principal():
+        async with DatabaseManagerAsync(ruta_db, max_hilos=1) as db:
+            await db.get_libro("1")
+            conexiones_antes = len(db.db._conexiones)
+            todos = [registro.isbn async for registro in db.iterar_libros(tamano_lote=4)]
+            primeros = []
+            async with aclosing(db.iterar_libros(tamano_lote=4)) as registros:
+                async for registro in registros:
+                    primeros.append(registro.isbn)
+                    if len(primeros) == 5:
+                        break
+            return todos, primeros, len(db.db._conexiones) - conexiones_antes
+
+    todos, primeros, conexiones_abiertas = asyncio.run(principal())
+
+    assert sorted(todos) == sorted(str(i) for i in range(1, 26))
+    assert primeros == todos[:5]
+    assert conexiones_abiertas == 0  # Cada recorrido cerró su conexión de lectura, también el interrumpido
+
+
+def test_no_se_usa_despues_de_cerrar(ruta_db):
+    _preparar(ruta_db)
+
+    async def principal():
+        db = DatabaseManagerAsync(ruta_db)
+        await db.cerrar()
+        await db.get_libro("1")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(principal())
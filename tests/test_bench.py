@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from biblioteca_bench import _parametros_guardados, casos, comparar, copiar_base, generar_datos, main, medir
+from biblioteca_db import DatabaseManager
+
+LIBROS, USUARIOS, PRESTAMOS = 300, 40, 2000
+
+
+@pytest.fixture(scope="module")
+def ruta_bench(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp("bench") / "bench.db")
+    generar_datos(ruta, LIBROS, USUARIOS, PRESTAMOS, semilla=7, al_avanzar=lambda mensaje: None)
+    return ruta
+
+
+def _contenido(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        return [conn.execute(f"SELECT * FROM {tabla} ORDER BY 1, 2").fetchall()
+                for tabla in ("libros", "usuarios", "prestamos")]
+    finally:
+        conn.close()
+
+
+def test_generacion_reproducible(ruta_bench, tmp_path):
+    otra = str(tmp_path / "otra.db")
+    generar_datos(otra, LIBROS, USUARIOS, PRESTAMOS, semilla=7, al_avanzar=lambda mensaje: None)
+
+    assert _contenido(otra) == _contenido(ruta_bench)
+    assert _parametros_guardados(ruta_bench) == {'libros': LIBROS, 'usuarios': USUARIOS, 'prestamos': PRESTAMOS,
+                                                 'semilla': 7}
+    libros, usuarios, prestamos = _contenido(ruta_bench)
+    assert (len(libros), len(usuarios), len(prestamos)) == (LIBROS, USUARIOS, PRESTAMOS)
+
+
+def test_generacion_deja_los_contadores_y_sus_triggers(ruta_bench):
+    db = DatabaseManager(ruta_bench)
+    try:
+        assert sorted(nombre for nombre, _ in db._triggers_contadores()) == ["contadores_devolucion",
+                                                                            "contadores_prestamo"]
+        db.cursor.execute("SELECT sum(prestamos) FROM contador_libros")
+        assert db.cursor.fetchone()[0] == PRESTAMOS
+    finally:
+        db.close()
+
+
+def test_todos_los_casos_se_ejecutan(ruta_bench, tmp_path):
+    pytest.importorskip("scipy")
+    copia = str(tmp_path / "copia.db")
+    copiar_base(ruta_bench, copia)
+    db = DatabaseManager(copia)
+    try:
+        lista = casos(db, LIBROS, USUARIOS, semilla=7, repeticiones=1)
+        resultados = medir(lista, al_avanzar=lambda mensaje: None)
+        assert db.contar_prestamos()[1] > 0  # archivar_prestamos movió los préstamos antiguos
+    finally:
+        db.close()
+
+    assert set(resultados) == {caso.nombre for caso in lista}
+    assert {"archivar_prestamos", "podar_cambios", "guardar_marca_cambios", "guardar_resultados_analitica",
+            "get_resultados_analitica"} <= set(resultados)
+    assert all(r['mediana'] >= 0 for r in resultados.values())
+
+
+def test_main_mide_sobre_una_copia(tmp_path):
+    ruta = str(tmp_path / "bench.db")
+    argumentos = ["--db", ruta, "--escala", "0.0002", "--repeticiones", "1", "--salida", str(tmp_path / "r.json")]
+    assert main(argumentos + ["--filtro", "contar_libros"]) == 0  # Genera la base
+    antes = _contenido(ruta)
+
+    assert main(argumentos + ["--filtro", "archivar_prestamos"]) == 0
+
+    assert _contenido(ruta) == antes
+
+
+def test_comparar_marca_las_regresiones():
+    base = {'rapido': {'mediana': 1.0}, 'lento': {'mediana': 1.0}, 'nuevo_en_base': {'mediana': 0}}
+    actual = {'rapido': {'mediana': 1.1}, 'lento': {'mediana': 1.5}, 'sin_base': {'mediana': 9.0}}
+
+    assert comparar(actual, base, tolerancia=0.2) == [('lento', 1.0, 1.5, 1.5)]
@@ -0,0 +1,64 @@
+import pytest
+
+from ayudantes import libro
+
+
+@pytest.fixture
+def db_con_catalogo(db):
+    if not db.tiene_busqueda_fts():
+        pytest.skip("SQLite sin FTS5")
+    db.add_libro(libro("1", "Don Quijote", "Miguel de Cervantes", "Cátedra"))
+    db.add_libro(libro("2", "Vida de Cervantes", "Jean Canavaggio", "Espasa"))
+    db.add_libro(libro("3", "Cien años de soledad", "Gabriel García Márquez", "Cervantina"))
+    return db
+
+
+def _isbns(libros):
+    return [encontrado['isbn'] for encontrado in libros]
+
+
+def test_buscar_por_prefijo_sin_tildes(db_con_catalogo):
+    assert _isbns(db_con_catalogo.buscar_libros("garcia marq")) == ["3"]
+    assert _isbns(db_con_catalogo.buscar_libros("CATEDRA")) == ["1"]
+    assert db_con_catalogo.buscar_libros("quijote cien") == []
+
+
+def test_el_titulo_pesa_mas_que_el_autor_y_la_editorial(db_con_catalogo):
+    assert _isbns(db_con_catalogo.buscar_libros("cervant")) == ["2", "1", "3"]
+
+
+def test_el_indice_sigue_las_modificaciones(db_con_catalogo):
+    db_con_catalogo.cursor.execute("UPDATE libros SET titulo = 'El ingenioso hidalgo' WHERE isbn = '1'")
+    db_con_catalogo.conn.commit()
+    db_con_catalogo.delete_libro("2")
+
+    assert _isbns(db_con_catalogo.buscar_libros("hidalgo")) == ["1"]
+    assert _isbns(db_con_catalogo.buscar_libros("quijote")) == []
+    assert _isbns(db_con_catalogo.buscar_libros("canavaggio")) == []
+
+
+def test_compactar_reconstruye_el_indice(db_con_catalogo):
+    db = db_con_catalogo
+    # Lo que puede hacer VACUUM con una tabla sin INTEGER PRIMARY KEY: otros rowid para las mismas filas
+    db.cursor.execute("UPDATE libros SET rowid = rowid + 100")
+    db.conn.commit()
+    assert _isbns(db.buscar_libros("quijote")) == []
+
+    assert db.compactar()
+
+    assert _isbns(db.buscar_libros("quijote")) == ["1"]
+    assert _isbns(db.buscar_libros("cervant")) == ["2", "1", "3"]
+
+
+def test_el_texto_no_se_interpreta_como_sintaxis_fts(db_con_catalogo):
+    assert _isbns(db_con_catalogo.buscar_libros('"quijote" OR')) == []
+    assert _isbns(db_con_catalogo.buscar_libros('quij"ote')) == ["1"]
+    assert db_con_catalogo.buscar_libros("   ") == []
+
+
+def test_sin_fts_se_busca_con_like(db_con_catalogo, monkeypatch):
+    monkeypatch.setattr(db_con_catalogo, "tiene_busqueda_fts", lambda: False)
+
+    assert _isbns(db_con_catalogo.buscar_libros("cervantes")) == ["1", "2"]  # Ordenado por título
+    assert _isbns(db_con_catalogo.buscar_libros("García")) == ["3"]
+    assert db_con_catalogo.buscar_libros("garcia") == []  # LIKE sí distingue tildes
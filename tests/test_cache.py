@@ -0,0 +1,100 @@
+import pytest
+
+from ayudantes import contar_consultas, libro
+from biblioteca_cache import CacheLRU, CacheResultados
+from biblioteca_db import DatabaseManager
+
+
+def test_lru_expulsa_la_entrada_menos_usada():
+    cache = CacheLRU(capacidad=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" pasa a ser la menos usada
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert (cache.get("a"), cache.get("c"), cache.get("b", "no")) == (1, 3, "no")
+    estadisticas = cache.estadisticas()
+    assert (estadisticas['aciertos'], estadisticas['fallos'], estadisticas['expulsiones']) == (3, 1, 1)
+
+
+def test_capacidad_no_valida():
+    with pytest.raises(ValueError):
+        CacheLRU(capacidad=0)
+
+
+def test_invalidar_solo_las_entradas_afectadas():
+    cache = CacheResultados()
+    cache.put(("recomendaciones", "10"), ["1"], usuarios=["10"], libros=["1", "2"])
+    cache.put(("similares", "10"), ["11"], usuarios=["10", "11"], libros=["3"])
+    cache.put(("similares", "12"), [], usuarios=["12"])
+
+    cache.invalidar_libro("2")
+    assert ("recomendaciones", "10") not in cache
+    assert ("similares", "10") in cache
+
+    cache.invalidar_usuario("11")
+    assert ("similares", "10") not in cache
+    assert ("similares", "12") in cache
+    assert cache.estadisticas()['invalidaciones'] == 2
+
+
+def test_expulsar_quita_las_dependencias():
+    cache = CacheResultados(capacidad=1)
+    cache.put("a", 1, usuarios=["10"])
+    cache.put("b", 2, usuarios=["11"])
+
+    assert cache._por_usuario == {"11": {"b"}}
+    cache.invalidar_usuario("10")  # Ya expulsada: no cuenta como invalidación
+    assert cache.estadisticas()['invalidaciones'] == 0
+
+
+def test_get_libro_lee_de_la_cache_y_se_invalida_al_prestar(db):
+    db.add_libro(libro("1"))
+    db.add_usuario("10", "Ana")
+    consultas = contar_consultas(db)
+
+    assert db.get_libro("1", incluir_historial=False)['disponible']
+    assert db.get_libro("1", incluir_historial=False)['disponible']
+    assert len(consultas) == 1
+    assert db.estadisticas_cache()['libros']['aciertos'] == 1
+
+    db.prestar_libro("1", "10")
+    del consultas[:]
+    assert not db.get_libro("1", incluir_historial=False)['disponible']
+    assert len(consultas) == 1
+
+
+def test_los_registros_de_la_cache_no_se_pueden_modificar(db):
+    db.add_usuario("10", "Ana")
+
+    with pytest.raises(TypeError):
+        db.get_usuario("10")['nombre'] = "Modificado"
+    assert db.get_usuario("10") is db.get_usuario("10")  # Sin copias: el registro es inmutable
+
+
+def test_lectura_concurrente_con_una_escritura_no_se_cachea(db, monkeypatch):
+    db.add_libro(libro("1"))
+    db.add_usuario("10", "Ana")
+    leer_libro = db._leer_libro
+
+    def leer_y_prestar_a_la_vez(isbn):
+        registro = leer_libro(isbn)  # Lectura anterior al préstamo...
+        db.prestar_libro(isbn, "10")  # ...y escritura que termina antes de guardar en la caché
+        return registro
+
+    monkeypatch.setattr(db, "_leer_libro", leer_y_prestar_a_la_vez)
+    assert db.get_libro("1", incluir_historial=False)['disponible']
+    monkeypatch.undo()
+
+    assert not db.get_libro("1", incluir_historial=False)['disponible']
+
+
+def test_cache_desactivada(ruta_db):
+    db = DatabaseManager(ruta_db, tamano_cache=0)
+    try:
+        db.add_usuario("10", "Ana")
+        assert db.get_usuario("10")['nombre'] == "Ana"
+        assert db.estadisticas_cache() == {}
+    finally:
+        db.close()
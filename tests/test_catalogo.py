@@ -0,0 +1,73 @@
+from ayudantes import contar_consultas, libro
+
+
+def _catalogo_con_prestamo(db):
+    for isbn in ("1", "2", "3"):
+        db.add_libro(libro(isbn))
+    db.add_usuario("10", "Ana")
+    db.add_usuario("11", "Luis")
+    db.prestar_libro("1", "11")
+    db.devolver_libro("1")
+    # El préstamo anterior, con fecha antigua (el historial se ordena por fecha)
+    db.cursor.execute("UPDATE prestamos SET fecha_prestamo = '2000-01-01 00:00:00'")
+    db.conn.commit()
+    db.prestar_libro("1", "10")
+
+
+def test_catalogo_trae_el_prestatario_actual(db):
+    _catalogo_con_prestamo(db)
+
+    libros = {l['isbn']: l for l in db.get_all_libros()}
+
+    assert (libros["1"]['dni_prestatario'], libros["1"]['nombre_prestatario']) == ("10", "Ana")
+    assert (libros["2"]['dni_prestatario'], libros["2"]['nombre_prestatario']) == (None, None)
+    assert 'prestado_a' not in libros["1"]
+
+
+def test_catalogo_en_una_sola_consulta(db):
+    _catalogo_con_prestamo(db)
+    consultas = contar_consultas(db)
+
+    db.get_all_libros()
+    assert len(consultas) == 1
+
+    del consultas[:]
+    libros = {l['isbn']: l for l in db.get_all_libros(incluir_historial=True)}
+    assert len(consultas) == 2
+    assert libros["1"]['prestado_a'] == ["11", "10"]
+    assert libros["3"]['prestado_a'] == []
+
+
+def test_paginas_por_clave_hacia_delante_y_hacia_atras(db):
+    isbns = [str(1000 + i) for i in range(25)]
+    for isbn in isbns:
+        db.add_libro(libro(isbn))
+
+    vistos = []
+    pagina = db.get_pagina_libros(limite=10)
+    while pagina:
+        vistos.extend(l['isbn'] for l in pagina)
+        pagina = db.get_pagina_libros(despues_de=pagina[-1]['isbn'], limite=10)
+    assert vistos == isbns
+
+    anterior = db.get_pagina_libros(antes_de="1015", limite=10)
+    assert [l['isbn'] for l in anterior] == isbns[5:15]
+    assert db.get_pagina_libros(antes_de="1000") == []
+    assert db.contar_libros() == 25
+
+
+def test_pagina_con_el_prestatario_actual(db):
+    _catalogo_con_prestamo(db)
+
+    pagina = db.get_pagina_libros(despues_de="0", limite=1)
+
+    assert (pagina[0]['isbn'], pagina[0]['dni_prestatario'], pagina[0]['nombre_prestatario']) == ("1", "10", "Ana")
+
+
+def test_pagina_usa_el_indice_de_la_clave(db):
+    db.cursor.execute("EXPLAIN QUERY PLAN " + db.SQL_CATALOGO_BASE + " WHERE l.isbn > ? ORDER BY l.isbn LIMIT ?",
+                      ("1", 10))
+    plan = " ".join(fila[-1] for fila in db.cursor.fetchall())
+
+    assert "SEARCH l USING INDEX" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,37 @@
+import threading
+
+import pytest
+
+from biblioteca_db import DatabaseManager
+
+
+def test_pragmas_de_la_conexion(db):
+    assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert db.conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert db.conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+
+def test_synchronous_no_valido(ruta_db):
+    with pytest.raises(ValueError):
+        DatabaseManager(ruta_db, synchronous="RAPIDO")
+
+
+def test_pool_da_una_conexion_por_hilo(ruta_db):
+    db = DatabaseManager(ruta_db, pool=True)
+    conexiones = {}
+
+    def trabajo():
+        db.add_usuario("10", "Ana")
+        conexiones['hilo'] = db.conn
+        db.cerrar_conexion_hilo()
+
+    hilo = threading.Thread(target=trabajo)
+    hilo.start()
+    hilo.join()
+    try:
+        assert conexiones['hilo'] is not db.conn
+        assert db.get_usuario("10") is not None  # Lo escrito por el hilo es visible desde la conexión principal
+        assert len(db._conexiones) == 1
+    finally:
+        db.close()
+    assert db._conexiones == []
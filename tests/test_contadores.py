@@ -0,0 +1,73 @@
+import pytest
+
+from ayudantes import libro
+
+
+@pytest.fixture
+def db_con_circulacion(db):
+    for isbn, autor in (("1", "Cervantes"), ("2", "Cervantes"), ("3", "Galdós")):
+        db.add_libro(libro(isbn, autor=autor))
+    for dni in ("10", "11", "12"):
+        db.add_usuario(dni, f"Usuario {dni}")
+    for dni in ("10", "11", "12"):
+        db.prestar_libro("1", dni)
+        db.devolver_libro("1")
+    db.prestar_lote("10", ["2", "3"])
+    db.devolver_lote(["2"])
+    return db
+
+
+def _contadores(db):
+    return (db.get_libros_mas_prestados(), db.get_usuarios_mas_activos(), db.get_autores_mas_prestados(),
+            db.get_circulacion_por_dia())
+
+
+def test_los_triggers_mantienen_los_contadores(db_con_circulacion):
+    db = db_con_circulacion
+
+    assert db.get_libros_mas_prestados(limite=1) == [("1", "Título", 3)]
+    assert sorted(db.get_libros_mas_prestados())[1:] == [("2", "Título", 1), ("3", "Título", 1)]
+    assert db.get_usuarios_mas_activos(limite=1) == [("10", "Usuario 10", 3)]
+    assert db.get_autores_mas_prestados() == [("Cervantes", 4), ("Galdós", 1)]
+    [(dia, prestamos, devoluciones)] = db.get_circulacion_por_dia()
+    assert (prestamos, devoluciones) == (5, 4)
+    assert db.get_circulacion_por_dia(desde="9999-01-01") == []
+
+
+def test_reconstruir_coincide_con_los_triggers(db_con_circulacion):
+    antes = _contadores(db_con_circulacion)
+
+    assert db_con_circulacion.reconstruir_contadores()
+    assert _contadores(db_con_circulacion) == antes
+
+
+def test_archivar_no_reduce_los_contadores(db_con_circulacion):
+    antes = _contadores(db_con_circulacion)
+    db_con_circulacion.cursor.execute("UPDATE prestamos SET fecha_devolucion = '2000-01-01 00:00:00' WHERE activo = 0")
+    db_con_circulacion.conn.commit()
+
+    assert db_con_circulacion.archivar_prestamos() == 4
+    assert _contadores(db_con_circulacion)[:3] == antes[:3]
+    db_con_circulacion.reconstruir_contadores()
+    assert _contadores(db_con_circulacion)[:3] == antes[:3]
+
+
+def test_top_n_recorre_el_indice_del_contador(db):
+    db.cursor.execute("EXPLAIN QUERY PLAN SELECT isbn, prestamos FROM contador_libros ORDER BY prestamos DESC LIMIT 10")
+    plan = " ".join(fila[-1] for fila in db.cursor.fetchall())
+
+    assert "idx_contador_libros_prestamos" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_circulacion_de_los_ultimos_dias(db):
+    db.cursor.executemany("INSERT INTO contador_dias (dia, prestamos, devoluciones) VALUES (?, ?, 0)",
+                          [(f"2024-01-{dia:02d}", dia) for dia in range(1, 11)])
+    db.conn.commit()
+
+    assert db.get_circulacion_por_dia(limite=3) == [("2024-01-08", 8, 0), ("2024-01-09", 9, 0),
+                                                    ("2024-01-10", 10, 0)]
+    assert [fila[0] for fila in db.get_circulacion_por_dia(hasta="2024-01-05", limite=2)] == [
+        "2024-01-04", "2024-01-05"]
+    db.cursor.execute("EXPLAIN QUERY PLAN SELECT dia FROM contador_dias ORDER BY dia DESC LIMIT 7")
+    assert "TEMP B-TREE" not in " ".join(fila[3] for fila in db.cursor.fetchall())
@@ -0,0 +1,139 @@
+import os
+
+from ayudantes import libro
+from biblioteca_bench import generar_datos
+from biblioteca_db import DatabaseManager
+from biblioteca_grafo import GrafoBiblioteca, ruta_instantanea
+
+
+def _datos(db):
+    for isbn in ("1", "2", "3"):
+        db.add_libro(libro(isbn))
+    for dni in ("10", "11"):
+        db.add_usuario(dni, f"Usuario {dni}")
+    db.prestar_libro("1", "10")
+
+
+def _estado(grafo):
+    return sorted(grafo.grafo.nodes()), sorted(grafo.grafo.edges())
+
+
+def test_diario_con_secuencia_creciente(db):
+    _datos(db)
+    cambios = db.get_cambios(0)
+
+    assert [c.seq for c in cambios] == sorted(c.seq for c in cambios)
+    assert cambios[-1].seq == db.get_ultimo_cambio()
+    assert (cambios[-1].tabla, cambios[-1].operacion, cambios[-1].isbn, cambios[-1].dni, cambios[-1].activo) == (
+        "prestamos", db.CAMBIO_ALTA, "1", "10", 1)
+    assert list(db.iterar_cambios(cambios[0].seq, tamano_lote=2)) == cambios[1:]
+
+
+def test_sincronizar_aplica_cambios_de_otro_proceso(db, ruta_db):
+    _datos(db)
+    grafo = GrafoBiblioteca(db)
+    grafo.reconstruir()
+
+    otro = DatabaseManager(ruta_db)
+    otro.prestar_libro("2", "11")
+    otro.devolver_libro("1")
+    otro.add_usuario("12", "Nuevo")
+    otro.close()
+
+    assert len(grafo.sincronizar()) == 3
+    referencia = GrafoBiblioteca(db)
+    referencia.reconstruir()
+    assert _estado(grafo) == _estado(referencia)
+    assert grafo.sincronizar() == []
+
+
+def test_sincronizar_pide_reconstruir_si_se_podaron_cambios(db):
+    _datos(db)
+    grafo = GrafoBiblioteca(db)
+    grafo.reconstruir()
+    db.add_usuario("12", "Nuevo")
+
+    db.podar_cambios(db.get_ultimo_cambio())
+
+    assert grafo.hay_cambios_perdidos()
+    assert grafo.sincronizar() is None
+
+
+def test_podar_respeta_la_marca_mas_baja(db):
+    _datos(db)
+    ultimo = db.get_ultimo_cambio()
+    db.guardar_marca_cambios("a", ultimo)
+    db.guardar_marca_cambios("b", ultimo - 2)
+
+    assert db.podar_cambios() == ultimo - 2
+    assert db.get_primer_cambio() == ultimo - 1
+    assert db.get_ultimo_cambio() == ultimo
+    assert db.get_marca_cambios("b") == ultimo - 2
+
+
+def test_podar_sin_consumidores_no_borra(db):
+    _datos(db)
+
+    assert db.podar_cambios() == 0
+    assert db.get_primer_cambio() == 1
+
+
+def test_instantanea_se_pone_al_dia_con_el_diario(db, ruta_db):
+    _datos(db)
+    ruta = ruta_instantanea(ruta_db)
+    grafo = GrafoBiblioteca(db)
+    grafo.reconstruir()
+    assert grafo.guardar_instantanea(ruta)
+
+    db.devolver_libro("1")
+    db.prestar_libro("3", "11")
+    db.delete_libro("2")
+
+    cargado = GrafoBiblioteca(db)
+    assert cargado.cargar_instantanea(ruta)
+    assert cargado.marca == grafo.marca
+    assert len(cargado.sincronizar()) == 3
+    referencia = GrafoBiblioteca(db)
+    referencia.reconstruir()
+    assert _estado(cargado) == _estado(referencia)
+
+
+def test_instantanea_descartada_si_se_podaron_cambios(db, ruta_db):
+    _datos(db)
+    ruta = ruta_instantanea(ruta_db)
+    grafo = GrafoBiblioteca(db)
+    grafo.reconstruir()
+    grafo.guardar_instantanea(ruta)
+    db.add_usuario("12", "Nuevo")
+
+    assert db.podar_cambios(db.get_ultimo_cambio()) > 0
+
+    assert not GrafoBiblioteca(db).cargar_instantanea(ruta)
+
+
+def test_instantanea_de_otra_base_de_datos(db, ruta_db, tmp_path):
+    _datos(db)
+    ruta = ruta_instantanea(ruta_db)
+    grafo = GrafoBiblioteca(db)
+    grafo.reconstruir()
+    grafo.guardar_instantanea(ruta)
+
+    otra = DatabaseManager(str(tmp_path / "otra.db"))
+    try:
+        assert not GrafoBiblioteca(otra).cargar_instantanea(ruta)
+    finally:
+        otra.close()
+    assert os.path.exists(ruta)
+
+
+def test_datos_sinteticos_sin_diario(tmp_path):
+    ruta = str(tmp_path / "bench.db")
+    generar_datos(ruta, 20, 5, 50, semilla=1, al_avanzar=lambda mensaje: None)
+    db = DatabaseManager(ruta)
+    try:
+        assert db.get_cambios(0) == []
+        assert len(db._triggers_diario()) > 0
+        db.add_usuario("99", "Nuevo")
+        assert [c.dni for c in db.get_cambios(0)] == ["99"]
+    finally:
+        db.close()
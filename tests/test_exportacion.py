@@ -0,0 +1,58 @@
+import csv
+import json
+
+import pytest
+
+from ayudantes import libro
+from biblioteca_modelo import exportar_informacion
+
+
+@pytest.fixture
+def db_con_datos(db):
+    for isbn in ("1", "2"):
+        db.add_libro(libro(isbn, titulo=f"Libro {isbn}"))
+    db.add_usuario("10", "Ana")
+    db.registrar_prestamo("1", "10")
+    return db
+
+
+def test_exportar_jsonl(db_con_datos, tmp_path):
+    ruta = str(tmp_path / "export.jsonl")
+
+    exportar_informacion(db_con_datos, ruta)
+
+    with open(ruta, encoding="utf-8") as archivo:
+        registros = [json.loads(linea) for linea in archivo]
+    assert [r['tipo'] for r in registros] == ['libro', 'libro', 'usuario', 'prestamo']
+    assert (registros[0]['estado'], registros[0]['dni'], registros[0]['nombre']) == ("No disponible", "10", "Ana")
+    assert registros[1]['dni'] is None
+    assert (registros[3]['titulo'], registros[3]['estado']) == ("Libro 1", "ACTIVO")
+
+
+def test_exportar_csv_y_texto(db_con_datos, tmp_path):
+    ruta_csv = str(tmp_path / "export.csv")
+    ruta_txt = str(tmp_path / "export.txt")
+
+    exportar_informacion(db_con_datos, ruta_csv)
+    exportar_informacion(db_con_datos, ruta_txt)
+
+    with open(ruta_csv, encoding="utf-8", newline="") as archivo:
+        filas = list(csv.DictReader(archivo))
+    assert [f['tipo'] for f in filas] == ['libro', 'libro', 'usuario', 'prestamo']
+    with open(ruta_txt, encoding="utf-8") as archivo:
+        texto = archivo.read()
+    assert "Prestado a: Ana (DNI: 10)" in texto
+    assert "Estado: ACTIVO" in texto
+
+
+def test_formato_no_soportado(db, tmp_path):
+    with pytest.raises(ValueError):
+        exportar_informacion(db, str(tmp_path / "export.xml"), formato="xml")
+
+
+def test_exportar_informa_del_avance(db_con_datos, tmp_path):
+    avances = []
+
+    exportar_informacion(db_con_datos, str(tmp_path / "export.jsonl"), al_avanzar=avances.append)
+
+    assert avances == [4]
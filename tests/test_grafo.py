@@ -0,0 +1,47 @@
+from ayudantes import libro
+from biblioteca_grafo import GrafoBiblioteca, id_libro, id_usuario
+
+
+def test_reconstruir_desde_la_base_de_datos(db):
+    for isbn in ("1", "2"):
+        db.add_libro(libro(isbn))
+    db.add_usuario("10", "Ana")
+    db.registrar_prestamo("1", "10")
+    db.registrar_prestamo("2", "10")
+    db.registrar_devolucion("2", "10")
+
+    grafo = GrafoBiblioteca(db)
+    grafo.reconstruir()
+
+    assert (grafo.numero_nodos(), grafo.numero_aristas()) == (3, 1)
+    assert grafo.grafo.has_edge(id_usuario("10"), id_libro("1"))
+    assert grafo.grafo.nodes[id_usuario("10")]['registro'] == ("10", "Ana")
+
+
+def _grafo_con_prestamos(db, prestamos):
+    grafo = GrafoBiblioteca(db)
+    for dni, isbns in prestamos.items():
+        grafo.agregar_usuario(dni, f"Usuario {dni}")
+        for isbn in isbns:
+            if grafo.agregar_libro(libro(isbn)):
+                db.add_libro(libro(isbn))
+            grafo.agregar_prestamo(dni, isbn)
+    return grafo
+
+
+def test_usuarios_similares_por_el_indice_inverso(db):
+    grafo = _grafo_con_prestamos(db, {"10": ["1", "2"], "11": ["1", "2", "3"], "12": ["2", "4"], "13": ["5"]})
+
+    assert grafo.prestatarios_de_libro(id_libro("2")) == {id_usuario("10"), id_usuario("11"), id_usuario("12")}
+    assert grafo.usuarios_similares("10") == [("11", 2), ("12", 1)]
+    assert grafo.usuarios_similares("13") == []
+
+    grafo.eliminar_prestamo("11", "2")
+    assert sorted(grafo.usuarios_similares("10")) == [("11", 1), ("12", 1)]
+
+
+def test_recomendar_libros_de_usuarios_similares(db):
+    grafo = _grafo_con_prestamos(db, {"10": ["1", "2"], "11": ["1", "3"], "12": ["2", "3", "4"]})
+
+    assert grafo.recomendar_libros("10") == [("3", "Título", 2), ("4", "Título", 1)]
+    assert grafo.recomendar_libros("10", limite=1) == [("3", "Título", 2)]
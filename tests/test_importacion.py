@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+from ayudantes import libro
+from biblioteca_modelo import importar_libros, importar_usuarios
+
+
+def test_carga_masiva_informa_duplicados(db):
+    db.add_libro(libro("1"))
+    registros = [libro("1"), libro("2"), libro("3"), libro("2"), {'isbn': "4", 'titulo': "Sin autor"}, libro("x")]
+
+    resultado = db.add_libros_bulk(registros, tamano_lote=2)
+
+    assert resultado['insertados'] == 2
+    assert resultado['conflictos'] == [(1, "1", "ISBN duplicado"), (4, "2", "ISBN duplicado"),
+                                       (5, "4", "Datos incompletos"), (6, "x", "El ISBN debe ser numérico")]
+    assert [l['isbn'] for l in db.get_all_libros()] == ["1", "2", "3"]
+
+
+def test_carga_con_indices_diferidos_los_recrea(db):
+    db.cursor.execute("CREATE INDEX idx_prueba_titulo ON libros (titulo)")
+    indices_antes = db._indices_secundarios("libros")
+
+    db.add_libros_bulk((libro(str(i)) for i in range(1, 101)), tamano_lote=30, diferir_indices=True)
+
+    assert db._indices_secundarios("libros") == indices_antes
+    assert len(db.get_all_libros()) == 100
+
+
+def test_csv_con_filas_incompletas(db, tmp_path):
+    ruta = tmp_path / "usuarios.csv"
+    ruta.write_text("dni,nombre\n11,Ana\n12\n11,Repetido\n", encoding="utf-8")
+
+    resultado = importar_usuarios(db, str(ruta))
+
+    assert resultado['insertados'] == 1
+    assert [motivo for _, _, motivo in resultado['conflictos']] == ["Datos incompletos", "DNI duplicado"]
+
+
+def test_lineas_mal_formadas_se_informan_como_conflictos(db, tmp_path):
+    ruta = tmp_path / "libros.jsonl"
+    ruta.write_text('{"isbn": "1", "titulo": "A", "autor": "B", "editorial": "C"}\n'
+                    '{mal formado\n'
+                    '[1, 2]\n'
+                    '{"isbn": "2", "titulo": "A", "autor": "B", "editorial": "C"}\n', encoding="utf-8")
+
+    resultado = importar_libros(db, str(ruta), tamano_lote=1, diferir_indices=True)
+
+    assert resultado['insertados'] == 2
+    assert [posicion for posicion, _, _ in resultado['conflictos']] == [2, 3]
+    assert db.contar_libros() == 2
+
+
+def test_error_a_mitad_de_carga_deshace_la_transaccion(db, ruta_db):
+    indices_antes = db._indices_secundarios("prestamos")
+
+    def registros():
+        yield {'isbn': "1", 'titulo': "A", 'autor': "B", 'editorial': "C"}
+        yield {'isbn': "2", 'titulo': "A", 'autor': "B", 'editorial': "C"}
+        raise OSError("error de lectura")
+
+    with pytest.raises(OSError):
+        db.add_libros_bulk(registros(), tamano_lote=1, diferir_indices=True)
+
+    assert not db.conn.in_transaction
+    db.add_usuario("10", "Ana")  # Un commit posterior no debe confirmar la carga a medias
+    otra = sqlite3.connect(ruta_db)
+    try:
+        assert otra.execute("SELECT COUNT(*) FROM libros").fetchone()[0] == 0
+    finally:
+        otra.close()
+    assert db._indices_secundarios("prestamos") == indices_antes
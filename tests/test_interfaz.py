@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("tkinter")
+
+from Biblioteca import BibliotecaApp
+from biblioteca_cache import CacheResultados
+from biblioteca_recomendaciones import MotorRecomendaciones
+
+
+def _app(db):
+    # Solo el estado que usan los métodos probados: sin ventana ni pantalla
+    return SimpleNamespace(recomendador=MotorRecomendaciones(db), cache_resultados=CacheResultados())
+
+
+def test_recomendaciones_cacheadas_caducan_al_invalidar_el_modelo(db):
+    app = _app(db)
+    clave = BibliotecaApp._clave_recomendaciones(app, "10", 5)
+    BibliotecaApp._guardar_recomendaciones(app, clave, [("3", "Libro 3", 1.0)], ["1"])
+    assert app.cache_resultados.get(BibliotecaApp._clave_recomendaciones(app, "10", 5)) == [("3", "Libro 3", 1.0)]
+
+    app.recomendador.invalidar()
+
+    assert app.cache_resultados.get(BibliotecaApp._clave_recomendaciones(app, "10", 5)) is None
+
+
+def test_recomendaciones_cacheadas_dependen_del_usuario_y_los_libros(db):
+    app = _app(db)
+    clave = BibliotecaApp._clave_recomendaciones(app, "10", 5)
+    BibliotecaApp._guardar_recomendaciones(app, clave, [("3", "Libro 3", 1.0)], ["1"])
+
+    app.cache_resultados.invalidar_libro("3")
+
+    assert app.cache_resultados.get(clave) is None
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from ayudantes import libro
+from biblioteca_db import DatabaseManager
+from biblioteca_metricas import Histograma, normalizar_sql
+
+
+@pytest.fixture
+def db_instrumentada(ruta_db, tmp_path):
+    db = DatabaseManager(ruta_db, instrumentar=True, umbral_lento_ms=0,
+                         archivo_lentas=str(tmp_path / "lentas.jsonl"))
+    yield db
+    db.close()
+
+
+def test_normalizar_sql():
+    assert normalizar_sql("SELECT *  FROM libros\n WHERE isbn = '12' AND n > 3") == \
+        "SELECT * FROM libros WHERE isbn = ? AND n > ?"
+    assert normalizar_sql("SELECT 1 FROM t WHERE x IN (?, ?, ?)") == "SELECT ? FROM t WHERE x IN (?, ...)"
+
+
+def test_histograma_por_cubos():
+    histograma = Histograma()
+    for ms in (0.05, 0.3, 0.3, 7, 2000):
+        histograma.registrar(ms / 1000)
+
+    datos = histograma.como_dict()
+    assert (datos['llamadas'], datos['cubos']['<=0.5ms'], datos['cubos']['<=5000ms']) == (5, 2, 1)
+    assert histograma.percentil(0.5) == 0.5
+    assert datos['maximo_ms'] == pytest.approx(2000)
+
+
+def test_metricas_por_metodo_y_por_sentencia(db_instrumentada):
+    db_instrumentada.add_libro(libro("1"))
+    db_instrumentada.add_libro(libro("2"))
+    db_instrumentada.limpiar_cache()
+    for _ in range(3):
+        db_instrumentada.get_libro("1", incluir_historial=False)
+    db_instrumentada.get_all_libros()
+
+    datos = db_instrumentada.metricas.instantanea()
+    assert datos['metodos']['add_libro']['llamadas'] == 2
+    assert (datos['metodos']['get_libro']['llamadas'], datos['metodos']['get_libro']['filas']) == (3, 3)
+    assert datos['metodos']['get_all_libros']['filas'] == 2
+    # Las dos últimas lecturas salen de la caché: solo la primera llega a SQLite
+    lecturas = [m['llamadas'] for sql, m in datos['sentencias'].items() if sql.endswith("WHERE l.isbn = ?")]
+    assert lecturas == [1]
+
+
+def test_errores_y_consultas_lentas(db_instrumentada, tmp_path):
+    def registros():
+        yield libro("1")
+        raise OSError("error de lectura")
+
+    with pytest.raises(OSError):
+        db_instrumentada.add_libros_bulk(registros())
+    db_instrumentada.get_pagina_libros(despues_de="0")
+
+    datos = db_instrumentada.metricas.instantanea()
+    assert datos['metodos']['add_libros_bulk']['errores'] == 1
+    pagina = [lenta for lenta in datos['lentas'] if "WHERE l.isbn >" in lenta['sql']]
+    assert pagina and pagina[-1]['plan']  # Con umbral 0 todas son lentas, con su plan
+    with open(str(tmp_path / "lentas.jsonl"), encoding="utf-8") as archivo:
+        assert len([json.loads(linea) for linea in archivo]) == len(datos['lentas'])
+
+    db_instrumentada.metricas.volcar(str(tmp_path / "metricas.json"))
+    db_instrumentada.metricas.volcar(str(tmp_path / "metricas.txt"))
+    with open(str(tmp_path / "metricas.json"), encoding="utf-8") as archivo:
+        assert "add_libros_bulk" in json.load(archivo)['metodos']
+    with open(str(tmp_path / "metricas.txt"), encoding="utf-8") as archivo:
+        assert archivo.read().startswith("Métricas desde")
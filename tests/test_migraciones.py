@@ -0,0 +1,38 @@
+import sqlite3
+
+from biblioteca_db import ESQUEMA_VERSION, DatabaseManager
+
+
+def test_base_sin_versionar_se_actualiza(ruta_db):
+    # Esquema original: sin fecha_devolucion, sin índices y con user_version 0
+    conn = sqlite3.connect(ruta_db)
+    conn.executescript("""
+        CREATE TABLE libros (isbn TEXT PRIMARY KEY UNIQUE, titulo TEXT NOT NULL, autor TEXT NOT NULL,
+                             editorial TEXT NOT NULL, disponible INTEGER NOT NULL DEFAULT 1);
+        CREATE TABLE usuarios (dni TEXT PRIMARY KEY UNIQUE, nombre TEXT NOT NULL);
+        CREATE TABLE prestamos (id INTEGER PRIMARY KEY AUTOINCREMENT, isbn_libro TEXT NOT NULL,
+                                dni_usuario TEXT NOT NULL, fecha_prestamo TEXT NOT NULL,
+                                activo INTEGER NOT NULL DEFAULT 1);
+        INSERT INTO libros VALUES ('1', 'Título', 'Autor', 'Editorial', 1);
+    """)
+    conn.close()
+
+    db = DatabaseManager(ruta_db)
+    try:
+        assert db.get_version_esquema() == ESQUEMA_VERSION
+        db.cursor.execute("PRAGMA table_info(prestamos)")
+        assert 'fecha_devolucion' in [fila[1] for fila in db.cursor.fetchall()]
+        db.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'prestamos'")
+        assert 'idx_prestamos_libro_activo' in [fila[0] for fila in db.cursor.fetchall()]
+        assert db.get_libro("1") is not None
+    finally:
+        db.close()
+
+
+def test_migraciones_no_se_repiten(ruta_db, capsys):
+    DatabaseManager(ruta_db).close()
+    capsys.readouterr()
+
+    db = DatabaseManager(ruta_db)
+    db.close()
+    assert "Migración" not in capsys.readouterr().out
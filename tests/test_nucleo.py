@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importar_el_nucleo_no_tiene_efectos(tmp_path):
+    codigo = ("import sys\n"
+              "import biblioteca_db, biblioteca_modelo, biblioteca_grafo\n"
+              "print(sorted(m for m in ('tkinter', 'networkx') if m in sys.modules))\n")
+    entorno = dict(os.environ, PYTHONPATH=RAIZ)
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=str(tmp_path), env=entorno,
+                            capture_output=True, text=True, check=True).stdout
+
+    assert salida.strip() == "[]"
+    assert os.listdir(str(tmp_path)) == []  # No se abre ninguna base de datos al importar
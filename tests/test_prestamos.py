@@ -0,0 +1,105 @@
+import threading
+
+from ayudantes import libro
+from biblioteca_db import DatabaseManager
+
+
+def test_resultados_de_prestar_y_devolver(db):
+    db.add_libro(libro("1", titulo="Don Quijote"))
+    db.add_usuario("10", "Ana")
+    db.add_usuario("11", "Luis")
+
+    assert db.prestar_libro("2", "10")['resultado'] == db.LIBRO_NO_ENCONTRADO
+    assert db.prestar_libro("1", "99")['resultado'] == db.USUARIO_NO_ENCONTRADO
+    assert db.devolver_libro("1")['resultado'] == db.LIBRO_NO_PRESTADO
+
+    prestamo = db.prestar_libro("1", "10")
+    assert (prestamo['resultado'], prestamo['titulo'], prestamo['nombre']) == (db.PRESTAMO_OK, "Don Quijote", "Ana")
+    ocupado = db.prestar_libro("1", "11")
+    assert (ocupado['resultado'], ocupado['dni_prestatario'], ocupado['nombre_prestatario']) == (
+        db.LIBRO_NO_DISPONIBLE, "10", "Ana")
+
+    devolucion = db.devolver_libro("1")
+    assert (devolucion['resultado'], devolucion['dni_prestatario']) == (db.PRESTAMO_OK, "10")
+    assert db.get_libro("1")['disponible']
+    assert db.get_current_borrower("1") is None
+
+
+def test_alta_duplicada_no_bloquea_los_prestamos(db):
+    assert db.add_libro(libro("1"))
+    assert db.add_usuario("10", "Ana")
+
+    assert not db.add_libro(libro("1"))
+    assert db.prestar_libro("1", "10")['resultado'] == db.PRESTAMO_OK
+
+    assert not db.add_usuario("10", "Ana")
+    assert db.devolver_libro("1")['resultado'] == db.PRESTAMO_OK
+    assert not db.conn.in_transaction
+
+
+def test_prestamo_simultaneo_del_mismo_libro(ruta_db):
+    preparacion = DatabaseManager(ruta_db)
+    preparacion.add_libro(libro("1"))
+    usuarios = [str(100 + i) for i in range(8)]
+    for dni in usuarios:
+        preparacion.add_usuario(dni, f"Usuario {dni}")
+    preparacion.close()
+
+    # Un mostrador (con su propia conexión) por hilo, todos a la vez
+    barrera = threading.Barrier(len(usuarios))
+    resultados = []
+
+    def mostrador(dni):
+        manager = DatabaseManager(ruta_db)
+        try:
+            barrera.wait()
+            resultados.append(manager.prestar_libro("1", dni)['resultado'])
+        finally:
+            manager.close()
+
+    hilos = [threading.Thread(target=mostrador, args=(dni,)) for dni in usuarios]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert resultados.count(DatabaseManager.PRESTAMO_OK) == 1
+    assert resultados.count(DatabaseManager.LIBRO_NO_DISPONIBLE) == len(usuarios) - 1
+    comprobacion = DatabaseManager(ruta_db)
+    comprobacion.cursor.execute("SELECT COUNT(*) FROM prestamos WHERE activo = 1")
+    assert comprobacion.cursor.fetchone()[0] == 1
+    assert comprobacion.get_current_borrower("1") is not None
+    comprobacion.close()
+
+
+def test_prestar_lote_con_codigo_por_libro(db):
+    for isbn in ("1", "2", "3"):
+        db.add_libro(libro(isbn, titulo=f"Libro {isbn}"))
+    db.add_usuario("10", "Ana")
+    db.add_usuario("11", "Luis")
+    db.prestar_libro("2", "11")
+
+    resultados = db.prestar_lote("10", ["1", "2", "9", "3", "1"])
+
+    assert [(r['isbn'], r['resultado']) for r in resultados] == [
+        ("1", db.PRESTAMO_OK), ("2", db.LIBRO_NO_DISPONIBLE), ("9", db.LIBRO_NO_ENCONTRADO),
+        ("3", db.PRESTAMO_OK), ("1", db.ISBN_REPETIDO)]
+    assert (resultados[1]['dni_prestatario'], resultados[1]['nombre_prestatario']) == ("11", "Luis")
+    assert (resultados[0]['titulo'], resultados[0]['nombre']) == ("Libro 1", "Ana")
+    assert (db.get_current_borrower("1"), db.get_current_borrower("3")) == ("10", "10")
+    assert [r['resultado'] for r in db.prestar_lote("99", ["3"])] == [db.USUARIO_NO_ENCONTRADO]
+
+
+def test_devolver_lote_con_codigo_por_libro(db):
+    for isbn in ("1", "2"):
+        db.add_libro(libro(isbn))
+    db.add_usuario("10", "Ana")
+    db.prestar_lote("10", ["1"])
+
+    resultados = db.devolver_lote(["1", "2", "9", "1"])
+
+    assert [(r['isbn'], r['resultado']) for r in resultados] == [
+        ("1", db.PRESTAMO_OK), ("2", db.LIBRO_NO_PRESTADO), ("9", db.LIBRO_NO_ENCONTRADO), ("1", db.ISBN_REPETIDO)]
+    assert (resultados[0]['dni_prestatario'], resultados[0]['nombre_prestatario']) == ("10", "Ana")
+    assert db.get_libro("1")['disponible']
+    assert db.get_current_borrower("1") is None
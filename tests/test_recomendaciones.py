@@ -0,0 +1,78 @@
+import pytest
+
+from ayudantes import libro
+from biblioteca_recomendaciones import MotorRecomendaciones
+
+pytest.importorskip("scipy")
+
+
+@pytest.fixture
+def db_con_historial(db):
+    historial = {"10": ["1", "2"], "11": ["1", "3"], "12": ["2", "3", "4"]}
+    for isbn in ("1", "2", "3", "4", "5"):
+        db.add_libro(libro(isbn, titulo=f"Libro {isbn}"))
+    for dni, isbns in historial.items():
+        db.add_usuario(dni, f"Usuario {dni}")
+        for isbn in isbns:
+            db.registrar_prestamo(isbn, dni)
+            db.registrar_devolucion(isbn, dni)
+    return db
+
+
+def test_recomendar_por_similitud_coseno(db_con_historial):
+    motor = MotorRecomendaciones(db_con_historial)
+
+    recomendaciones = motor.recomendar("10")
+
+    assert [(isbn, titulo) for isbn, titulo, _ in recomendaciones] == [("3", "Libro 3"), ("4", "Libro 4")]
+    assert [puntuacion for _, _, puntuacion in recomendaciones] == pytest.approx([1.0, 0.5 ** 0.5])
+    assert motor.recomendar("99") == []
+
+
+def test_recomendar_solo_libros_disponibles(db_con_historial):
+    db_con_historial.update_libro_disponibilidad("3", False)
+    motor = MotorRecomendaciones(db_con_historial)
+
+    assert [isbn for isbn, _, _ in motor.recomendar("10")] == ["4"]
+    assert [isbn for isbn, _, _ in motor.recomendar("10", solo_disponibles=False)] == ["3", "4"]
+
+
+def test_recomendar_todos_coincide_con_recomendar(db_con_historial):
+    motor = MotorRecomendaciones(db_con_historial)
+
+    todos = motor.recomendar_todos()
+
+    assert set(todos) == {"10", "11", "12"}
+    for dni, recomendaciones in todos.items():
+        assert recomendaciones == [(isbn, puntuacion) for isbn, _, puntuacion in motor.recomendar(dni)]
+
+
+def test_invalidar_reentrena_con_los_prestamos_nuevos(db_con_historial):
+    motor = MotorRecomendaciones(db_con_historial)
+    assert [isbn for isbn, _, _ in motor.recomendar("10")] == ["3", "4"]
+
+    db_con_historial.registrar_prestamo("5", "12")
+    db_con_historial.registrar_devolucion("5", "12")
+    assert [isbn for isbn, _, _ in motor.recomendar("10")] == ["3", "4"]  # Modelo ya entrenado
+    motor.invalidar()
+    assert not motor.entrenado
+    assert "5" in [isbn for isbn, _, _ in motor.recomendar("10")]
+
+
+def test_modelo_de_una_generacion_anterior_no_se_guarda(db_con_historial, monkeypatch):
+    motor = MotorRecomendaciones(db_con_historial)
+    iterar = db_con_historial.iterar_pares_historial
+
+    def iterar_e_invalidar(*args, **kwargs):
+        # Un préstamo invalida el modelo mientras se entrena con el historial ya leído
+        pares = list(iterar(*args, **kwargs))
+        motor.invalidar()
+        return iter(pares)
+
+    monkeypatch.setattr(db_con_historial, "iterar_pares_historial", iterar_e_invalidar)
+    assert [isbn for isbn, _, _ in motor.recomendar("10")] == ["3", "4"]
+    assert not motor.entrenado
+
+    monkeypatch.setattr(db_con_historial, "iterar_pares_historial", iterar)
+    motor.recomendar("10")
+    assert motor.entrenado
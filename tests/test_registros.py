@@ -0,0 +1,47 @@
+import pytest
+
+from ayudantes import contar_consultas, libro
+from biblioteca_registros import Libro, Usuario
+
+
+def test_registros_compactos_con_acceso_por_clave(db):
+    db.add_libro(libro("1", titulo="Don Quijote"))
+    db.add_usuario("10", "Ana")
+    db.prestar_libro("1", "10")
+
+    encontrado = db.get_libro("1")
+    assert isinstance(encontrado, Libro) and not hasattr(encontrado, '__dict__')
+    assert encontrado.titulo == encontrado['titulo'] == encontrado[1] == "Don Quijote"
+    assert (encontrado.dni_prestatario, encontrado['nombre_prestatario'], encontrado.prestado_a) == ("10", "Ana", ["10"])
+    assert encontrado.get('no_existe', "defecto") == "defecto"
+    with pytest.raises(KeyError):
+        encontrado['no_existe']
+
+    usuario = db.get_usuario("10")
+    assert isinstance(usuario, Usuario) and usuario['nombre'] == "Ana"
+    assert usuario._replace(nombre="Otra").como_dict() == {'dni': "10", 'nombre': "Otra"}
+
+
+def test_catalogo_en_registros(db):
+    db.add_libro(libro("1"))
+    db.add_libro(libro("2"))
+
+    catalogo = db.get_all_libros(incluir_historial=True)
+
+    assert all(isinstance(registro, Libro) for registro in catalogo)
+    assert [(registro.isbn, registro.prestado_a) for registro in catalogo] == [("1", []), ("2", [])]
+    assert Libro.desde_dict(libro("3")) == ("3", "Título", "Autor", "Editorial", True, None, None, None)
+
+
+def test_prestatario_actual_sin_consultas_aparte(db):
+    db.add_libro(libro("1"))
+    db.add_usuario("10", "Ana")
+    db.prestar_libro("1", "10")
+    consultas = contar_consultas(db)
+
+    prestado = db.get_libro("1")
+
+    assert (prestado.dni_prestatario, prestado.nombre_prestatario) == ("10", "Ana")
+    assert len(consultas) == 2  # El libro con su préstamo activo y el historial
+    db.devolver_libro("1")
+    assert db.get_libro("1").dni_prestatario is None
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from biblioteca_tareas import EjecutorTareas
+
+
+@pytest.fixture
+def ejecutor():
+    ejecutor = EjecutorTareas(max_hilos=1)
+    yield ejecutor
+    ejecutor.cerrar(esperar=True)
+
+
+def _esperar(ejecutor, limite=5.0):
+    # Hace de bucle after() de la interfaz: procesa eventos hasta que no queden tareas activas
+    fin = time.monotonic() + limite
+    while ejecutor.tareas_activas():
+        ejecutor.procesar_eventos()
+        assert time.monotonic() < fin, "La tarea no terminó a tiempo"
+        time.sleep(0.005)
+
+
+def test_resultado_y_progreso_llegan_al_hilo_que_procesa_eventos(ejecutor):
+    eventos = []
+
+    def trabajo(tarea, n):
+        for i in range(n):
+            tarea.informar_progreso(i + 1, n)
+        return threading.current_thread().name
+
+    ejecutor.enviar("Contar", trabajo, 3,
+                    al_progresar=lambda tarea, actual, total, mensaje: eventos.append(
+                        ('progreso', actual, threading.current_thread())),
+                    al_terminar=lambda hilo: eventos.append(('fin', hilo, threading.current_thread())))
+    _esperar(ejecutor)
+
+    assert [e[:2] for e in eventos[:3]] == [('progreso', 1), ('progreso', 2), ('progreso', 3)]
+    assert eventos[3][0] == 'fin' and eventos[3][1].startswith("biblioteca-tarea")
+    assert all(hilo is threading.main_thread() for *_, hilo in eventos)
+
+
+def test_error_de_la_tarea(ejecutor):
+    errores = []
+
+    def trabajo(tarea):
+        raise RuntimeError("fallo")
+
+    ejecutor.enviar("Fallar", trabajo, al_fallar=errores.append, al_terminar=pytest.fail)
+    _esperar(ejecutor)
+
+    assert [str(e) for e in errores] == ["fallo"]
+
+
+def test_cancelar_a_mitad_y_antes_de_empezar(ejecutor):
+    empezada = threading.Event()
+    continuar = threading.Event()
+    canceladas = []
+
+    def trabajo(tarea):
+        empezada.set()
+        continuar.wait(5)
+        tarea.informar_progreso(1)  # Punto seguro: aquí se detiene
+        return "no debería terminar"
+
+    primera = ejecutor.enviar("Larga", trabajo, al_cancelar=lambda: canceladas.append("larga"),
+                              al_terminar=pytest.fail)
+    ejecutor.enviar("En cola", trabajo, al_cancelar=lambda: canceladas.append("en cola"), al_terminar=pytest.fail)
+    empezada.wait(5)
+    ejecutor.cancelar_todas()
+    continuar.set()
+    _esperar(ejecutor)
+
+    assert primera.cancelada
+    assert sorted(canceladas) == ["en cola", "larga"]
+
+
+def test_cerrar_esperando_detiene_la_tarea_en_curso():
+    ejecutor = EjecutorTareas(max_hilos=1)
+    empezada = threading.Event()
+    pasos = []
+
+    def trabajo(tarea):
+        empezada.set()
+        while True:
+            tarea.informar_progreso(len(pasos))
+            pasos.append(1)
+            time.sleep(0.001)
+
+    ejecutor.enviar("Sin fin", trabajo)
+    assert empezada.wait(5)
+
+    ejecutor.cerrar(esperar=True)
+
+    # Al volver, la tarea ya se detuvo: nada sigue trabajando (ni usando la base de datos)
+    hechos = len(pasos)
+    time.sleep(0.02)
+    assert len(pasos) == hechos
@@ -0,0 +1,57 @@
+from ayudantes import libro
+
+
+def _prestar(db, isbn, dni, vencimiento):
+    db.prestar_libro(isbn, dni)
+    db.cursor.execute("UPDATE prestamos SET fecha_vencimiento = ? WHERE isbn_libro = ? AND activo = 1",
+                      (vencimiento, isbn))
+    db.conn.commit()
+
+
+def _con_prestamos(db):
+    db.add_usuario("10", "Ana")
+    for isbn, vencimiento in (("1", "2024-01-03 00:00:00"), ("2", "2024-01-01 00:00:00"),
+                              ("3", "2024-01-02 00:00:00"), ("4", "2024-01-02 00:00:00"),
+                              ("5", "2024-02-01 00:00:00")):
+        db.add_libro(libro(isbn, titulo=f"Libro {isbn}"))
+        _prestar(db, isbn, "10", vencimiento)
+    return db
+
+
+def test_prestamo_vence_segun_el_plazo(db):
+    db.add_libro(libro("1"))
+    db.add_usuario("10", "Ana")
+    db.prestar_libro("1", "10", dias=7)
+
+    db.cursor.execute("SELECT julianday(fecha_vencimiento) - julianday(fecha_prestamo) FROM prestamos")
+    assert round(db.cursor.fetchone()[0]) == 7
+
+
+def test_paginas_de_vencidos_en_orden_de_vencimiento(db):
+    _con_prestamos(db)
+    ahora = "2024-01-15 00:00:00"
+
+    primera = db.get_pagina_vencidos(limite=2, ahora=ahora)
+    ultima = primera[-1]
+    segunda = db.get_pagina_vencidos(despues_de=(ultima[6], ultima[0]), limite=2, ahora=ahora)
+
+    assert [fila[1] for fila in primera] == ["2", "3"]
+    assert [fila[1] for fila in segunda] == ["4", "1"]
+    assert primera[0][2:5] == ("Libro 2", "10", "Ana")
+    assert db.contar_vencidos(ahora=ahora) == 4
+    assert [fila[1] for fila in db.iterar_vencidos(ahora=ahora, tamano_lote=1)] == ["2", "3", "4", "1"]
+
+
+def test_devueltos_no_cuentan_como_vencidos(db):
+    _con_prestamos(db)
+    db.devolver_libro("2")
+
+    assert db.contar_vencidos(ahora="2024-01-15 00:00:00") == 3
+
+
+def test_vencidos_usan_el_indice(db):
+    db.cursor.execute("EXPLAIN QUERY PLAN " + db.SQL_VENCIDOS + " ORDER BY p.fecha_vencimiento, p.id LIMIT 100",
+                      {'ahora': None})
+    plan = " ".join(fila[3] for fila in db.cursor.fetchall())
+
+    assert "idx_prestamos_vencimiento" in plan